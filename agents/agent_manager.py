@@ -1,17 +1,57 @@
+import os
 import re
+import time
+import asyncio
+import inspect
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from .travel_agent import TravelAgent
 from .weather_agent import WeatherAgent
 from .food_agent import FoodAgent
 from .flight_agent import FlightAgent
 from .hotel_agent import HotelAgent
 from .place_agent import PlaceAgent
+from .request_context import request_scope
+from .usage import usage_scope
+from .collaboration import collaboration, SupportingInfo
+from .resilience import BulkheadFullError, quota, resilience
+from .degraded import degraded_answers
+from .semantic_cache import response_cache
+from .history_index import history_indexes
+from .geocoding import find_city_in_text
+from .trip_planner import PlanNode, run_graph
+from monitoring.metrics import AGENT_REQUESTS, AGENT_LATENCY
+from monitoring.tracing import span
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Routing keywords per agent, in priority order (first match wins)
+ROUTING_KEYWORDS = {
+    'flight': ['chuyến bay', 'vé máy bay', 'bay', 'sân bay'],
+    'hotel': ['khách sạn', 'đặt phòng', 'phòng', 'resort'],
+    'place': ['địa điểm', 'du lịch', 'thăm quan', 'thắng cảnh'],
+    'food': ['nhà hàng', 'quán ăn', 'món ăn', 'đặc sản'],
+    'weather': ['thời tiết', 'nhiệt độ', 'mưa', 'nắng']
+}
+
+# Clause boundaries when looking for several requests in one message
+CLAUSE_BOUNDARY = re.compile(r'[,;?!\n]+|\.\s+|\s+(?:và|and|còn|rồi|cùng)\s+', re.IGNORECASE)
+
+# How a sub-query that lost the city mentioned elsewhere in the message gets it back
+CITY_PREPOSITIONS = {'flight': 'đến'}
+
+# Section headings of a multi-intent answer
+SECTION_TITLES = {
+    'flight': '✈️ Chuyến bay',
+    'hotel': '🏨 Khách sạn',
+    'place': '📍 Địa điểm',
+    'food': '🍜 Ẩm thực',
+    'weather': '🌤️ Thời tiết'
+}
+
+# Deadline for all sections of a multi-intent message
+MULTI_INTENT_TIMEOUT = float(os.getenv('MULTI_INTENT_TIMEOUT', 30))
+
 class AgentManager:
     def __init__(self):
         """Initialize the agent manager with all available agents"""
@@ -72,18 +112,26 @@ class AgentManager:
         best_agent = max(scores.items(), key=lambda x: x[1])
         return best_agent[0] if best_agent[1] > 0 else 'travel'
 
-    def process(self, input_data, conversation_history=None):
+    def process(self, input_data, session_id=None, conversation_history=None):
         """
-        Process input data by routing it to the appropriate agent
+        Process input data by routing it to the appropriate agent.
+
+        session_id attributes Gemini token usage (and the soft budget) to
+        the chat session. A message asking for several things at once
+        ("vé máy bay và khách sạn ở Đà Nẵng, thời tiết thế nào?") is split
+        and each part answered by its own agent, concurrently.
         """
         try:
             # Determine which agent to use based on input
-            agent = self._route_to_agent(input_data)
-            logger.info(f"Routing message to {agent.name} agent")
-            
-            # Process the input with the selected agent
-            response = agent.process(input_data, conversation_history)
-            return response
+            with span("AgentManager._route_to_agent", category="route"):
+                intents = self._split_intents(input_data)
+                agent = self._route_to_agent(input_data)
+            if len(intents) > 1:
+                return self._process_intents(intents, session_id, conversation_history)
+
+            # Agents mostly keep BaseAgent's default name, so label by routing key
+            agent_name = next((key for key, value in self.agents.items() if value is agent), agent.name)
+            return self._process_turn(agent_name, input_data, session_id, conversation_history)
             
         except Exception as e:
             logger.error(f"Error in AgentManager: {str(e)}")
@@ -92,36 +140,198 @@ class AgentManager:
                 "status": "error",
                 "message": f"Error processing request: {str(e)}"
             }
+
+    def _process_turn(self, agent_name: str, user_input: str, session_id: Optional[str] = None,
+                      conversation_history: List[Dict] = None, skip_supporting: Tuple[str, ...] = ()) -> Dict[str, Any]:
+        """Answer one request with one agent, recording its metrics."""
+        agent = self.agents[agent_name]
+        logger.info(f"Routing message to {agent_name} agent")
+        
+        # Process the input with the selected agent; upstream calls made
+        # during this turn are memoized in one request context
+        start = time.perf_counter()
+        status = "error"
+        try:
+            # A paraphrase of a recent question about the same city reuses its
+            # answer, if it was given to a session that stated the same facts
+            facts = history_indexes.facts(session_id, conversation_history)
+            response = response_cache.lookup(agent_name, user_input, facts)
+            if response is None:
+                with resilience.bulkhead(agent_name).guard(), request_scope(f"{agent_name} turn"), \
+                        usage_scope(session_id, agent_name), span(f"{agent_name} agent", category="agent"):
+                    supporting_info = None
+                    if agent_name not in skip_supporting:
+                        supporting_info = self._launch_supporting_agent(
+                            agent_name, user_input, session_id, conversation_history, skip_supporting)
+                    try:
+                        # Answered from the local store instead while Gemini's quota is exhausted
+                        response = degraded_answers.run(agent_name, user_input, lambda: self._run_agent(
+                            agent, user_input, conversation_history, supporting_info, session_id), facts)
+                    finally:
+                        if supporting_info is not None:
+                            supporting_info.close()
+                response_cache.store(agent_name, user_input, response, facts)
+            if isinstance(response, dict):
+                response.setdefault("agent", agent_name)
+            status = response.get("status", "unknown") if isinstance(response, dict) else "unknown"
+        except BulkheadFullError as e:
+            logger.warning(str(e))
+            status = "rejected"
+            response = {
+                "agent": agent_name,
+                "status": "error",
+                "message": "Hệ thống đang quá tải cho loại yêu cầu này, vui lòng thử lại sau giây lát."
+            }
+        finally:
+            AGENT_LATENCY.observe(time.perf_counter() - start, agent=agent_name)
+            AGENT_REQUESTS.inc(agent=agent_name, status=status)
+        return response
+
+    def _process_intents(self, intents: List[Tuple[str, str]], session_id: Optional[str] = None,
+                         conversation_history: List[Dict] = None) -> Dict[str, Any]:
+        """
+        Answer each (agent, sub-query) concurrently and merge the answers.
+
+        Sections keep the order the requests appear in the message, each
+        with its own status and duration. Agents asked directly are not
+        also launched as supporting agents.
+        """
+        names = tuple(name for name, _ in intents)
+        queries = dict(intents)
+        logger.info(f"Message split into {len(intents)} requests: {', '.join(names)}")
+
+        nodes = [
+            PlanNode(name, lambda results, name=name: self._process_turn(
+                name, queries[name], session_id, conversation_history, skip_supporting=names))
+            for name in names
+        ]
+        events = {}
+        with request_scope("multi-intent turn"):
+            for event in run_graph(nodes, time.monotonic() + MULTI_INTENT_TIMEOUT, session_id, category="section"):
+                events[event['node']] = event
+
+        sections = []
+        parts = []
+        for name in names:
+            event = events.get(name, {'status': 'timeout', 'duration_ms': 0.0})
+            response = event.get('data') if isinstance(event.get('data'), dict) else {}
+            status = response.get('status', event['status'])
+            content = response.get('content') if status == 'success' else None
+            if content:
+                parts.append(f"{SECTION_TITLES.get(name, name)}\n{content}")
+            else:
+                message = response.get('message') or event.get('error') or "Không có kết quả"
+                parts.append(f"{SECTION_TITLES.get(name, name)}\n⚠️ {message}")
+            sections.append({
+                'agent': name,
+                'query': queries[name],
+                'status': 'success' if content else ('error' if status == 'success' else status),
+                'duration_ms': event['duration_ms']
+            })
+            if response.get('freshness'):
+                sections[-1]['freshness'] = response['freshness']
+
+        merged = "\n\n".join(parts)
+        if not any(section['status'] == 'success' for section in sections):
+            return {"agent": "+".join(names), "status": "error", "message": merged, "sections": sections}
+        return {"agent": "+".join(names), "status": "success", "content": merged, "sections": sections}
     
+    def _run_agent(self, agent, user_input: str, conversation_history: List[Dict] = None,
+                   supporting_info: Optional[SupportingInfo] = None,
+                   session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Call the agent's chat entry point, process_with_context().
+
+        Agents disagree on process() signatures (dicts of search fields,
+        coroutines), but all accept the same context dictionary here. The
+        history they get is the part of the conversation relevant to this
+        message (within HISTORY_CONTEXT_BYTES), and the dates, cities and
+        preferences the user mentioned at any point are in the context.
+        """
+        history = conversation_history or []
+        context = self._build_context_from_history(history)
+        relevant_history, facts = history_indexes.select(session_id, history, user_input)
+        for key, values in facts.items():
+            context[key].extend(value for value in values if value not in context[key])
+        if supporting_info is not None:
+            context['supporting_info'] = supporting_info
+        result = agent.process_with_context({
+            'user_input': user_input,
+            'context': context,
+            'entities': self._extract_entities(user_input),
+            'history': relevant_history
+        })
+        if inspect.iscoroutine(result):
+            result = asyncio.run(result)
+        return result
+    
+    def _launch_supporting_agent(self, agent_name: str, user_input: str, session_id: Optional[str],
+                                 conversation_history: List[Dict] = None,
+                                 skip: Tuple[str, ...] = ()) -> Optional[SupportingInfo]:
+        """
+        Start the supporting agent _check_required_info asks for, if any.
+
+        It runs concurrently with the primary agent, which reads the answer
+        from context['supporting_info'] once its own fetches are done, so a
+        richer answer costs no extra wall-clock time up to the sub-deadline.
+        """
+        required = self._check_required_info(agent_name, user_input, self._extract_entities(user_input))
+        if not required['needed'] or required['agent'] not in self.agents or required['agent'] in skip:
+            return None
+        if quota.active:
+            # Its Gemini calls would only be refused
+            return None
+        supporting_name = required['agent']
+        supporting_agent = self.agents[supporting_name]
+
+        def run() -> Dict[str, Any]:
+            with resilience.bulkhead(supporting_name).guard(), usage_scope(session_id, supporting_name):
+                return self._run_agent(supporting_agent, required['query'], conversation_history, session_id=session_id)
+
+        return collaboration.launch(supporting_name, required['query'], run)
+    
+    def _match_intent(self, text: str) -> Optional[str]:
+        """The agent whose routing keywords appear first in ROUTING_KEYWORDS order."""
+        text = text.lower()
+        for agent_name, keywords in ROUTING_KEYWORDS.items():
+            if any(keyword in text for keyword in keywords):
+                return agent_name
+        return None
+
     def _route_to_agent(self, input_data):
         """
         Route the input to the appropriate agent based on content
         """
-        # Convert input to lowercase for easier matching
-        text = input_data.lower()
-        
-        # Check for flight-related keywords
-        if any(keyword in text for keyword in ['chuyến bay', 'vé máy bay', 'bay', 'sân bay']):
-            return self.agents['flight']
-            
-        # Check for hotel-related keywords
-        if any(keyword in text for keyword in ['khách sạn', 'đặt phòng', 'phòng', 'resort']):
-            return self.agents['hotel']
-            
-        # Check for place-related keywords
-        if any(keyword in text for keyword in ['địa điểm', 'du lịch', 'thăm quan', 'thắng cảnh']):
-            return self.agents['place']
-            
-        # Check for food-related keywords
-        if any(keyword in text for keyword in ['nhà hàng', 'quán ăn', 'món ăn', 'đặc sản']):
-            return self.agents['food']
-            
-        # Check for weather-related keywords
-        if any(keyword in text for keyword in ['thời tiết', 'nhiệt độ', 'mưa', 'nắng']):
-            return self.agents['weather']
-            
         # Default to place agent if no specific match
-        return self.agents['place']
+        return self.agents[self._match_intent(input_data) or 'place']
+
+    def _split_intents(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Split a message that asks several agents something into sub-queries.
+
+        Each clause goes to the agent _match_intent picks for it; clauses
+        without a routing keyword ("Tôi đi Đà Nẵng tuần sau") are shared by
+        every sub-query, and a city named anywhere in the message is added
+        to sub-queries that lost it. Returns [] for single-intent messages,
+        including ones like "khách sạn gần sân bay" whose keywords share a
+        clause.
+        """
+        clauses = [clause.strip() for clause in CLAUSE_BOUNDARY.split(text) if clause and clause.strip()]
+        if len(clauses) < 2:
+            return []
+        owners = [self._match_intent(clause) for clause in clauses]
+        names = list(dict.fromkeys(owner for owner in owners if owner))
+        if len(names) < 2:
+            return []
+
+        city = find_city_in_text(text)
+        intents = []
+        for name in names:
+            query = ", ".join(clause for clause, owner in zip(clauses, owners) if owner in (name, None))
+            if city and not find_city_in_text(query):
+                query += f" {CITY_PREPOSITIONS.get(name, 'ở')} {city.get('name_vi') or city['name']}"
+            intents.append((name, query))
+        return intents
     
     def _extract_entities(self, text: str) -> Dict[str, Any]:
         """Trích xuất các thông tin quan trọng từ câu hỏi"""
@@ -0,0 +1,278 @@
+import os
+import re
+import json
+import logging
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from .text_utils import fold_text, compact_text
+from .geocoding import lookup_city
+from monitoring.metrics import AIRPORT_RESOLUTIONS
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+AIRPORTS_PATH = os.getenv('AIRPORTS_PATH', os.path.join(DATA_DIR, 'airports.json'))
+
+# Trigram similarity (Dice) a misspelt name needs to match a known one
+AIRPORT_FUZZY_THRESHOLD = float(os.getenv('AIRPORT_FUZZY_THRESHOLD', 0.6))
+
+# Folded words before a place that make it the origin or the destination
+ORIGIN_MARKERS = frozenset(['tu', 'from'])
+DESTINATION_MARKERS = frozenset(['den', 'toi', 've', 'sang', 'ra', 'vao', 'di', 'to'])
+
+# Folded words skipped between a marker and the place ("từ sân bay Nội Bài")
+PLACE_PREFIXES = frozenset(['san', 'bay', 'thanh', 'pho', 'tp', 'airport', 'city'])
+
+# Words of free text tried as a misspelt name after a marker
+MAX_FUZZY_WORDS = 3
+
+_CODE = re.compile(r'\b[A-Z]{3}\b')
+_CODE_LIST = re.compile(r'^\s*[A-Za-z]{3}(?:\s*,\s*[A-Za-z]{3})*\s*$')
+
+
+def _trigrams(name: str) -> List[str]:
+    padded = f"<{name}>"
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def _marker(words: List[str], i: int) -> Optional[str]:
+    """'origin' or 'destination' if words[i] marks the place after it ("về", but not "vé máy bay")."""
+    word = words[i]
+    if word in ORIGIN_MARKERS:
+        return 'origin'
+    if word in DESTINATION_MARKERS and not (word == 've' and words[i + 1:i + 2] == ['may']):
+        return 'destination'
+    return None
+
+
+class AirportIndex:
+    """
+    Airports by IATA code, and every name a traveller might use for them.
+
+    Airport names and the names of the cities they serve (Vietnamese and
+    English, with or without diacritics, from the city table as well) map
+    to the city's codes, main airport first, so "Tokyo" is "NRT,HND".
+    Names are folded and compacted, so "Sài Gòn", "sai gon" and "saigon"
+    are one key. Misspellings go through a trigram index of the compacted
+    names: posting lists of name ids in array('I'), scored by Dice
+    similarity.
+    """
+
+    def __init__(self, path: str = AIRPORTS_PATH):
+        self.airports: Dict[str, Dict[str, Any]] = {}
+        self._names: Dict[str, Tuple[str, ...]] = {}
+        self._keys: List[str] = []
+        self._trigrams: Dict[str, array] = {}
+        self._max_words = 1
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.airports)
+
+    def load(self, path: str) -> int:
+        """Index an airports JSON file; returns the number of airports added."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        by_city: Dict[str, List[str]] = {}
+        added = 0
+        for airport in data.get('airports', []):
+            code = airport['iata'].upper()
+            if code in self.airports:
+                continue
+            self.airports[code] = airport
+            by_city.setdefault(airport['city'], []).append(code)
+            added += 1
+        for city, codes in list(by_city.items()) + list(data.get('served_by', {}).items()):
+            names = [city]
+            known = lookup_city(city)
+            if known:
+                names += [known['name'], known.get('name_vi', '')] + known.get('aliases', [])
+            for name in names:
+                self._add_name(name, codes)
+        # Airport names after city names: "Đà Nẵng" is the city, with all its airports
+        for code, airport in self.airports.items():
+            for name in [airport['name']] + airport.get('aliases', []):
+                self._add_name(name, [code])
+            self._names[f"iata{code.lower()}"] = (code,)
+        logger.info(f"Indexed {added} airports and {len(self._keys)} names from {path}")
+        return added
+
+    def _add_name(self, name: str, codes: List[str]):
+        if not name:
+            return
+        folded = fold_text(name)
+        self._max_words = max(self._max_words, len(folded.split()))
+        for key in (folded, compact_text(name)):
+            if key and key not in self._names:
+                self._names[key] = tuple(codes)
+                if ' ' not in key:
+                    self._add_fuzzy(key)
+
+    def _add_fuzzy(self, key: str):
+        key_id = len(self._keys)
+        self._keys.append(key)
+        for trigram in _trigrams(key):
+            self._trigrams.setdefault(trigram, array('I')).append(key_id)
+
+    def _fuzzy(self, key: str) -> Optional[Tuple[str, ...]]:
+        trigrams = _trigrams(key)
+        shared: Dict[int, int] = {}
+        for trigram in trigrams:
+            for key_id in self._trigrams.get(trigram, ()):
+                shared[key_id] = shared.get(key_id, 0) + 1
+        best, score = None, 0.0
+        for key_id, count in shared.items():
+            similarity = 2 * count / (len(trigrams) + len(_trigrams(self._keys[key_id])))
+            if similarity > score:
+                best, score = key_id, similarity
+        if best is None or score < AIRPORT_FUZZY_THRESHOLD:
+            return None
+        logger.info(f"Matched {key!r} to airport name {self._keys[best]!r} ({score:.2f})")
+        return self._names[self._keys[best]]
+
+    def _lookup(self, name: str, fuzzy: bool = True) -> Tuple[Optional[Tuple[str, ...]], str]:
+        """(codes, how) for one place name; how is exact, fuzzy or unresolved."""
+        words = [word for word in fold_text(name).split()]
+        while words and words[0] in PLACE_PREFIXES:
+            words.pop(0)
+        if not words:
+            return None, 'unresolved'
+        codes = self._names.get(' '.join(words)) or self._names.get(''.join(words))
+        if codes:
+            return codes, 'exact'
+        if fuzzy:
+            codes = self._fuzzy(''.join(words))
+            if codes:
+                return codes, 'fuzzy'
+        return None, 'unresolved'
+
+    def resolve(self, name: str) -> Optional[str]:
+        """
+        IATA code(s) for a place name, comma-joined for multi-airport cities, or None.
+
+        Codes are accepted as they are ("han", "NRT,HND") when known.
+        """
+        if not name:
+            return None
+        if _CODE_LIST.match(name):
+            codes = [code.strip().upper() for code in name.split(',')]
+            if all(code in self.airports for code in codes):
+                AIRPORT_RESOLUTIONS.inc(result='exact')
+                return ','.join(codes)
+        codes, how = self._lookup(name)
+        AIRPORT_RESOLUTIONS.inc(result=how)
+        return ','.join(codes) if codes else None
+
+    def _scan(self, words: List[str]):
+        """Yield (start, length, codes) for each known name in a list of folded words."""
+        start = 0
+        while start < len(words):
+            for length in range(min(self._max_words, len(words) - start), 0, -1):
+                codes = self._names.get(' '.join(words[start:start + length]))
+                if codes:
+                    yield start, length, codes
+                    start += length
+                    break
+            else:
+                start += 1
+
+    def resolve_route(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (origin codes, destination codes) of a flight question; either may be None.
+
+        A place after "từ"/"from" is the origin and one after "đến", "tới",
+        "đi", "về", "to", ... the destination; unmarked places fill the
+        rest in order ("Hà Nội - Đà Nẵng"), and a single unmarked place is
+        the destination. Upper-case codes in the text ("HAN đi SGN") count
+        as places. A marked place that matches no known name exactly is
+        tried as a misspelling.
+        """
+        text = _CODE.sub(lambda match: f" iata{match.group(0).lower()} "
+                         if match.group(0) in self.airports else match.group(0), text or '')
+        words = fold_text(text).split()
+
+        def role(start: int) -> Optional[str]:
+            before = start - 1
+            while before >= 0 and words[before] in PLACE_PREFIXES:
+                before -= 1
+            return _marker(words, before) if before >= 0 else None
+
+        found: Dict[str, Optional[Tuple[str, ...]]] = {'origin': None, 'destination': None}
+        how: Dict[str, str] = {}
+        unmarked = []
+        named = set()
+        for start, length, codes in self._scan(words):
+            named.update(range(start, start + length))
+            marked = role(start)
+            if marked and found[marked] is None:
+                found[marked], how[marked] = codes, 'exact'
+            elif codes not in found.values():
+                unmarked.append(codes)
+
+        for i in range(len(words)):
+            marked = _marker(words, i)
+            if marked is None or found[marked] is not None:
+                continue
+            span = []
+            for j in range(i + 1, len(words)):
+                if j in named or _marker(words, j) or len(span) == MAX_FUZZY_WORDS:
+                    break
+                if words[j] not in PLACE_PREFIXES:
+                    span.append(words[j])
+            for length in range(len(span), 0, -1):
+                codes, matched = self._lookup(' '.join(span[:length]))
+                if codes and codes not in found.values():
+                    found[marked], how[marked] = codes, matched
+                    break
+
+        for codes in unmarked:
+            if codes in found.values():
+                continue
+            if found['origin'] is None and (found['destination'] is not None or len(unmarked) > 1):
+                found['origin'], how['origin'] = codes, 'exact'
+            elif found['destination'] is None:
+                found['destination'], how['destination'] = codes, 'exact'
+
+        for marked in ('origin', 'destination'):
+            AIRPORT_RESOLUTIONS.inc(result=how.get(marked, 'unresolved'))
+        return tuple(','.join(found[marked]) if found[marked] else None for marked in ('origin', 'destination'))
+
+    def city_of(self, codes: Optional[str]) -> Optional[str]:
+        """The city the first of comma-joined codes serves, or None."""
+        airport = self.airports.get((codes or '').split(',')[0].strip().upper())
+        return airport['city'] if airport else None
+
+    def describe(self, codes: Optional[str]) -> str:
+        """"Hà Nội (HAN)" for resolved codes, for prompts and answers."""
+        city = self.city_of(codes)
+        if not city:
+            return codes or ''
+        known = lookup_city(city)
+        name = known.get('name_vi', known['name']) if known else city
+        return f"{name} ({codes.replace(',', ', ')})"
+
+
+_airports: Optional[AirportIndex] = None
+_airports_lock = threading.Lock()
+
+
+def get_airports() -> AirportIndex:
+    """The process-wide airport index, built on first use."""
+    global _airports
+    if _airports is None:
+        with _airports_lock:
+            if _airports is None:
+                _airports = AirportIndex()
+    return _airports
+
+
+def resolve_airport(name: str) -> Optional[str]:
+    """get_airports().resolve(name)."""
+    return get_airports().resolve(name)
+
+
+def resolve_route(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """get_airports().resolve_route(text)."""
+    return get_airports().resolve_route(text)
@@ -1,5 +1,7 @@
 import os
+import inspect
 import logging
+from collections.abc import Mapping
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 import time
@@ -8,17 +10,23 @@ import json
 from functools import lru_cache
 import requests
 from dotenv import load_dotenv
+from .upstream import generate_content, configure_gemini
+from .resilience import quota
+from .history_index import prompt_history
+from monitoring.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 try:
     import google.generativeai as genai
 except ImportError:
-    print("Warning: Google Generative AI not installed. Please run: pip install google-generativeai")
+    logger.warning("Google Generative AI not installed. Please run: pip install google-generativeai")
     genai = None
 
 try:
     from serpapi.google_search import GoogleSearch
 except ImportError:
-    print("Warning: Google Search Results not installed. Please run: pip install google-search-results")
+    logger.warning("Google Search Results not installed. Please run: pip install google-search-results")
     GoogleSearch = None
 
 class BaseAgent:
@@ -43,6 +51,14 @@ class BaseAgent:
         }
     }
 
+    def __init_subclass__(cls, **kwargs):
+        """Trace every method an agent defines, as ClassName.method spans."""
+        super().__init_subclass__(**kwargs)
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('__') or not inspect.isfunction(value) or inspect.iscoroutinefunction(value):
+                continue
+            setattr(cls, attr, traced(f"{cls.__name__}.{attr}")(value))
+
     def __init__(self, name: str = "Base Agent", description: str = "Base agent class"):
         """Initialize the base agent."""
         self.name = name
@@ -50,8 +66,6 @@ class BaseAgent:
         self.conversation_history = []
         self.uses_external_apis = False
         
-        # Configure logging
-        logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(self.__class__.__name__)
         
         # Load environment variables
@@ -102,7 +116,7 @@ class BaseAgent:
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
             
-        genai.configure(api_key=api_key)
+        configure_gemini(api_key)
         return genai.GenerativeModel(
             config['name'],
             generation_config={
@@ -232,13 +246,13 @@ class BaseAgent:
             # Add supporting info from other agents
             if context.get('supporting_info'):
                 supporting_info = context['supporting_info']
-                if isinstance(supporting_info, dict) and supporting_info.get('content'):
+                if isinstance(supporting_info, Mapping) and supporting_info.get('content'):
                     prompt_parts.append(f"- Thông tin bổ sung: {supporting_info['content']}")
         
-        # Add conversation history (last 3 messages)
+        # Add conversation history (relevant snippets, or the last 3 messages)
         if history and len(history) > 0:
             prompt_parts.append("\nLịch sử hội thoại gần đây:")
-            recent_history = history[-3:] if len(history) > 3 else history
+            recent_history = prompt_history(history, limit=3)
             for message in recent_history:
                 role = message.get('role', 'unknown')
                 content = message.get('content', '')
@@ -255,14 +269,14 @@ class BaseAgent:
     def _check_serp_api(self) -> bool:
         """Check if SERP API is available."""
         if GoogleSearch is None:
-            print("Error: Google Search Results is not installed. Please run: pip install google-search-results")
+            logger.error("Google Search Results is not installed. Please run: pip install google-search-results")
             return False
         return True
     
     def _check_gemini(self) -> bool:
         """Check if Gemini is available."""
         if genai is None:
-            print("Error: Google Generative AI is not installed. Please run: pip install google-generativeai")
+            logger.error("Google Generative AI is not installed. Please run: pip install google-generativeai")
             return False
         return True
     
@@ -331,7 +345,8 @@ class BaseAgent:
                 
                 # Check if it's a rate limit error
                 if "429" in error_str and ("quota" in error_str.lower() or "rate" in error_str.lower()):
-                    if attempt < max_retries - 1:
+                    # In degraded mode the turn is answered locally rather than waited out
+                    if attempt < max_retries - 1 and not quota.active:
                         delay = base_delay * (attempt + 1)  # Exponential backoff
                         self.logger.warning(f"Rate limit hit. Waiting {delay} seconds before retry...")
                         time.sleep(delay)
@@ -345,7 +360,7 @@ class BaseAgent:
                 
     def _generate_gemini_response(self, prompt: str) -> Dict[str, Any]:
         """Generate response using Gemini."""
-        response = self.model.generate_content(prompt)
+        response = generate_content(self.model, prompt)
         return {
             "status": "success",
             "content": response.text,
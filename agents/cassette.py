@@ -0,0 +1,222 @@
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from .request_context import canonical_key
+
+logger = logging.getLogger(__name__)
+
+# record: append every upstream call to the cassette; replay: serve calls from it
+UPSTREAM_CASSETTE = os.getenv('UPSTREAM_CASSETTE')
+UPSTREAM_CASSETTE_MODE = os.getenv('UPSTREAM_CASSETTE_MODE', 'replay' if UPSTREAM_CASSETTE else 'off')
+
+# 1 replays recorded latencies, 0 answers instantly, 0.5 halves them
+UPSTREAM_CASSETTE_LATENCY_SCALE = float(os.getenv('UPSTREAM_CASSETTE_LATENCY_SCALE', 1.0))
+
+# Header written as the first line of every cassette
+CASSETTE_FORMAT = 1
+
+
+class CassetteMissError(RuntimeError):
+    """A replayed run made a call that was never recorded."""
+
+
+class ReplayedError(Exception):
+    """An upstream error replayed from a cassette, keeping its code and details."""
+
+    def __init__(self, message: str, code: Optional[int] = None, details: Optional[List[Any]] = None):
+        super().__init__(message)
+        self.code = code
+        self.details = details or []
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class ReplayedResponse:
+    """Stands in for a GenerateContentResponse; agents only read .text."""
+
+    def __init__(self, text: str, usage: Optional[Dict[str, int]] = None):
+        self.text = text
+        self.usage_metadata = _UsageMetadata(**usage) if usage else None
+
+
+def _request_key(service: str, target: str, request: Dict[str, Any]) -> str:
+    key = canonical_key(f"{service}/{target}", request)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def _encode_response(response: Any) -> Any:
+    if isinstance(response, (dict, list, str, int, float)) or response is None:
+        return response
+    # A GenerateContentResponse: keep the text and token counts
+    try:
+        text = response.text or ''
+    except Exception:
+        # Blocked or empty candidates raise on .text
+        text = ''
+    usage = getattr(response, 'usage_metadata', None)
+    encoded = {'generate_content': True, 'text': text}
+    if usage is not None and getattr(usage, 'prompt_token_count', None) is not None:
+        encoded['usage'] = {
+            'prompt_token_count': int(usage.prompt_token_count),
+            'candidates_token_count': int(getattr(usage, 'candidates_token_count', 0) or 0)
+        }
+    return encoded
+
+
+def _decode_response(response: Any) -> Any:
+    if isinstance(response, dict) and response.get('generate_content'):
+        return ReplayedResponse(response.get('text', ''), response.get('usage'))
+    return response
+
+
+def _encode_error(error: Exception) -> Dict[str, Any]:
+    code = getattr(error, 'code', None)
+    if not isinstance(code, int):
+        code = getattr(getattr(error, 'response', None), 'status_code', None)
+    details = []
+    for detail in getattr(error, 'details', None) or ():
+        if isinstance(detail, dict):
+            details.append(detail)
+        elif getattr(detail, 'retry_delay', None) is not None:
+            delay = detail.retry_delay
+            details.append({
+                '@type': 'type.googleapis.com/google.rpc.RetryInfo',
+                'retryDelay': f"{delay.seconds + getattr(delay, 'nanos', 0) / 1e9:g}s"
+            })
+    return {'type': type(error).__name__, 'message': str(error), 'code': code, 'details': details}
+
+
+class Cassette:
+    """
+    Upstream calls recorded to, or replayed from, a gzip-compressed JSONL file.
+
+    Calls are keyed by service, target and canonical request (API keys
+    excluded). A key recorded several times is replayed in recorded order,
+    repeating the last entry once exhausted, so a run that makes the same
+    calls sees the same responses regardless of thread interleaving.
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = UPSTREAM_CASSETTE_LATENCY_SCALE):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        self._file = None
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        if mode == 'replay':
+            self._load()
+        else:
+            self._open_for_recording()
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if 'cassette' in entry:
+                    continue
+                self._entries.setdefault(entry['key'], []).append(entry)
+        logger.info(f"Replaying {sum(len(e) for e in self._entries.values())} upstream calls from {self.path}")
+
+    def _open_for_recording(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self._file.write(json.dumps({'cassette': CASSETTE_FORMAT, 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S')}) + '\n')
+        atexit.register(self.close)
+        logger.info(f"Recording upstream calls to {self.path}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def call(self, service: str, target: str, request: Dict[str, Any], live: Callable[[], Any]) -> Any:
+        """Run one upstream call through the cassette."""
+        key = _request_key(service, target, request)
+        if self.mode == 'replay':
+            return self._replay(service, target, key)
+
+        start = time.perf_counter()
+        try:
+            response = live()
+        except Exception as e:
+            self._record(service, target, key, request, start, error=_encode_error(e))
+            raise
+        self._record(service, target, key, request, start, response=_encode_response(response))
+        return response
+
+    def _record(self, service: str, target: str, key: str, request: Dict[str, Any], start: float,
+                response: Any = None, error: Optional[Dict[str, Any]] = None):
+        entry = {
+            'service': service,
+            'target': target,
+            'key': key,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 1),
+            # Kept for reading the cassette; replay matches on the key only
+            'request': {name: value for name, value in request.items() if name not in ('key', 'api_key')},
+        }
+        if error is not None:
+            entry['error'] = error
+        else:
+            entry['response'] = response
+        line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            # Sync flush so a killed recording run still leaves a readable file
+            self._file.flush()
+            self.recorded += 1
+
+    def _replay(self, service: str, target: str, key: str) -> Any:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMissError(f"No recorded {service} {target} call matches this request (key {key})")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+            self.replayed += 1
+
+        delay = entry.get('latency_ms', 0) * self.latency_scale / 1000
+        if delay > 0:
+            time.sleep(delay)
+        if 'error' in entry:
+            error = entry['error']
+            raise ReplayedError(error['message'], error.get('code'), error.get('details'))
+        return _decode_response(entry['response'])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'path': self.path, 'mode': self.mode, 'recorded': self.recorded,
+                    'replayed': self.replayed, 'misses': self.misses}
+
+
+def _from_environment() -> Optional[Cassette]:
+    if not UPSTREAM_CASSETTE or UPSTREAM_CASSETTE_MODE == 'off':
+        return None
+    return Cassette(UPSTREAM_CASSETTE, UPSTREAM_CASSETTE_MODE)
+
+
+cassette = _from_environment()
@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import logging
+import threading
+from array import array
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from .text_utils import fold_text
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+CLIMATE_NORMALS_PATH = os.getenv('CLIMATE_NORMALS_PATH', os.path.join(DATA_DIR, 'climate_normals.json'))
+
+# Days ahead a question counts as near-term and goes to the forecast provider
+FORECAST_HORIZON_DAYS = int(os.getenv('FORECAST_HORIZON_DAYS', 7))
+
+# Days covered when a question names no period ("Thời tiết Đà Nẵng thế nào?")
+DEFAULT_FORECAST_DAYS = 3
+
+FIELDS = ('temp_max', 'temp_min', 'rain_mm', 'rain_days')
+
+TYPHOON_LABELS = ['không đáng kể', 'thấp', 'trung bình', 'cao']
+
+# Seasons by folded name; "mùa mưa" differs by region, so it is not a period
+SEASONS = {
+    'mua xuan': ('mùa xuân', [2, 3, 4]),
+    'mua he': ('mùa hè', [5, 6, 7, 8]),
+    'mua thu': ('mùa thu', [9, 10, 11]),
+    'mua dong': ('mùa đông', [12, 1, 2]),
+    'tet': ('dịp Tết', [1, 2]),
+}
+
+MONTH_NAMES_EN = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+                  'august', 'september', 'october', 'november', 'december']
+
+# Folded period wording, most specific first. ISO dates ("2026-11-10") are
+# matched before day/month ones, which would read "11 10" as 11 October
+_ISO_DATE = re.compile(r'\b(\d{4}) (\d{1,2}) (\d{1,2})\b')
+_DATE = re.compile(r'\b(\d{1,2})(?: thang)? (\d{1,2})(?: (?:nam )?(\d{4}))?\b')
+# Days of one month: "từ 10 đến 13/11", "10-13/11"
+_DAY_RANGE = re.compile(r'\b(\d{1,2}) (?:den|toi|to) (\d{1,2})(?: thang)? (\d{1,2})(?: (?:nam )?(\d{4}))?\b')
+# A dash between a day and a day/month means "to" (unfolded text; ISO dates have no slash)
+_RANGE_DASH = re.compile(r'\b(\d{1,2})\s*[\u2013-]\s*(?=\d{1,2}/)')
+_DAYS_AHEAD = re.compile(r'\b(\d{1,2}) ngay (?:toi|sap toi|nua)\b|\bnext (\d{1,2}) days\b')
+# "may" alone is also the folded "máy" (as in "máy bay"), so it needs "in"
+_MONTH = re.compile(r'\bthang (\d{1,2})\b|\b(' + '|'.join(name for name in MONTH_NAMES_EN if name != 'may') +
+                    r')\b|\bin (may)\b')
+_SEASON = re.compile(r'\b(?:' + '|'.join(SEASONS) + r')\b')
+
+
+def _days(start: date, end: date, label: str) -> Dict[str, Any]:
+    return {'kind': 'days', 'start': start, 'end': end, 'label': label}
+
+
+def _months(months: List[int], label: str) -> Dict[str, Any]:
+    return {'kind': 'months', 'months': months, 'label': label}
+
+
+def _day_month(day: int, month: int, year: Optional[str], today: date) -> Optional[date]:
+    """The date of day/month; without a year, the next one from today on."""
+    try:
+        when = date(int(year) if year else today.year, month, day)
+    except ValueError:
+        return None
+    if when < today and not year and (month, day) != (2, 29):
+        when = date(today.year + 1, month, day)
+    return when
+
+
+def _dates(folded: str, today: date) -> List[date]:
+    """The dates named in folded text, in the order they appear."""
+    found = []
+    for match in _ISO_DATE.finditer(folded):
+        try:
+            found.append((match.start(), date(int(match.group(1)), int(match.group(2)), int(match.group(3)))))
+        except ValueError:
+            pass
+    # Blank out ISO dates, keeping positions, so their digits are not read again
+    rest = _ISO_DATE.sub(lambda match: ' ' * len(match.group(0)), folded)
+    for match in _DATE.finditer(rest):
+        when = _day_month(int(match.group(1)), int(match.group(2)), match.group(3), today)
+        if when is not None:
+            found.append((match.start(), when))
+    return [when for _, when in sorted(found)]
+
+
+def _date_label(start: date, end: date) -> str:
+    if start == end:
+        return start.strftime('%d/%m/%Y')
+    return f"từ {start.strftime('%d/%m/%Y')} đến {end.strftime('%d/%m/%Y')}"
+
+
+def parse_period(text: str, today: Optional[date] = None, default: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    The period a weather question is about.
+
+    {'kind': 'days', 'start', 'end', 'label'} for dates and date ranges
+    ("ngày mai", "cuối tuần", "12/11", "2026-11-10", "từ 10 đến 13/11")
+    and {'kind': 'months', 'months', 'label'} for months and seasons
+    ("tháng 7", "mùa hè"). A question naming no period is about the next
+    few days, or None without default.
+    """
+    today = today or date.today()
+    folded = fold_text(_RANGE_DASH.sub(r'\1 đến ', text or ''))
+
+    if re.search(r'\b(?:hom nay|bay gio|hien tai|today|now)\b', folded):
+        return _days(today, today, 'hôm nay')
+    if re.search(r'\b(?:ngay mai|tomorrow)\b', folded):
+        return _days(today + timedelta(days=1), today + timedelta(days=1), 'ngày mai')
+    if re.search(r'\bngay kia\b', folded):
+        return _days(today + timedelta(days=2), today + timedelta(days=2), 'ngày kia')
+    if re.search(r'\b(?:cuoi tuan|weekend)\b', folded):
+        # On a Sunday "cuối tuần" is what is left of this one
+        saturday = today - timedelta(days=1) if today.weekday() == 6 else today + timedelta(days=5 - today.weekday())
+        if re.search(r'\b(?:cuoi tuan (?:sau|toi)|next weekend)\b', folded):
+            saturday += timedelta(days=7)
+        return _days(max(saturday, today), saturday + timedelta(days=1), 'cuối tuần')
+    if re.search(r'\b(?:tuan (?:sau|toi)|next week)\b', folded):
+        monday = today + timedelta(days=7 - today.weekday())
+        return _days(monday, monday + timedelta(days=6), 'tuần sau')
+    if re.search(r'\b(?:tuan nay|this week)\b', folded):
+        return _days(today, today + timedelta(days=6 - today.weekday()), 'tuần này')
+
+    match = _DAYS_AHEAD.search(folded)
+    if match:
+        count = max(1, min(int(match.group(1) or match.group(2)), 31))
+        return _days(today, today + timedelta(days=count - 1), f"{count} ngày tới")
+
+    dates = _dates(folded, today)
+    match = _DAY_RANGE.search(folded)
+    if match and len(dates) < 2:
+        month, year = int(match.group(3)), match.group(4)
+        start = _day_month(int(match.group(1)), month, year, today)
+        end = _day_month(int(match.group(2)), month, year, today)
+        if start is not None and end is not None and start <= end:
+            dates = [start, end]
+    if dates:
+        start, end = dates[0], dates[1] if len(dates) > 1 and dates[1] >= dates[0] else dates[0]
+        return _days(start, end, _date_label(start, end))
+
+    if re.search(r'\b(?:thang nay|this month)\b', folded):
+        return _months([today.month], f"tháng {today.month}")
+    if re.search(r'\b(?:thang (?:sau|toi)|next month)\b', folded):
+        month = today.month % 12 + 1
+        return _months([month], f"tháng {month}")
+    match = _MONTH.search(folded)
+    if match:
+        month = int(match.group(1)) if match.group(1) else MONTH_NAMES_EN.index(match.group(2) or match.group(3)) + 1
+        if 1 <= month <= 12:
+            return _months([month], f"tháng {month}")
+    match = _SEASON.search(folded)
+    if match:
+        label, months = SEASONS[match.group(0)]
+        return _months(months, label)
+
+    if not default:
+        return None
+    return _days(today, today + timedelta(days=DEFAULT_FORECAST_DAYS - 1), f"{DEFAULT_FORECAST_DAYS} ngày tới")
+
+
+def is_near_term(period: Dict[str, Any], today: Optional[date] = None) -> bool:
+    """Whether every day of period is within the forecast horizon (and not past)."""
+    today = today or date.today()
+    return (period['kind'] == 'days' and period['start'] >= today
+            and period['end'] < today + timedelta(days=FORECAST_HORIZON_DAYS))
+
+
+def period_months(period: Dict[str, Any]) -> List[int]:
+    """Months a period falls in, in order."""
+    if period['kind'] == 'months':
+        return list(period['months'])
+    months = []
+    day = period['start']
+    while day <= period['end'] and len(months) < 12:
+        if day.month not in months:
+            months.append(day.month)
+        day = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return months
+
+
+class ClimateNormals:
+    """
+    Monthly climate normals per city: temperatures, rainfall, rainy days, typhoon risk.
+
+    Each field is one flat array('f') with twelve consecutive slots per
+    city (city row * 12 + month - 1); typhoon risk is an array('B'). The
+    whole table is a few kilobytes and a lookup is two index operations.
+    """
+
+    def __init__(self, path: str = CLIMATE_NORMALS_PATH):
+        self._rows: Dict[str, int] = {}
+        self._fields: Dict[str, array] = {field: array('f') for field in FIELDS}
+        self._typhoon = array('B')
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, city: str) -> bool:
+        return city in self._rows
+
+    def load(self, path: str) -> int:
+        """Add the cities of a normals JSON file; returns how many were added."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        added = 0
+        for city, values in data.get('cities', {}).items():
+            if city in self._rows or any(len(values.get(field, ())) != 12 for field in FIELDS):
+                logger.warning(f"Skipping climate normals for {city}: duplicate or incomplete")
+                continue
+            self._rows[city] = len(self._rows)
+            for field in FIELDS:
+                self._fields[field].extend(float(value) for value in values[field])
+            self._typhoon.extend(int(value) for value in values.get('typhoon_risk', [0] * 12))
+            added += 1
+        logger.info(f"Loaded climate normals for {added} cities from {path}")
+        return added
+
+    def month(self, city: str, month: int) -> Optional[Dict[str, Any]]:
+        """Normals of one city and month (1-12), or None for an unknown city."""
+        row = self._rows.get(city)
+        if row is None:
+            return None
+        slot = row * 12 + month - 1
+        normals = {field: round(self._fields[field][slot], 1) for field in FIELDS}
+        normals['typhoon_risk'] = self._typhoon[slot]
+        normals['month'] = month
+        return normals
+
+    def driest_months(self, city: str, count: int = 3) -> List[int]:
+        """The city's months with the fewest rainy days, in calendar order."""
+        row = self._rows.get(city)
+        if row is None:
+            return []
+        rain_days = self._fields['rain_days'][row * 12:row * 12 + 12]
+        return sorted(sorted(range(1, 13), key=lambda month: (rain_days[month - 1], month))[:count])
+
+
+def _advice(normals: Dict[str, Any]) -> str:
+    if normals['typhoon_risk'] >= 2:
+        return "Mùa bão: theo dõi tin bão trước ngày đi và nên chọn lịch trình linh hoạt"
+    if normals['rain_days'] >= 15:
+        return "Mưa nhiều: mang áo mưa và ưu tiên điểm tham quan trong nhà vào buổi chiều"
+    if normals['temp_max'] >= 33:
+        return "Nắng nóng: đi chơi sáng sớm hoặc chiều muộn, mang kem chống nắng và uống đủ nước"
+    if normals['temp_min'] <= 15:
+        return "Trời lạnh: mang áo ấm, nhất là buổi sáng sớm và ban đêm"
+    return "Thời tiết dễ chịu, thuận lợi cho việc tham quan ngoài trời"
+
+
+def format_climate_answer(city: str, period_label: str, months: List[Dict[str, Any]],
+                          best_months: Optional[List[int]] = None, note: Optional[str] = None) -> str:
+    """Render monthly normals as a short Vietnamese answer in the agents' emoji style."""
+    lines = [f"🌤️ Thời tiết {city} {period_label} (số liệu khí hậu trung bình nhiều năm):", ""]
+    if note:
+        lines[1:1] = [note, ""]
+    for normals in months:
+        if len(months) > 1:
+            lines.append(f"📅 Tháng {normals['month']}:")
+        lines.append(f"🌡️ Nhiệt độ: {normals['temp_min']:.0f}–{normals['temp_max']:.0f}°C")
+        lines.append(f"🌧️ Lượng mưa: khoảng {normals['rain_mm']:.0f}mm, {normals['rain_days']:.0f} ngày mưa")
+        lines.append(f"🌀 Nguy cơ bão: {TYPHOON_LABELS[min(normals['typhoon_risk'], 3)]}")
+        lines.append(f"💡 {_advice(normals)}")
+        lines.append("")
+    if best_months:
+        lines.append(f"✅ Ít mưa nhất: tháng {', '.join(str(month) for month in best_months)}")
+    lines.append("Đây là mức trung bình; hãy xem dự báo gần ngày đi để biết thời tiết cụ thể.")
+    return "\n".join(lines)
+
+
+def climate_answer(text: str, city: str, display: str, period: Optional[Dict[str, Any]] = None,
+                   note: Optional[str] = None) -> Optional[str]:
+    """
+    Answer a weather question from the normals of the months it is about.
+
+    city is the canonical city name, display the name shown; None when the
+    table has no normals for the city.
+    """
+    normals = get_climate_normals()
+    if city not in normals:
+        return None
+    period = period or parse_period(text)
+    months = [normals.month(city, month) for month in period_months(period)]
+    best = normals.driest_months(city) if period['kind'] == 'months' else None
+    return format_climate_answer(display, period['label'], months, best, note)
+
+
+_climate_normals: Optional[ClimateNormals] = None
+_climate_normals_lock = threading.Lock()
+
+
+def get_climate_normals() -> ClimateNormals:
+    """The process-wide normals table, loaded on first use."""
+    global _climate_normals
+    if _climate_normals is None:
+        with _climate_normals_lock:
+            if _climate_normals is None:
+                _climate_normals = ClimateNormals()
+    return _climate_normals
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import threading
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterator, Optional
+from monitoring.metrics import SUPPORTING_REQUESTS
+from monitoring.tracing import in_current_context, span
+
+logger = logging.getLogger(__name__)
+
+# Sub-deadline for a supporting agent, counted from launch: the primary agent
+# waits at most this long (and only for whatever is left of it) when it reads
+# the supporting answer
+SUPPORTING_AGENT_TIMEOUT = float(os.getenv('SUPPORTING_AGENT_TIMEOUT', 3.0))
+
+# Threads shared by all chat turns for supporting-agent calls
+SUPPORTING_AGENT_WORKERS = int(os.getenv('SUPPORTING_AGENT_WORKERS', 8))
+
+
+class SupportingInfo(Mapping):
+    """
+    A supporting agent's answer, resolved on first read.
+
+    The primary agent receives this as context['supporting_info'] while the
+    supporting agent is still running, and keeps doing its own upstream
+    fetches. The first lookup waits for the answer only until the
+    sub-deadline; a late or failed answer reads as an empty mapping, so
+    `if context.get('supporting_info')` just leaves it out of the prompt.
+    """
+
+    def __init__(self, agent_name: str, query: str, future: Future, deadline: float):
+        self.agent_name = agent_name
+        self.query = query
+        self._future = future
+        self._deadline = deadline
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+        self.outcome: Optional[str] = None
+
+    def _resolve(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._data is None:
+                self._data = self._wait()
+            return self._data
+
+    def _wait(self) -> Dict[str, Any]:
+        remaining = self._deadline - time.monotonic()
+        with span(f"{self.agent_name} supporting wait", category="collaboration") as wait_span:
+            data = self._collect(max(remaining, 0))
+            if wait_span is not None:
+                wait_span.set_attribute('outcome', self.outcome)
+        return data
+
+    def _collect(self, timeout: float) -> Dict[str, Any]:
+        try:
+            response = self._future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._future.cancel()
+            self._finish('late')
+            logger.info(f"Supporting {self.agent_name} agent missed its deadline, answering without it")
+            return {}
+        except Exception as e:
+            self._finish('error')
+            logger.warning(f"Supporting {self.agent_name} agent failed: {str(e)}")
+            return {}
+
+        if not isinstance(response, dict) or response.get('status') != 'success' or not response.get('content'):
+            self._finish('error')
+            return {}
+        self._finish('merged')
+        return {'agent': self.agent_name, 'query': self.query, 'content': response['content']}
+
+    def _finish(self, outcome: str):
+        self.outcome = outcome
+        SUPPORTING_REQUESTS.inc(agent=self.agent_name, outcome=outcome)
+
+    def close(self):
+        """Called once the primary agent is done; counts answers it never read."""
+        with self._lock:
+            if self._data is None:
+                self._data = {}
+                self._future.cancel()
+                self._finish('unused')
+
+    def __getitem__(self, key: str) -> Any:
+        return self._resolve()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._resolve())
+
+    def __len__(self) -> int:
+        return len(self._resolve())
+
+
+class CollaborationExecutor:
+    """
+    Runs supporting agents alongside the primary one.
+
+    launch() submits the supporting call to a shared thread pool, carrying
+    the turn's trace, request memo and usage scope over, and returns its
+    SupportingInfo straight away. Memoized upstream fetches are shared, so
+    a geocode both agents need is still made once.
+    """
+
+    def __init__(self, max_workers: int = SUPPORTING_AGENT_WORKERS, timeout: float = SUPPORTING_AGENT_TIMEOUT):
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='supporting-agent')
+
+    def launch(self, agent_name: str, query: str, run: Callable[[], Dict[str, Any]],
+               timeout: Optional[float] = None) -> SupportingInfo:
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        def supporting_call() -> Dict[str, Any]:
+            with span(f"{agent_name} agent (supporting)", category="supporting"):
+                return run()
+
+        future = self._pool.submit(in_current_context(supporting_call))
+        logger.info(f"Launched supporting {agent_name} agent: {query}")
+        return SupportingInfo(agent_name, query, future, deadline)
+
+
+collaboration = CollaborationExecutor()
@@ -1,9 +1,13 @@
+import logging
 from typing import Dict, Any
 from .base_agent import BaseAgent
+from .upstream import generate_content, configure_gemini, list_models
 import json
 import os
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 class ConversationAgent(BaseAgent):
@@ -33,49 +37,49 @@ class ConversationAgent(BaseAgent):
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
-            print("Available models:", [model.name for model in models])
+            models = list_models()
+            logger.debug(f"Available models: {[model.name for model in models]}")
             
             # Try to get the specific model
             try:
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
-                print("Successfully initialized gemini-2.0-flash")
+                logger.info("Successfully initialized gemini-2.0-flash")
             except Exception as model_error:
-                print(f"Error initializing gemini-2.0-flash: {str(model_error)}")
+                logger.warning(f"Error initializing gemini-2.0-flash: {str(model_error)}")
                 # Fallback to gemini-pro
-                print("Falling back to gemini-pro")
+                logger.warning("Falling back to gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
                 
         except Exception as e:
-            print(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing Gemini: {str(e)}")
             self.model = None
 
     async def _generate_response(self, prompt):
         """Generate a response using Gemini."""
         if not self.model:
-            print("Gemini model not initialized")
+            logger.error("Gemini model not initialized")
             return None
             
         try:
-            print(f"Generating response for prompt: {prompt[:100]}...")
-            response = self.model.generate_content(prompt)
+            logger.debug("Generating response", extra={"payload": {"prompt": prompt}})
+            response = generate_content(self.model, prompt)
             if response and hasattr(response, 'text'):
-                print(f"Generated response: {response.text[:100]}...")
+                logger.debug("Generated response", extra={"payload": {"response": response.text}})
                 return response.text
             else:
-                print("No response text found in response object")
+                logger.warning("No response text found in response object")
                 return None
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
+            logger.error(f"Error generating response: {str(e)}")
             return None
 
     async def process(self, input_data):
         try:
             user_input = input_data.get("user_input", "").strip().lower()
-            print(f"Processing input: {user_input}")
+            logger.debug("Processing input", extra={"payload": {"user_input": user_input}})
             
             # Handle greetings and small talk
             if self._is_greeting(user_input):
@@ -109,7 +113,7 @@ class ConversationAgent(BaseAgent):
                 if response:
                     try:
                         # Try to parse as JSON first
-                        print(f"Parsing JSON response: {response[:100]}...")
+                        logger.debug("Parsing JSON response", extra={"payload": {"response": response}})
                         analysis = json.loads(response)
                         self.conversation_history.append({"role": "assistant", "content": response})
                         
@@ -134,8 +138,8 @@ class ConversationAgent(BaseAgent):
                             "analysis": analysis
                         }
                     except json.JSONDecodeError as e:
-                        print(f"Error parsing JSON response: {str(e)}")
-                        print(f"Raw response: {response}")
+                        logger.error(f"Error parsing JSON response: {str(e)}")
+                        logger.debug("Raw response", extra={"payload": {"response": response}})
                         # If not JSON, treat as general conversation
                         return {
                             "status": "success",
@@ -156,7 +160,7 @@ class ConversationAgent(BaseAgent):
                         }
                     }
             except Exception as e:
-                print(f"Error generating Gemini response: {str(e)}")
+                logger.error(f"Error generating Gemini response: {str(e)}")
                 # Fallback to basic response if Gemini fails
                 return {
                     "status": "success",
@@ -168,7 +172,7 @@ class ConversationAgent(BaseAgent):
                 }
                 
         except Exception as e:
-            print(f"Error in conversation processing: {str(e)}")
+            logger.error(f"Error in conversation processing: {str(e)}")
             return {
                 "status": "error",
                 "message": "I'm having trouble understanding. Could you please rephrase that?"
@@ -299,7 +303,7 @@ class ConversationAgent(BaseAgent):
             }
             
         except Exception as e:
-            print(f"Error generating follow-up questions: {str(e)}")
+            logger.error(f"Error generating follow-up questions: {str(e)}")
             return {
                 "status": "error",
                 "content": "I'm having trouble understanding. Could you please rephrase your request?"
@@ -0,0 +1,381 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .geocoding import find_city_in_text
+from .airports import get_airports
+from .climate import climate_answer
+from .food_kb import format_food_answer, get_food_kb
+from .guide_store import guide_store
+from .history_index import personal_facts
+from .poi_index import format_pois, get_poi_index
+from .resilience import quota, watch_rejections
+from .upstream import add_response_listener
+from monitoring.metrics import DEGRADED_ANSWERS, DEGRADED_MODE
+
+logger = logging.getLogger(__name__)
+
+# Last good answers and recent SerpAPI results, kept to answer from while
+# Gemini's quota is exhausted
+ANSWER_STORE_PATH = os.getenv(
+    'ANSWER_STORE_PATH',
+    os.path.join(tempfile.gettempdir(), 'travel-assistant', 'answers.sqlite3')
+)
+ANSWER_STORE_MAX_AGE = int(os.getenv('ANSWER_STORE_MAX_AGE', 7 * 24 * 3600))  # 7 days
+
+# Longest answer kept per agent and city
+ANSWER_MAX_CHARS = 8000
+
+# Items kept per SerpAPI snapshot and shown per card
+SERP_CARD_ITEMS = 5
+
+# SerpAPI engines whose recent results can stand in for each agent's answer
+AGENT_ENGINES = {
+    'flight': ('google_flights',),
+    'hotel': ('google_hotels',),
+    'place': ('google_maps', 'google'),
+    'food': ('google_maps',)
+}
+
+# Answers already served from local data are not worth remembering
+LOCAL_SOURCES = ('local_poi_index', 'local_food_kb', 'forecast', 'climate_normals', 'guide_store', 'degraded')
+
+SOURCE_LABELS = {
+    'stale_cache': 'câu trả lời đã lưu cho câu hỏi tương tự',
+    'last_answer': 'câu trả lời gần nhất',
+    'serp_card': 'kết quả tìm kiếm gần đây',
+    'climate_normals': 'số liệu khí hậu trung bình',
+    'food_kb': 'cẩm nang ẩm thực có sẵn',
+    'poi_index': 'danh bạ địa điểm có sẵn',
+    'guide_store': 'cẩm nang điểm đến có sẵn'
+}
+
+
+class AnswerStore:
+    """
+    SQLite store of the last good answer per agent and city, and of the
+    latest SerpAPI items per engine and city.
+
+    Rows are overwritten in place, so the store stays at one row per key;
+    rows older than ANSWER_STORE_MAX_AGE are pruned on write. Falls back to
+    memory when the path is not writable, like GeocodeCache.
+    """
+
+    def __init__(self, path: str, max_age: int = ANSWER_STORE_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._writes = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Answer store at {path} unavailable ({str(e)}), using memory only")
+            self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "agent TEXT, city TEXT, content TEXT, stored_at REAL, PRIMARY KEY (agent, city))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS serp ("
+                "engine TEXT, city TEXT, items TEXT, stored_at REAL, PRIMARY KEY (engine, city))"
+            )
+            self._conn.commit()
+
+    def _write(self, sql: str, values: tuple):
+        with self._lock:
+            self._conn.execute(sql, values)
+            self._writes += 1
+            if self._writes % 100 == 0:
+                cutoff = time.time() - self.max_age
+                self._conn.execute("DELETE FROM answers WHERE stored_at < ?", (cutoff,))
+                self._conn.execute("DELETE FROM serp WHERE stored_at < ?", (cutoff,))
+            self._conn.commit()
+
+    def _read(self, sql: str, values: tuple) -> Optional[tuple]:
+        with self._lock:
+            row = self._conn.execute(sql, values).fetchone()
+        if row is None or row[-1] < time.time() - self.max_age:
+            return None
+        return row
+
+    def remember_answer(self, agent: str, city: str, content: str):
+        self._write("INSERT OR REPLACE INTO answers (agent, city, content, stored_at) VALUES (?, ?, ?, ?)",
+                    (agent, city, content[:ANSWER_MAX_CHARS], time.time()))
+
+    def last_answer(self, agent: str, city: str) -> Optional[Tuple[str, float]]:
+        row = self._read("SELECT content, stored_at FROM answers WHERE agent = ? AND city = ?", (agent, city))
+        return (row[0], row[1]) if row else None
+
+    def remember_serp(self, engine: str, city: str, items: List[Dict[str, Any]]):
+        self._write("INSERT OR REPLACE INTO serp (engine, city, items, stored_at) VALUES (?, ?, ?, ?)",
+                    (engine, city, json.dumps(items, ensure_ascii=False, default=str), time.time()))
+
+    def recent_serp(self, engine: str, city: str) -> Optional[Tuple[List[Dict[str, Any]], float]]:
+        row = self._read("SELECT items, stored_at FROM serp WHERE engine = ? AND city = ?", (engine, city))
+        return (json.loads(row[0]), row[1]) if row else None
+
+
+# Called as lookup(agent, question, facts) -> (content, stored_at) or None
+StaleLookup = Callable[[str, str, Optional[Dict[str, List[str]]]], Optional[Tuple[str, float]]]
+
+
+def _city(text: str) -> Tuple[str, str]:
+    """(store key, display name) of the city in text; ('', '') when there is none."""
+    city = find_city_in_text(text or '')
+    if not city:
+        return '', ''
+    return city['name'], city.get('name_vi', city['name'])
+
+
+def _subject(agent: str, text: str) -> Tuple[str, str]:
+    """
+    (store key, display name) of what a question is about; ('', '') when unknown.
+
+    That is the city, except for flights: the first city of "từ Hà Nội đến
+    Đà Nẵng" is the origin, so flights are keyed by their route, and only
+    when both ends resolve.
+    """
+    if agent != 'flight':
+        return _city(text)
+    airports = get_airports()
+    origin, destination = airports.resolve_route(text or '')
+    if not origin or not destination:
+        return '', ''
+    return _route_key(origin, destination), f"{airports.describe(origin)} → {airports.describe(destination)}"
+
+
+def _route_key(origin: str, destination: str) -> str:
+    return f"{origin}>{destination}"
+
+
+def _serp_items(engine: str, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The result list of a SerpAPI response, trimmed to the fields cards show."""
+    if engine == 'google_flights':
+        items = (response.get('best_flights') or []) + (response.get('other_flights') or [])
+        items = items or response.get('flights_results') or []
+        return [{
+            'airline': ((item.get('flights') or [{}])[0]).get('airline'),
+            'departure': ((item.get('flights') or [{}])[0].get('departure_airport') or {}).get('time'),
+            'duration': item.get('total_duration'),
+            'price': item.get('price')
+        } for item in items[:SERP_CARD_ITEMS]]
+    if engine == 'google_hotels':
+        items = response.get('properties') or response.get('hotels_results') or []
+        return [{
+            'name': item.get('name'),
+            'rate': (item.get('rate_per_night') or {}).get('lowest'),
+            'rating': item.get('overall_rating')
+        } for item in items[:SERP_CARD_ITEMS]]
+    if engine == 'google_maps':
+        items = response.get('local_results') or []
+        return [{
+            'name': item.get('title'),
+            'address': item.get('address'),
+            'rating': item.get('rating')
+        } for item in items[:SERP_CARD_ITEMS]]
+    items = response.get('organic_results') or []
+    return [{'name': item.get('title'), 'link': item.get('link')} for item in items[:SERP_CARD_ITEMS]]
+
+
+def _card_line(engine: str, item: Dict[str, Any]) -> str:
+    if engine == 'google_flights':
+        parts = [f"✈️ {item.get('airline') or 'Chuyến bay'}"]
+        if item.get('departure'):
+            parts.append(f"khởi hành {item['departure']}")
+        if item.get('duration'):
+            parts.append(f"{item['duration']} phút")
+        if item.get('price') is not None:
+            parts.append(f"giá từ {item['price']}")
+        return " – ".join(parts)
+    if engine == 'google_hotels':
+        parts = [f"🏨 {item.get('name')}"]
+        if item.get('rate'):
+            parts.append(f"{item['rate']}/đêm")
+        if item.get('rating'):
+            parts.append(f"⭐ {item['rating']}")
+        return " – ".join(parts)
+    parts = [f"📍 {item.get('name')}"]
+    if item.get('address'):
+        parts.append(item['address'])
+    if item.get('rating'):
+        parts.append(f"⭐ {item['rating']}")
+    if item.get('link'):
+        parts.append(item['link'])
+    return " – ".join(parts)
+
+
+class DegradedAnswers:
+    """
+    Answers turns locally while Gemini's quota is exhausted or an upstream's breaker is open.
+
+    Every good agent answer about a city is remembered per agent and city,
+    and every SerpAPI response is snapshotted per engine and city (per
+    route for flights). In
+    degraded mode (resilience.quota) a turn is answered from, in order:
+    the climate normals (weather only), an expired response cache entry
+    for the same question, the last good answer about the city, a card
+    built from the latest SerpAPI snapshot, the food knowledge base, the
+    local POI index, or the destination guide. Each such answer starts
+    with a freshness notice and carries a "freshness" field with its
+    source and age.
+
+    Answers to questions that name no city, or shaped by facts from the
+    asker's earlier messages (dates, party size, budget), are neither
+    remembered nor served from the shared store: one row per agent and
+    city would hand one user's answer to the next.
+    """
+
+    def __init__(self, store: AnswerStore):
+        self.store = store
+        self._stale_lookups: List[StaleLookup] = []
+
+    def add_stale_source(self, lookup: StaleLookup):
+        """Answer from lookup(agent, question, facts) (e.g. expired response cache entries) before the store."""
+        self._stale_lookups.append(lookup)
+
+    def capture_serp(self, service: str, target: str, request: Dict[str, Any], response: Any):
+        """Upstream response listener: keep the latest SerpAPI items per engine and city."""
+        if service != 'serpapi' or not isinstance(response, dict) or 'error' in response:
+            return
+        if target == 'google_flights':
+            # Flights are kept per route, like the answers (see _subject)
+            departure, arrival = request.get('departure_id'), request.get('arrival_id')
+            city = _route_key(departure, arrival) if departure and arrival else ''
+        else:
+            city, _ = _city(" ".join(str(request.get(name) or '') for name in ('q', 'location')))
+        items = _serp_items(target, response)
+        if city and items:
+            self.store.remember_serp(target, city, items)
+
+    def remember(self, agent: str, user_input: str, response: Dict[str, Any],
+                 facts: Optional[Dict[str, List[str]]] = None):
+        if response.get('status') != 'success' or response.get('source') in LOCAL_SOURCES:
+            return
+        if personal_facts(user_input, facts):
+            return
+        content = response.get('content')
+        if not isinstance(content, str) or not content.strip():
+            return
+        city, _ = _subject(agent, user_input)
+        if city:
+            self.store.remember_answer(agent, city, content)
+
+    def answer(self, agent: str, user_input: str,
+               facts: Optional[Dict[str, List[str]]] = None) -> Optional[Dict[str, Any]]:
+        """A local answer for this turn, or None if nothing fits."""
+        city, display = _subject(agent, user_input)
+
+        # Normals match the period asked about, which a remembered answer may not
+        if city and agent == 'weather':
+            normals = climate_answer(user_input, city, display)
+            if normals:
+                return self._degraded(agent, 'climate_normals', normals)
+
+        for lookup in self._stale_lookups:
+            stale = lookup(agent, user_input, facts)
+            if stale:
+                return self._degraded(agent, 'stale_cache', stale[0], stale[1])
+
+        last = self.store.last_answer(agent, city) if city and not personal_facts(user_input, facts) else None
+        if last:
+            return self._degraded(agent, 'last_answer', last[0], last[1])
+
+        for engine in AGENT_ENGINES.get(agent, ()):
+            recent = self.store.recent_serp(engine, city) if city else None
+            if recent:
+                lines = [_card_line(engine, item) for item in recent[0]]
+                return self._degraded(agent, 'serp_card', "\n".join(lines), recent[1])
+
+        if city and agent == 'food':
+            dishes, _ = get_food_kb().search(user_input, city=city, kind='dish')
+            if dishes:
+                areas, _ = get_food_kb().search("", city=city, kind='area', limit=2)
+                return self._degraded(agent, 'food_kb', format_food_answer(display, dishes, areas))
+
+        if city and agent in ('place', 'food'):
+            places = get_poi_index().search(user_input, city=display, category='food' if agent == 'food' else None,
+                                            limit=5)
+            if places:
+                title = f"🍜 Gợi ý ăn uống ở {display}:" if agent == 'food' else f"🗺️ Địa điểm nổi bật ở {display}:"
+                return self._degraded(agent, 'poi_index', format_pois(places, title))
+
+        if city and agent in ('place', 'weather'):
+            guide = guide_store.get(city)
+            if guide:
+                generated_at = datetime.fromisoformat(guide['generated_at']).timestamp()
+                return self._degraded(agent, 'guide_store', guide['content'], generated_at)
+        return None
+
+    def _degraded(self, agent: str, source: str, content: str, as_of: Optional[float] = None) -> Dict[str, Any]:
+        DEGRADED_ANSWERS.inc(agent=agent, source=source)
+        if as_of:
+            notice = (f"⚠️ Hệ thống AI đang quá tải. Đây là {SOURCE_LABELS[source]} "
+                      f"(cập nhật lúc {datetime.fromtimestamp(as_of).strftime('%H:%M %d/%m/%Y')}), "
+                      f"có thể chưa phản ánh thông tin mới nhất.")
+        else:
+            notice = f"⚠️ Hệ thống AI đang quá tải. Đây là thông tin từ {SOURCE_LABELS[source]}, có thể chưa cập nhật."
+        return {
+            "status": "success",
+            "content": f"{notice}\n\n{content}",
+            "source": "degraded",
+            "freshness": {
+                "mode": "degraded",
+                "source": source,
+                "as_of": datetime.fromtimestamp(as_of).isoformat(timespec='seconds') if as_of else None,
+                "age_minutes": round((time.time() - as_of) / 60) if as_of else None
+            }
+        }
+
+    def _unavailable(self, agent: str) -> Dict[str, Any]:
+        """The error a degraded turn gets when no local source has anything on the question."""
+        DEGRADED_ANSWERS.inc(agent=agent, source='none')
+        return {
+            "status": "error",
+            "message": "⚠️ Hệ thống AI đang quá tải và chưa có thông tin lưu sẵn cho câu hỏi này. "
+                       "Vui lòng thử lại sau ít phút.",
+            "source": "degraded",
+            "freshness": {"mode": "degraded", "source": None, "as_of": None, "age_minutes": None}
+        }
+
+    def run(self, agent: str, user_input: str, answer: Callable[[], Dict[str, Any]],
+            facts: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+        """
+        Run one agent turn with degraded-mode handling.
+
+        Outside degraded mode the agent answers and a good answer is
+        remembered. In degraded mode the turn is answered locally, except
+        for probe turns, which call the agent and fall back to the local
+        answer if it fails. A turn that fails because a circuit breaker
+        turned its upstream calls away is answered locally as well. facts
+        are the session's history facts (HistoryIndexes.facts).
+        """
+        if quota.serve_locally():
+            return self.answer(agent, user_input, facts) or self._unavailable(agent)
+
+        with quota.probe() if quota.active else nullcontext(), watch_rejections() as rejections:
+            response = answer()
+        if not isinstance(response, dict):
+            return response
+        if response.get('status') == 'success':
+            self.remember(agent, user_input, response, facts)
+            return response
+        if rejections:
+            logger.warning(f"{agent} turn failed on open circuit(s) {', '.join(sorted(set(rejections)))}, "
+                           f"answering locally")
+            return self.answer(agent, user_input, facts) or self._unavailable(agent)
+        if quota.active:
+            # Degraded mode started during this turn, or the probe hit the quota again
+            return self.answer(agent, user_input, facts) or response
+        return response
+
+
+degraded_answers = DegradedAnswers(AnswerStore(ANSWER_STORE_PATH))
+add_response_listener(degraded_answers.capture_serp)
+DEGRADED_MODE.set_function(lambda: {(): 1.0 if quota.active else 0.0})
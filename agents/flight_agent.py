@@ -1,27 +1,31 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 try:
     from serpapi import Client
 except ImportError:
-    print("Warning: SERP API not installed. Please run: pip install serpapi")
+    logger.warning("SERP API not installed. Please run: pip install serpapi")
     Client = None
 
 try:
     from serpapi.google_search import GoogleSearch
 except ImportError:
-    print("Warning: Google Search Results not installed. Please run: pip install google-search-results")
+    logger.warning("Google Search Results not installed. Please run: pip install google-search-results")
     GoogleSearch = None
 
 import os
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
 from .base_agent import BaseAgent
-import logging
+from .upstream import generate_content, serp_search, configure_gemini, list_models
+from .airports import get_airports, resolve_airport, resolve_route
+from .climate import parse_period
+from .history_index import prompt_history
 import re
 import google.generativeai as genai
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -40,10 +44,10 @@ class FlightAgent(BaseAgent):
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
+            models = list_models()
             available_models = [model.name for model in models]
             logger.info(f"Available models: {available_models}")
             
@@ -184,7 +188,7 @@ NEVER just list websites. ALWAYS show specific flight information."""
             """
             
             # Get response from Gemini
-            response = self.model.generate_content(query)
+            response = generate_content(self.model, query)
             
             if not response or not hasattr(response, 'text'):
                 return {
@@ -259,6 +263,10 @@ NEVER just list websites. ALWAYS show specific flight information."""
                         current_flight['flight_number'] = flight_info
                         current_flight['airline'] = parts[1].strip()
                 
+                # Details before the first ✈️ line are preamble, not a flight
+                elif not current_flight:
+                    continue
+
                 # Parse other flight details
                 elif '🛫' in line:
                     time_match = re.search(r'(\d{2}:\d{2})', line)
@@ -312,64 +320,34 @@ NEVER just list websites. ALWAYS show specific flight information."""
             entities = input_data.get('entities', {})
             history = input_data.get('history', [])
             
-            logging.info(f"FlightAgent processing input with context: {user_input}")
+            logger.info(f"FlightAgent processing input with context: {user_input}")
             
             # Extract important information from context
             locations = entities.get('locations', [])
             if context.get('locations'):
                 locations.extend(context.get('locations', []))
                 
+            # Airports are resolved locally; a search only goes out with known codes
+            from_location, to_location = self._resolve_route(user_input, locations)
+                
             # Use SERP API if available
             if self.serp_api_key and GoogleSearch is not None:
-                # Try to extract from/to locations
-                from_location = None
-                to_location = None
-                
-                # First check entities
-                if locations and len(locations) >= 2:
-                    from_location = locations[0]
-                    to_location = locations[1]
-                else:
-                    # Extract from text with regex
-                    from_patterns = [
-                        r'từ\s+([A-Za-z\s]+)\s+đến',
-                        r'từ\s+([A-Za-z\s]+)',
-                        r'([A-Za-z\s]+)\s+đến'
-                    ]
-                    
-                    to_patterns = [
-                        r'đến\s+([A-Za-z\s]+)',
-                        r'tới\s+([A-Za-z\s]+)'
-                    ]
-                    
-                    for pattern in from_patterns:
-                        matches = re.search(pattern, user_input, re.IGNORECASE)
-                        if matches:
-                            from_location = matches.group(1).strip()
-                            break
-                            
-                    for pattern in to_patterns:
-                        matches = re.search(pattern, user_input, re.IGNORECASE)
-                        if matches:
-                            to_location = matches.group(1).strip()
-                            break
-                
-                # If we have both locations, attempt to use SERP API
+                # If we have both airports, attempt to use SERP API
                 if from_location and to_location:
-                    logging.info(f"Extracted flight route from context: {from_location} to {to_location}")
+                    logger.info(f"Extracted flight route from context: {from_location} to {to_location}")
                     try:
                         # Use SERP API to get flight info
                         search_params = {
                             'engine': 'google_flights',
                             'departure_id': from_location,
                             'arrival_id': to_location,
+                            'outbound_date': self._outbound_date(user_input),
                             'type': '2',  # one-way flight
                             'hl': 'vi',
                             'api_key': self.serp_api_key
                         }
                         
-                        search = GoogleSearch(search_params)
-                        results = search.get_dict()
+                        results = serp_search(search_params)
                         
                         if results and 'error' not in results:
                             # Get weather info if available
@@ -378,7 +356,9 @@ NEVER just list websites. ALWAYS show specific flight information."""
                                 weather_info = context['supporting_info'].get('content', '')
                             
                             # Format flight results using the model
-                            results_summary = f"Kết quả tìm kiếm chuyến bay từ {from_location} đến {to_location}:\n\n"
+                            airports = get_airports()
+                            results_summary = (f"Kết quả tìm kiếm chuyến bay từ {airports.describe(from_location)} "
+                                               f"đến {airports.describe(to_location)}:\n\n")
                             results_summary += str(results)
                             
                             prompt = f"""Bạn là chuyên gia về chuyến bay. 
@@ -398,7 +378,7 @@ Hãy định dạng thông tin này thành phản hồi hữu ích bằng tiến
                                 prompt += "\n\nHãy cá nhân hóa phản hồi dựa trên cuộc trò chuyện trước đó."
                             
                             # Use AI to format the results nicely
-                            formatted_response = self.model.generate_content(prompt)
+                            formatted_response = generate_content(self.model, prompt)
                             
                             return {
                                 "status": "success",
@@ -406,50 +386,19 @@ Hãy định dạng thông tin này thành phản hồi hữu ích bằng tiến
                                 "raw_data": results
                             }
                     except Exception as search_error:
-                        logging.error(f"Error using SERP API with context: {str(search_error)}")
+                        logger.error(f"Error using SERP API with context: {str(search_error)}")
                         # Fall back to AI-generated response
+                else:
+                    logger.info(f"No flight search: route not resolved to airports ({from_location} to {to_location})")
             else: 
                 # Nếu không có SERP_API_KEY, sử dụng AI để tạo dữ liệu giả lập
-                logging.info("SERP API not available, using AI-generated flight data instead")
-                
-                # Extract from_location and to_location from context if available
-                from_location = None
-                to_location = None
-                
-                # First check entities
-                if locations and len(locations) >= 2:
-                    from_location = locations[0]
-                    to_location = locations[1]
-                else:
-                    # Extract from text with regex
-                    from_patterns = [
-                        r'từ\s+([A-Za-z\s]+)\s+đến',
-                        r'từ\s+([A-Za-z\s]+)',
-                        r'([A-Za-z\s]+)\s+đến'
-                    ]
-                    
-                    to_patterns = [
-                        r'đến\s+([A-Za-z\s]+)',
-                        r'tới\s+([A-Za-z\s]+)'
-                    ]
-                    
-                    for pattern in from_patterns:
-                        matches = re.search(pattern, user_input, re.IGNORECASE)
-                        if matches:
-                            from_location = matches.group(1).strip()
-                            break
-                            
-                    for pattern in to_patterns:
-                        matches = re.search(pattern, user_input, re.IGNORECASE)
-                        if matches:
-                            to_location = matches.group(1).strip()
-                            break
+                logger.info("SERP API not available, using AI-generated flight data instead")
                 
                 # Kiểm tra nếu đã xác định được địa điểm đi và đến
                 if from_location and to_location:
                     # Chỉnh prompt giúp Gemini tạo dữ liệu chuyến bay thực tế hơn
                     enhanced_prompt = f"""Bạn là chuyên gia về chuyến bay và lịch trình bay.
-Hãy tạo dữ liệu chính xác, thực tế về các chuyến bay từ {from_location} đến {to_location}.
+Hãy tạo dữ liệu chính xác, thực tế về các chuyến bay từ {get_airports().describe(from_location)} đến {get_airports().describe(to_location)}.
 Cung cấp:
 1. Số hiệu chuyến bay thực (VN123, VJ567, QH912, v.v.)
 2. Giờ khởi hành và đến theo múi giờ địa phương
@@ -478,7 +427,7 @@ Thêm lưu ý hữu ích cho hành khách dựa trên tuyến bay này.
                         enhanced_prompt += "\n\nHãy cá nhân hóa phản hồi dựa trên cuộc trò chuyện trước đó."
                     
                     # Generate response using Gemini
-                    response = self.model.generate_content(enhanced_prompt)
+                    response = generate_content(self.model, enhanced_prompt)
                     
                     if not response or not hasattr(response, 'text'):
                         return {
@@ -497,7 +446,7 @@ Thêm lưu ý hữu ích cho hành khách dựa trên tuyến bay này.
             if context.get('supporting_info') and context['supporting_info'].get('agent') == 'weather':
                 weather_info = context['supporting_info'].get('content', '')
                 if weather_info:
-                    logging.info(f"Retrieved weather info: {weather_info}")
+                    logger.info(f"Retrieved weather info: {weather_info}")
             
             # Enhanced prompt with context
             enhanced_prompt = f"""You are a flight booking expert. Your main task is to provide specific flight information. When users ask about flights, ALWAYS show actual flight details.
@@ -514,7 +463,7 @@ Context information:
             
             # Add conversation history for context
             if history and len(history) > 0:
-                recent_history = history[-3:] if len(history) > 3 else history
+                recent_history = prompt_history(history, limit=3)
                 history_text = "\nRecent conversation:\n"
                 for message in recent_history:
                     role = message.get('role', 'unknown')
@@ -536,7 +485,7 @@ Respond to the above query with detailed flight information.
 """
             
             # Generate response using Gemini
-            response = self.model.generate_content(enhanced_prompt)
+            response = generate_content(self.model, enhanced_prompt)
             
             if not response or not hasattr(response, 'text'):
                 return {
@@ -544,19 +493,50 @@ Respond to the above query with detailed flight information.
                     "message": "Không thể tìm thông tin chuyến bay. Vui lòng thử lại."
                 }
             
-            logging.info(f"FlightAgent contextualized response: {response.text}")
+            logger.info(f"FlightAgent contextualized response: {response.text}")
             return {
                 "status": "success",
                 "content": response.text
             }
             
         except Exception as e:
-            logging.error(f"FlightAgent error in process_with_context: {str(e)}")
+            logger.error(f"FlightAgent error in process_with_context: {str(e)}")
             return {
                 "status": "error",
                 "message": f"An error occurred: {str(e)}"
             }
 
+    def _resolve_route(self, user_input: str, locations: list) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (origin, destination) IATA codes, comma-joined for multi-airport cities.
+
+        The message decides first; places mentioned earlier in the
+        conversation fill a missing destination (the latest) or origin.
+        """
+        origin, destination = resolve_route(user_input)
+        for location in reversed(locations or []):
+            if origin and destination:
+                break
+            codes = resolve_airport(location)
+            if not codes or codes in (origin, destination):
+                continue
+            if destination is None:
+                destination = codes
+            elif origin is None:
+                origin = codes
+        return origin, destination
+
+    def _outbound_date(self, user_input: str) -> str:
+        """Departure date (YYYY-MM-DD) named in the message, tomorrow if none."""
+        today = date.today()
+        period = parse_period(user_input, today, default=False)
+        if period and period['kind'] == 'days':
+            return max(period['start'], today).isoformat()
+        if period and period['months'][0] != today.month:
+            month = period['months'][0]
+            return date(today.year + (month < today.month), month, 1).isoformat()
+        return (today + timedelta(days=1)).isoformat()
+
     async def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """Validate the input data."""
         if 'type' not in input_data:
@@ -582,7 +562,17 @@ Respond to the above query with detailed flight information.
                     "message": "Google Search Results is not available. Please install google-search-results package."
                 }
             
-            print(f"Searching for flights from {from_city} to {to_city} on {date}")
+            logger.info(f"Searching for flights from {from_city} to {to_city} on {date}")
+            
+            # google_flights takes airport codes; an unknown place is not worth a search
+            departure_id = resolve_airport(from_city)
+            arrival_id = resolve_airport(to_city)
+            if not departure_id or not arrival_id:
+                unknown = from_city if not departure_id else to_city
+                return {
+                    "status": "error",
+                    "message": f"Không tìm thấy sân bay cho \"{unknown}\". Vui lòng nhập tên thành phố hoặc mã sân bay (ví dụ: HAN, SGN)."
+                }
             
             # First, use Gemini to enhance the search query
             prompt = f"""
@@ -608,8 +598,8 @@ Respond to the above query with detailed flight information.
             # Then perform the actual search
             search_params = {
                 'engine': 'google_flights',
-                'departure_id': from_city,
-                'arrival_id': to_city,
+                'departure_id': departure_id,
+                'arrival_id': arrival_id,
                 'outbound_date': date,
                 'type': '2',  # 2 for one-way flights
                 'hl': 'en',
@@ -617,11 +607,13 @@ Respond to the above query with detailed flight information.
                 'api_key': self.serp_api_key
             }
             
-            print("Making API request with params:", search_params)
-            search = GoogleSearch(search_params)
-            results = search.get_dict()
+            logger.debug("SerpAPI flight search", extra={"payload": {k: v for k, v in search_params.items() if k != 'api_key'}})
+            results = serp_search(search_params)
             
-            print("API Response:", results)
+            logger.info(
+                f"SerpAPI returned {len(results.get('flights_results') or [])} flights",
+                extra={"payload": results}
+            )
             
             if 'flights_results' in results:
                 # Use Gemini to analyze and summarize the results
@@ -643,7 +635,7 @@ Respond to the above query with detailed flight information.
                     "analysis": analysis["content"] if analysis["status"] == "success" else None
                 }
             else:
-                print("No flights found in results")
+                logger.warning("No flights found in results")
                 return {
                     "status": "error",
                     "message": "Không tìm thấy chuyến bay phù hợp. Vui lòng thử lại với ngày khác hoặc tuyến bay khác.",
@@ -651,7 +643,7 @@ Respond to the above query with detailed flight information.
                 }
                 
         except Exception as e:
-            print(f"Error in search_flights: {str(e)}")
+            logger.error(f"Error in search_flights: {str(e)}")
             return {
                 "status": "error",
                 "message": str(e)
@@ -674,8 +666,7 @@ Respond to the above query with detailed flight information.
                 "api_key": self.serp_api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = serp_search(params)
             
             if 'flights_results' in results:
                 flight_text = str(results['flights_results'][0])
@@ -706,7 +697,7 @@ Respond to the above query with detailed flight information.
                 }
                 
         except Exception as e:
-            print(f"Error in get_flight_details: {str(e)}")
+            logger.error(f"Error in get_flight_details: {str(e)}")
             return {
                 "status": "error",
                 "message": str(e)
@@ -731,18 +722,18 @@ Respond to the above query with detailed flight information.
     async def _generate_response(self, prompt):
         """Generate a response using Gemini."""
         if not self.model:
-            print("Gemini model not initialized")
+            logger.error("Gemini model not initialized")
             return None
             
         try:
-            print(f"Generating response for prompt: {prompt[:100]}...")
-            response = self.model.generate_content(prompt)
+            logger.debug("Generating response", extra={"payload": {"prompt": prompt}})
+            response = generate_content(self.model, prompt)
             if response and hasattr(response, 'text'):
-                print(f"Generated response: {response.text[:100]}...")
+                logger.debug("Generated response", extra={"payload": {"response": response.text}})
                 return response.text
             else:
-                print("No response text found in response object")
+                logger.warning("No response text found in response object")
                 return None
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
+            logger.error(f"Error generating response: {str(e)}")
             return None 
\ No newline at end of file
@@ -1,4 +1,11 @@
 from .base_agent import BaseAgent
+from .upstream import generate_content, configure_gemini, retry_delay, list_models, model_available
+from .resilience import CircuitOpenError, QuotaExhaustedError, quota
+from .geocoding import find_city_in_text
+from .poi_index import get_poi_index, is_freshness_sensitive, format_pois
+from .food_kb import get_food_kb, format_food_answer, food_facts, needs_live_data
+from .history_index import prompt_history
+from monitoring.metrics import record_cache
 import os
 import google.generativeai as genai
 import time
@@ -6,8 +13,6 @@ import re
 import logging
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class FoodAgent(BaseAgent):
@@ -29,24 +34,24 @@ Use emojis to make responses more engaging and appetizing.
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
-            print("Available models:", [model.name for model in models])
+            models = list_models()
+            logger.debug(f"Available models: {[model.name for model in models]}")
             
             # Try to get the specific model
             try:
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
-                print("Successfully initialized gemini-2.0-flash")
+                logger.info("Successfully initialized gemini-2.0-flash")
             except Exception as model_error:
-                print(f"Error initializing gemini-2.0-flash: {str(model_error)}")
+                logger.warning(f"Error initializing gemini-2.0-flash: {str(model_error)}")
                 # Fallback to gemini-pro
-                print("Falling back to gemini-pro")
+                logger.warning("Falling back to gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
                 
         except Exception as e:
-            print(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing Gemini: {str(e)}")
             self.model = None
 
     def process(self, input_data, conversation_history=None):
@@ -60,8 +65,12 @@ Use emojis to make responses more engaging and appetizing.
             location = self._extract_location(input_data)
             cuisine = self._extract_cuisine(input_data)
             
-            # Generate response
-            response = self._generate_response(location, cuisine)
+            # Answer evergreen questions from the food knowledge base and POI index first
+            response = self._kb_answer(input_data, location)
+            if not response:
+                response = self._local_food_answer(input_data, location)
+            if not response:
+                response = self._generate_response(location, cuisine)
             
             return {
                 "agent": self.name,
@@ -79,9 +88,84 @@ Use emojis to make responses more engaging and appetizing.
     
     def _extract_location(self, text):
         """Extract location from input text"""
-        # TODO: Implement location extraction logic
+        city = find_city_in_text(text)
+        if city:
+            return city.get('name_vi', city['name'])
         return "Đà Nẵng"  # Default for now
     
+    def _local_food_answer(self, text, location, allow_stale=False):
+        """Answer from the local POI index, or None if nothing matches the question or live data is needed"""
+        if is_freshness_sensitive(text) and not allow_stale:
+            return None
+        
+        # No match means the question is about something the index does not
+        # know; any food place in the city would not answer it
+        places = get_poi_index().search(text, city=location, category='food', limit=5)
+        record_cache('poi_index', bool(places))
+        if not places:
+            return None
+        
+        return format_pois(places, f"🍜 Gợi ý ăn uống ở {location}:")
+    
+    def _kb_lookup(self, text, city_key):
+        """(dishes, eating areas, unmatched words) from the food knowledge base"""
+        kb = get_food_kb()
+        dishes, unmatched = kb.search(text, city=city_key, kind='dish', limit=5)
+        areas, _ = kb.search(text, city=city_key, kind='area', limit=2)
+        if dishes and not areas:
+            areas, _ = kb.search("", city=city_key, kind='area', limit=2)
+        record_cache('food_kb', bool(dishes))
+        return dishes, areas, unmatched
+
+    def _kb_answer(self, text, location, allow_stale=False):
+        """
+        Templated answer from the food knowledge base, or None.
+
+        Only used when the knowledge base covers every word of the question
+        and it needs no live data (typical prices are in the knowledge base,
+        so asking for a price is fine).
+        """
+        city = find_city_in_text(location)
+        if not city:
+            return None
+        dishes, areas, unmatched = self._kb_lookup(text, city['name'])
+        if not dishes:
+            return None
+        if (unmatched or needs_live_data(text)) and not allow_stale:
+            return None
+        answer = format_food_answer(location, dishes, areas)
+        places = self._local_food_answer(text, location, allow_stale=True)
+        return f"{answer}\n\n{places}" if places else answer
+
+    def _grounded_answer(self, user_input, location, context):
+        """
+        Short Gemini rewrite over retrieved knowledge-base facts, or None.
+
+        For questions the knowledge base only partly covers ("món chay cho
+        trẻ em ở Huế"): the prompt carries a few hundred tokens of facts
+        instead of the open-ended system prompt and history.
+        """
+        city = find_city_in_text(location)
+        if not city or needs_live_data(user_input):
+            return None
+        dishes, areas, _ = self._kb_lookup(user_input, city['name'])
+        if not dishes:
+            return None
+        prompt = (
+            f"Bạn là chuyên gia ẩm thực {location}. Dựa trên các thông tin sau, trả lời ngắn gọn câu hỏi "
+            f"bằng tiếng Việt, có emoji. Chỉ dùng thông tin được cung cấp; giá là giá tham khảo.\n\n"
+            f"{food_facts(dishes, areas)}\n"
+        )
+        if context.get('preferences'):
+            prompt += f"- Khách đã nói: {', '.join(context['preferences'])}\n"
+        prompt += f"\nCâu hỏi: {user_input}"
+        try:
+            response = generate_content(self.model, prompt)
+            return response.text
+        except Exception as e:
+            logger.warning(f"Grounded food answer failed, answering from the knowledge base: {str(e)}")
+            return format_food_answer(location, dishes, areas)
+
     def _extract_cuisine(self, text):
         """Extract cuisine type from input text"""
         # TODO: Implement cuisine extraction logic
@@ -125,6 +209,36 @@ Lưu ý: Giá cả có thể thay đổi tùy theo mùa và thời điểm. Bạ
             entities = input_data.get('entities', {})
             history = input_data.get('history', [])
             
+            # Evergreen questions about a known city skip the model entirely,
+            # as does every question while the model's breaker is open
+            city = find_city_in_text(user_input)
+            if not city and context.get('locations'):
+                city = find_city_in_text(" ".join(context['locations']))
+            if city:
+                location = city.get('name_vi', city['name'])
+                allow_stale = not model_available(self.model)
+                kb_answer = self._kb_answer(user_input, location, allow_stale=allow_stale)
+                if kb_answer:
+                    return {
+                        "status": "success",
+                        "content": kb_answer,
+                        "source": "local_food_kb"
+                    }
+                grounded = self._grounded_answer(user_input, location, context)
+                if grounded:
+                    return {
+                        "status": "success",
+                        "content": grounded,
+                        "source": "food_kb_grounded"
+                    }
+                local_answer = self._local_food_answer(user_input, location, allow_stale=allow_stale)
+                if local_answer:
+                    return {
+                        "status": "success",
+                        "content": local_answer,
+                        "source": "local_poi_index"
+                    }
+            
             # Build enhanced prompt with context
             enhanced_prompt = f"{self.system_prompt}\n\n"
             
@@ -141,7 +255,7 @@ Lưu ý: Giá cả có thể thay đổi tùy theo mùa và thời điểm. Bạ
             # Add conversation history for context
             if history and len(history) > 0:
                 enhanced_prompt += "\nRecent conversation:\n"
-                recent_history = history[-5:] if len(history) >= 5 else history
+                recent_history = prompt_history(history)
                 for message in recent_history:
                     role = message.get('role', 'unknown')
                     content = message.get('content', '')
@@ -156,7 +270,7 @@ Lưu ý: Giá cả có thể thay đổi tùy theo mùa và thời điểm. Bạ
             
             for attempt in range(max_retries):
                 try:
-                    response = self.model.generate_content(enhanced_prompt)
+                    response = generate_content(self.model, enhanced_prompt)
                     
                     if not response or not hasattr(response, 'text'):
                         raise ValueError("Empty or invalid response from model")
@@ -166,20 +280,31 @@ Lưu ý: Giá cả có thể thay đổi tùy theo mùa và thời điểm. Bạ
                         "content": response.text
                     }
                     
+                except (CircuitOpenError, QuotaExhaustedError) as e:
+                    # Refused without a call; retrying now would only be refused again
+                    logger.warning(str(e))
+                    return {
+                        "status": "error",
+                        "message": str(e)
+                    }
                 except Exception as e:
                     error_str = str(e)
                     if "429" in error_str and "quota" in error_str.lower():
-                        retry_match = re.search(r'retry_delay\s*{\s*seconds:\s*(\d+)', error_str)
-                        if retry_match:
-                            delay = int(retry_match.group(1))
-                        else:
+                        if quota.active:
+                            # Degraded mode answers from the local store instead of waiting
+                            return {
+                                "status": "error",
+                                "message": f"Quota exceeded: {error_str}"
+                            }
+                        delay = retry_delay(e)
+                        if delay is None:
                             delay = base_delay * (2 ** attempt)
                         
-                        print(f"Quota exceeded, retrying in {delay} seconds...")
+                        logger.warning(f"Quota exceeded, retrying in {delay} seconds...")
                         time.sleep(delay)
                         continue
                     
-                    print(f"Error: {str(e)}")
+                    logger.error(f"Error: {str(e)}")
                     if attempt == max_retries - 1:
                         return {
                             "status": "error",
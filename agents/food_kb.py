@@ -0,0 +1,218 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from .text_utils import STOPWORDS, fold_text
+from .geocoding import lookup_city, strip_city_names
+from .poi_index import is_freshness_sensitive
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+FOOD_KB_PATH = os.getenv('FOOD_KB_PATH', os.path.join(DATA_DIR, 'food_kb.json'))
+
+# How much a query word found in each field counts
+FIELD_WEIGHTS = {'name': 3, 'aliases': 3, 'tags': 2, 'description': 1, 'where': 1}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Hits scoring below this share of the best one are dropped as incidental
+# matches ("bún" of "bún hến" when asked about "bún bò")
+RELEVANCE_CUTOFF = 0.5
+
+# Folded words asking for food in general; every dish answers them
+GENERIC_FOOD = re.compile(
+    r'\b(?:dac san|mon an|mon ngon|am thuc|nha hang|quan an|quan ngon|do an|an uong|an gi|mon gi|'
+    r'ngon|mon|quan|nen an|food|foods|dish|dishes|eat|restaurants?|specialty|specialties|cuisine)\b'
+)
+
+# Folded price wording; the knowledge base has typical prices for every dish
+PRICE_WORDS = re.compile(r'\b(?:gia|bao nhieu tien|bao nhieu|tien|price|prices|cost)\b')
+
+# Price wording as typed, ignored when deciding whether a question needs live data
+_PRICE_WORDING = re.compile(r'\b(?:giá|bao nhiêu tiền|price)\b', re.IGNORECASE)
+
+# Folded region names, mapped to the region facet
+REGION_WORDS = {
+    'mien bac': 'north',
+    'mien trung': 'central',
+    'mien nam': 'south',
+    'mien tay': 'south',
+}
+_REGION_PATTERN = re.compile(r'\b(?:' + '|'.join(REGION_WORDS) + r')\b')
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in fold_text(text).split() if word not in STOPWORDS]
+
+
+class FoodKnowledgeBase:
+    """
+    Bundled food knowledge: dishes and eating areas per city, with typical prices.
+
+    Documents get an inverted index of folded words: each posting list is
+    a pair of compact arrays, document ids (array('I')) and field-weighted
+    term frequencies (array('H')). City, region and kind facets are
+    document-id arrays as well, so a query narrows to one city's documents
+    first and only scores those.
+    """
+
+    def __init__(self, path: str = FOOD_KB_PATH):
+        self.docs: List[Dict[str, Any]] = []
+        self._lengths = array('H')
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._facets: Dict[Tuple[str, str], array] = {}
+        self.regions: Dict[str, str] = {}
+        self.updated = None
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def load(self, path: str) -> int:
+        """Index a knowledge-base JSON file; returns the number of documents added."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.regions.update(data.get('regions', {}))
+        self.updated = data.get('updated')
+        before = len(self.docs)
+        for entry in data.get('cities', []):
+            city = lookup_city(entry['city'])
+            city_name = city['name'] if city else entry['city']
+            for dish in entry.get('dishes', []):
+                self._add(dict(dish, kind='dish', city=city_name, region=entry.get('region')))
+            for area in entry.get('areas', []):
+                self._add(dict(area, kind='area', city=city_name, region=entry.get('region')))
+        logger.info(f"Indexed {len(self.docs) - before} food documents from {path}")
+        return len(self.docs) - before
+
+    def _add(self, doc: Dict[str, Any]):
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        frequencies: Dict[str, int] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = doc.get(field)
+            if not value:
+                continue
+            text = ' '.join(value) if isinstance(value, list) else value
+            for word in _words(text):
+                frequencies[word] = frequencies.get(word, 0) + weight
+        self._lengths.append(min(sum(frequencies.values()), 0xFFFF))
+        for word, frequency in frequencies.items():
+            ids, counts = self._postings.setdefault(word, (array('I'), array('H')))
+            ids.append(doc_id)
+            counts.append(min(frequency, 0xFFFF))
+        for facet in (('city', doc['city']), ('region', doc.get('region') or ''), ('kind', doc['kind'])):
+            self._facets.setdefault(facet, array('I')).append(doc_id)
+
+    def query_terms(self, query: str) -> Tuple[List[str], Optional[str]]:
+        """
+        (words to match, region) of a question.
+
+        City names, generic food wording and price wording are dropped:
+        the city is a facet, and every dish answers "what is good" and
+        "how much".
+        """
+        text = strip_city_names(query)
+        region = next((REGION_WORDS[match.group(0)] for match in _REGION_PATTERN.finditer(text)), None)
+        text = _REGION_PATTERN.sub(' ', text)
+        text = GENERIC_FOOD.sub(' ', text)
+        text = PRICE_WORDS.sub(' ', text)
+        return [word for word in text.split() if word not in STOPWORDS], region
+
+    def search(self, query: str, city: Optional[str] = None, kind: str = 'dish',
+               limit: int = 5) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        (documents, unmatched words) for a question about a city.
+
+        With nothing specific to match ("Đà Nẵng có món gì ngon?") the
+        city's documents come back in their curated order. Unmatched words
+        are those no document of the city contains: the knowledge base
+        cannot answer that part of the question by itself.
+        """
+        terms, region = self.query_terms(query)
+        candidates = set(self._facets.get(('kind', kind), ()))
+        if city:
+            candidates &= set(self._facets.get(('city', city), ()))
+        elif region:
+            candidates &= set(self._facets.get(('region', region), ()))
+        if not candidates:
+            return [], terms
+
+        if not terms:
+            return [self.docs[doc_id] for doc_id in sorted(candidates)[:limit]], []
+
+        count = len(self.docs)
+        average = sum(self._lengths) / count
+        scores: Dict[int, float] = {}
+        unmatched = []
+        for term in dict.fromkeys(terms):
+            ids, counts = self._postings.get(term, ((), ()))
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            matched = False
+            for doc_id, frequency in zip(ids, counts):
+                if doc_id not in candidates:
+                    continue
+                matched = True
+                norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / average)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / norm
+            if not matched:
+                unmatched.append(term)
+        best = max(scores.values(), default=0.0)
+        ranked = sorted((doc_id for doc_id in scores if scores[doc_id] >= best * RELEVANCE_CUTOFF),
+                        key=lambda doc_id: (-scores[doc_id], doc_id))[:limit]
+        return [self.docs[doc_id] for doc_id in ranked], unmatched
+
+
+def needs_live_data(text: str) -> bool:
+    """is_freshness_sensitive, except that asking for a (typical) price is fine."""
+    return is_freshness_sensitive(_PRICE_WORDING.sub(' ', text))
+
+
+def format_food_answer(city: str, dishes: List[Dict[str, Any]], areas: List[Dict[str, Any]]) -> str:
+    """Render dishes and eating areas as a short Vietnamese answer in the agents' emoji style."""
+    lines = [f"🍜 Món ngon nên thử ở {city}:", ""]
+    for i, dish in enumerate(dishes, 1):
+        lines.append(f"{i}. {dish['name']}: {dish['description']}")
+        if dish.get('price'):
+            lines.append(f"   💰 Giá tham khảo: {dish['price']}")
+        if dish.get('where'):
+            lines.append(f"   📍 Nên ăn ở: {dish['where']}")
+    if areas:
+        lines.extend(["", "🗺️ Khu ăn uống:"])
+        for area in areas:
+            lines.append(f"- {area['name']}: {area['description']}")
+    lines.extend(["", "Giá có thể thay đổi theo mùa và theo quán."])
+    return "\n".join(lines)
+
+
+def food_facts(dishes: List[Dict[str, Any]], areas: List[Dict[str, Any]]) -> str:
+    """Retrieved documents as compact fact lines for a grounded prompt."""
+    lines = []
+    for dish in dishes:
+        lines.append(f"- {dish['name']}: {dish['description']}. Giá {dish.get('price', '?')}. "
+                     f"Ăn ở: {dish.get('where', '?')}")
+    for area in areas:
+        lines.append(f"- Khu {area['name']}: {area['description']}")
+    return "\n".join(lines)
+
+
+_food_kb: Optional[FoodKnowledgeBase] = None
+_food_kb_lock = threading.Lock()
+
+
+def get_food_kb() -> FoodKnowledgeBase:
+    """The process-wide knowledge base, indexed on first use."""
+    global _food_kb
+    if _food_kb is None:
+        with _food_kb_lock:
+            if _food_kb is None:
+                _food_kb = FoodKnowledgeBase()
+    return _food_kb
@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .upstream import forecast_get
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Live forecast source by name; "none" answers every question from climate normals
+FORECAST_PROVIDER = os.getenv('FORECAST_PROVIDER', 'open_meteo')
+
+# A city's forecast for a day is reused for this long; providers update a few times a day
+FORECAST_CACHE_TTL = int(os.getenv('FORECAST_CACHE_TTL', 3 * 3600))  # 3 hours
+FORECAST_CACHE_SIZE = int(os.getenv('FORECAST_CACHE_SIZE', 4096))
+
+# WMO weather interpretation codes, grouped
+WEATHER_CODES = [
+    ((0,), '☀️ Trời quang'),
+    ((1, 2), '🌤️ Ít mây'),
+    ((3,), '☁️ Nhiều mây'),
+    ((45, 48), '🌫️ Sương mù'),
+    ((51, 53, 55, 56, 57), '🌦️ Mưa phùn'),
+    ((61, 63, 66, 80, 81), '🌧️ Có mưa'),
+    ((65, 67, 82), '🌧️ Mưa to'),
+    ((71, 73, 75, 77, 85, 86), '❄️ Có tuyết'),
+    ((95, 96, 99), '⛈️ Dông'),
+]
+_CONDITIONS = {code: label for codes, label in WEATHER_CODES for code in codes}
+
+# Called as provider(lat, lng, start, end) -> {ISO date: day}; a day has temp_max,
+# temp_min, rain_mm, rain_chance and condition (any may be None)
+Provider = Callable[[float, float, date, date], Dict[str, Dict[str, Any]]]
+
+
+def open_meteo_daily(lat: float, lng: float, start: date, end: date) -> Dict[str, Dict[str, Any]]:
+    """Daily forecast from Open-Meteo for start..end (inclusive), local time."""
+    response = forecast_get({
+        'latitude': round(lat, 4),
+        'longitude': round(lng, 4),
+        'daily': 'weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum,'
+                 'precipitation_probability_max',
+        'timezone': 'auto',
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+    })
+    daily = response.get('daily') or {}
+
+    def column(name: str) -> List[Any]:
+        return daily.get(name) or [None] * len(daily.get('time', []))
+
+    days = {}
+    for day, code, high, low, rain, chance in zip(
+            daily.get('time', []), column('weather_code'), column('temperature_2m_max'),
+            column('temperature_2m_min'), column('precipitation_sum'), column('precipitation_probability_max')):
+        days[day] = {'temp_max': high, 'temp_min': low, 'rain_mm': rain, 'rain_chance': chance,
+                     'condition': _CONDITIONS.get(code)}
+    return days
+
+
+PROVIDERS: Dict[str, Provider] = {'open_meteo': open_meteo_daily}
+
+
+def register_provider(name: str, provider: Provider):
+    """Make a forecast source selectable with FORECAST_PROVIDER=name."""
+    PROVIDERS[name] = provider
+
+
+class Forecasts:
+    """
+    Near-term daily forecasts per city, cached by city and day.
+
+    A question about the weekend and one about tomorrow share the days
+    they have in common; only days missing from the cache are fetched, in
+    one provider call covering them. Provider failures return None, so the
+    caller can fall back to climate normals.
+    """
+
+    def __init__(self, provider: str = FORECAST_PROVIDER, ttl: int = FORECAST_CACHE_TTL,
+                 max_size: int = FORECAST_CACHE_SIZE):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider in PROVIDERS
+
+    def _get(self, city: str, day: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get((city, day))
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._cache[(city, day)]
+                return None
+            self._cache.move_to_end((city, day))
+            return entry[1]
+
+    def _put(self, city: str, day: str, forecast: Dict[str, Any]):
+        with self._lock:
+            self._cache[(city, day)] = (time.time() + self.ttl, forecast)
+            self._cache.move_to_end((city, day))
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def daily(self, city: Dict[str, Any], start: date, end: date) -> Optional[List[Dict[str, Any]]]:
+        """Forecast days of a geocoded city (name, lat, lng) from start to end, or None."""
+        if not self.enabled or city.get('lat') is None or city.get('lng') is None:
+            return None
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        found = {day: self._get(city['name'], day.isoformat()) for day in days}
+        missing = [day for day, forecast in found.items() if forecast is None]
+        record_cache('forecast', not missing)
+
+        if missing:
+            try:
+                fetched = PROVIDERS[self.provider](city['lat'], city['lng'], missing[0], missing[-1])
+            except Exception as e:
+                logger.warning(f"Forecast for {city['name']} unavailable: {str(e)}")
+                return None
+            for day in missing:
+                forecast = fetched.get(day.isoformat())
+                if forecast is None:
+                    logger.warning(f"Forecast for {city['name']} has no {day.isoformat()}")
+                    return None
+                found[day] = forecast
+                self._put(city['name'], day.isoformat(), forecast)
+        return [dict(found[day], date=day) for day in days]
+
+
+def _number(value: Any, unit: str) -> str:
+    return f"{value:.0f}{unit}" if isinstance(value, (int, float)) else "?"
+
+
+def format_forecast_answer(city: str, period_label: str, days: List[Dict[str, Any]]) -> str:
+    """Render forecast days as a short Vietnamese answer in the agents' emoji style."""
+    lines = [f"🌤️ Dự báo thời tiết {city} {period_label}:", ""]
+    for day in days:
+        header = f"📅 {day['date'].strftime('%d/%m')}"
+        if day.get('condition'):
+            header += f": {day['condition']}"
+        lines.append(header)
+        lines.append(f"   🌡️ {_number(day.get('temp_min'), '')}–{_number(day.get('temp_max'), '°C')}")
+        rain = f"   🌧️ Lượng mưa {_number(day.get('rain_mm'), 'mm')}"
+        if day.get('rain_chance') is not None:
+            rain += f", khả năng mưa {_number(day['rain_chance'], '%')}"
+        lines.append(rain)
+    wettest = max((day.get('rain_chance') or 0 for day in days), default=0)
+    if wettest >= 60:
+        lines.extend(["", "💡 Khả năng mưa cao, nhớ mang theo ô hoặc áo mưa."])
+    elif max((day.get('temp_max') or 0 for day in days), default=0) >= 34:
+        lines.extend(["", "💡 Trời nắng nóng, nên tránh ra ngoài buổi trưa và uống đủ nước."])
+    lines.extend(["", "Dự báo có thể thay đổi, hãy xem lại trước khi đi."])
+    return "\n".join(lines)
+
+
+forecasts = Forecasts()
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+import unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+from .text_utils import fold_text, compact_text
+from .upstream import maps_get
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+CITIES_PATH = os.path.join(DATA_DIR, 'cities.json')
+
+# Persistent cache for cities missing from the bundled table
+GEOCODE_CACHE_PATH = os.getenv(
+    'GEOCODE_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), 'travel-assistant', 'geocode.sqlite3')
+)
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 180 * 24 * 3600))  # 180 days
+GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', 24 * 3600))  # 1 day
+
+# Folded city names that are also everyday words ("vịnh" is a bay, "huệ" a
+# lily): they match only a word spelt like the city or with no diacritics,
+# and find_city_in_text ranks an unaccented match below other cities
+AMBIGUOUS_NAMES = frozenset(['vinh', 'hue'])
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def _load_city_table(path: str = CITIES_PATH) -> Tuple[list, Dict[str, Dict[str, Any]]]:
+    """Load the bundled city table and index it by every folded alias."""
+    with open(path, encoding='utf-8') as f:
+        cities = json.load(f)['cities']
+
+    index = {}
+    for city in cities:
+        names = [city['name'], city.get('name_vi', ''), city['query']] + city.get('aliases', [])
+        for name in names:
+            if not name:
+                continue
+            index.setdefault(fold_text(name), city)
+            index.setdefault(compact_text(name), city)
+    return cities, index
+
+
+# Loaded once at import; city coordinates never change
+CITIES, _CITY_INDEX = _load_city_table()
+_MAX_ALIAS_WORDS = max(len(alias.split()) for alias in _CITY_INDEX)
+
+
+def _words(text: str) -> Tuple[List[str], List[str]]:
+    """(folded words, lowercase words with diacritics) of text, aligned."""
+    folded, spelt = [], []
+    for token in _NON_WORD.split(unicodedata.normalize('NFC', (text or '').lower())):
+        for word in fold_text(token).split():
+            folded.append(word)
+            spelt.append(token)
+    return folded, spelt
+
+
+def _spelt_as_city(word: str, city: Dict[str, Any]) -> bool:
+    """False for an ambiguous name written with other diacritics than the city's ("vịnh" for Vinh)."""
+    folded = fold_text(word)
+    if folded not in AMBIGUOUS_NAMES or word == folded:
+        return True
+    names = [city['name'], city.get('name_vi', '')] + city.get('aliases', [])
+    return word in {unicodedata.normalize('NFC', name.lower()) for name in names}
+
+
+def lookup_city(name: str) -> Optional[Dict[str, Any]]:
+    """Find a known city by any of its names ("Sài Gòn", "hcm", "Ho Chi Minh City", ...)."""
+    if not name:
+        return None
+    city = _CITY_INDEX.get(fold_text(name)) or _CITY_INDEX.get(compact_text(name))
+    if city and not _spelt_as_city(unicodedata.normalize('NFC', name.strip().lower()), city):
+        return None
+    return city
+
+
+def find_city_in_text(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Find the first known city mentioned in free text.
+
+    Scans word n-grams longest-first at each position, so "Vịnh Hạ Long"
+    matches Ha Long rather than a shorter alias inside it. An unaccented
+    AMBIGUOUS_NAMES match ("vinh") is only used when no other city is named.
+    """
+    words, spelt = _words(text)
+    weak = None
+    for start, length, city in _scan_cities(words, spelt):
+        if length == 1 and words[start] in AMBIGUOUS_NAMES and spelt[start] == words[start]:
+            weak = weak or city
+            continue
+        return city
+    return weak
+
+
+def _scan_cities(words: List[str], spelt: Optional[List[str]] = None):
+    """
+    Yield (start, length, city) for each city alias in a list of folded words.
+
+    With the words as written (spelt), a one-word AMBIGUOUS_NAMES match
+    must be spelt like the city.
+    """
+    start = 0
+    while start < len(words):
+        for length in range(min(_MAX_ALIAS_WORDS, len(words) - start), 0, -1):
+            city = _CITY_INDEX.get(' '.join(words[start:start + length]))
+            if city and (length > 1 or spelt is None or _spelt_as_city(spelt[start], city)):
+                yield start, length, city
+                start += length
+                break
+        else:
+            start += 1
+
+
+def find_cities_in_text(text: str) -> List[Dict[str, Any]]:
+    """All known cities mentioned in free text, in order, without repeats."""
+    cities = []
+    for _, _, city in _scan_cities(*_words(text)):
+        if city not in cities:
+            cities.append(city)
+    return cities
+
+
+def strip_city_names(text: str) -> str:
+    """Fold text and drop the city names in it: "Món ngon Hà Nội" -> "mon ngon"."""
+    words, spelt = _words(text)
+    for start, length, _ in reversed(list(_scan_cities(words, spelt))):
+        del words[start:start + length]
+    return ' '.join(words)
+
+
+def _city_result(city: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a table entry like a Geocoding API result."""
+    return {
+        "formatted_address": city['query'],
+        "geometry": {"location": {"lat": city['lat'], "lng": city['lng']}},
+        "source": "city_table"
+    }
+
+
+class GeocodeCache:
+    """
+    SQLite-backed key/value cache with per-entry expiry.
+
+    Survives restarts, so an unknown city is geocoded over the network once
+    per TTL rather than once per process. Falls back to an in-memory database
+    when the cache path is not writable (e.g. a read-only deploy).
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Geocode cache at {path} unavailable ({str(e)}), using memory only")
+            self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode ("
+                "key TEXT PRIMARY KEY, value TEXT, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value); value may be None for cached misses."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM geocode WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+            )
+            self._conn.commit()
+
+
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH)
+
+
+def _slim_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the fields callers use, so cache rows stay small."""
+    return {
+        "formatted_address": result.get("formatted_address"),
+        "geometry": {"location": result["geometry"]["location"]},
+        "place_id": result.get("place_id"),
+        "types": result.get("types", [])
+    }
+
+
+def geocode(location: str, api_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Resolve a location to a Geocoding-API-shaped result, or None.
+
+    Known cities are answered from the bundled table without any network
+    call; everything else goes through the persistent cache and only then
+    the Geocoding API.
+    """
+    city = lookup_city(location)
+    if city:
+        record_cache('city_table', True)
+        return _city_result(city)
+    record_cache('city_table', False)
+
+    cache_key = f"geocode:{fold_text(location)}"
+    found, cached = geocode_cache.get(cache_key)
+    record_cache('geocode', found)
+    if found:
+        return cached
+
+    geocode_data = maps_get("geocode/json", {"address": location, "key": api_key})
+    results = geocode_data.get("results") or []
+    result = _slim_result(results[0]) if results else None
+
+    # Only cache definitive answers, not quota or auth errors
+    if geocode_data.get("status") in ("OK", "ZERO_RESULTS"):
+        geocode_cache.set(cache_key, result, GEOCODE_CACHE_TTL if result else GEOCODE_NEGATIVE_TTL)
+    return result
+
+
+def find_place_id(query: str, api_key: str) -> Optional[str]:
+    """Resolve a text query to a Places place_id, cached like geocodes."""
+    cache_key = f"place_id:{fold_text(query)}"
+    found, cached = geocode_cache.get(cache_key)
+    record_cache('place_id', found)
+    if found:
+        return cached
+
+    params = {
+        "input": query,
+        "inputtype": "textquery",
+        "fields": "place_id",
+        "key": api_key
+    }
+    data = maps_get("place/findplacefromtext/json", params)
+    candidates = data.get("candidates") or []
+    place_id = candidates[0].get("place_id") if candidates else None
+
+    if data.get("status") in ("OK", "ZERO_RESULTS"):
+        geocode_cache.set(cache_key, place_id, GEOCODE_CACHE_TTL if place_id else GEOCODE_NEGATIVE_TTL)
+    return place_id
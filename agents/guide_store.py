@@ -0,0 +1,227 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from .geocoding import lookup_city
+from .upstream import generate_content, configure_gemini
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+GUIDE_STORE_PATH = os.getenv('GUIDE_STORE_PATH', os.path.join(DATA_DIR, 'guides.json.gz'))
+GUIDE_CITIES = [
+    city.strip() for city in
+    os.getenv('GUIDE_CITIES', 'Hà Nội,Đà Nẵng,Hồ Chí Minh,Phú Quốc,Đà Lạt').split(',')
+    if city.strip()
+]
+GUIDE_MAX_AGE_DAYS = int(os.getenv('GUIDE_MAX_AGE_DAYS', 30))
+
+# Guides older than this are no longer served, even if the refresh job keeps failing
+GUIDE_SERVE_MAX_AGE_DAYS = int(os.getenv('GUIDE_SERVE_MAX_AGE_DAYS', 45))
+GUIDE_MODEL = os.getenv('GUIDE_MODEL', 'gemini-2.0-flash')
+
+# How often the serving side checks the store file for a newer version
+RELOAD_CHECK_INTERVAL = 60
+
+GUIDE_PROMPT = """You are a travel expert. Write a comprehensive travel guide in Vietnamese for {city}, including:
+1. Popular attractions
+2. Best time to visit
+3. Local transportation
+4. Food recommendations
+5. Cultural tips
+
+Guidelines:
+- Use emojis to make the response more engaging
+- Keep it concise and easy to read
+- Only include information that stays true year to year (no prices that change often, no events with dates)
+
+Response format:
+🗺️ {city}
+📍 Địa điểm nổi tiếng: [list with emojis]
+⏰ Thời điểm tốt nhất: [time with emoji]
+🚗 Di chuyển: [transportation with emoji]
+🍜 Ẩm thực: [food with emoji]
+💡 Văn hóa & mẹo nhỏ: [tips with emoji]
+"""
+
+
+def prompt_version(model_name: str = GUIDE_MODEL) -> str:
+    """Short hash of the prompt template and model; guides are stale when it changes."""
+    return hashlib.sha1(f"{model_name}\n{GUIDE_PROMPT}".encode()).hexdigest()[:12]
+
+
+def _city_key(city: str) -> str:
+    entry = lookup_city(city)
+    return entry['name'] if entry else city.strip()
+
+
+def _display_name(city: str) -> str:
+    entry = lookup_city(city)
+    return entry.get('name_vi', entry['name']) if entry else city.strip()
+
+
+class GuideStore:
+    """
+    Pre-generated destination guides kept in one gzipped JSON file.
+
+    Each guide records the prompt version and model that produced it plus a
+    per-city version counter, so the refresh job can regenerate only what is
+    missing, expired or produced by an outdated prompt. The serving side
+    reloads the file when its modification time changes, and only serves
+    guides built from the current prompt within GUIDE_SERVE_MAX_AGE_DAYS.
+    """
+
+    def __init__(self, path: str = GUIDE_STORE_PATH, max_age_days: int = GUIDE_SERVE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.version = prompt_version()
+        self._guides: Dict[str, Dict[str, Any]] = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self):
+        now = time.time()
+        if self._checked_at and now - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        self._guides = self.read()
+        self._mtime = mtime
+        logger.info(f"Loaded {len(self._guides)} destination guides from {self.path}")
+
+    def read(self) -> Dict[str, Dict[str, Any]]:
+        """Read all guides from disk (empty if the store does not exist yet)."""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                return json.load(f).get('guides', {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading guide store {self.path}: {str(e)}")
+            return {}
+
+    def write(self, guides: Dict[str, Dict[str, Any]]):
+        """Atomically replace the store file."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({'format': 1, 'guides': guides}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def get(self, city: str) -> Optional[Dict[str, Any]]:
+        """Return the stored guide for a city, or None if there is none or it is outdated."""
+        with self._lock:
+            self._reload_if_changed()
+            guide = self._guides.get(_city_key(city))
+        if guide is not None and is_stale(guide, self.version, self.max_age_days):
+            logger.info(f"Not serving outdated guide for {city} (prompt {guide.get('prompt_version')}, "
+                        f"generated {guide.get('generated_at')})")
+            guide = None
+        record_cache('guide_store', guide is not None)
+        return guide
+
+
+def is_stale(guide: Optional[Dict[str, Any]], version: str, max_age_days: int = GUIDE_MAX_AGE_DAYS) -> bool:
+    """A guide needs regenerating if missing, built from another prompt, or too old."""
+    if not guide or guide.get('prompt_version') != version:
+        return True
+    generated_at = datetime.fromisoformat(guide['generated_at'])
+    return (datetime.now() - generated_at).days >= max_age_days
+
+
+def refresh_guides(model, cities: List[str], store: GuideStore, force: bool = False,
+                   model_name: str = GUIDE_MODEL) -> Dict[str, str]:
+    """
+    Regenerate stale guides for the given cities and write the store.
+
+    Returns {city: "generated" | "fresh" | "error"}. Existing guides are kept
+    when generation fails, so a bad night never empties the store.
+    """
+    guides = store.read()
+    version = prompt_version(model_name)
+    outcome = {}
+
+    for city in cities:
+        key = _city_key(city)
+        current = guides.get(key)
+        if not force and not is_stale(current, version):
+            outcome[city] = "fresh"
+            continue
+
+        try:
+            response = generate_content(model, GUIDE_PROMPT.format(city=_display_name(city)))
+            if not response or not getattr(response, 'text', None):
+                raise ValueError("Empty response from model")
+        except Exception as e:
+            logger.error(f"Error generating guide for {city}: {str(e)}")
+            outcome[city] = "error"
+            continue
+
+        guides[key] = {
+            'city': _display_name(city),
+            'content': response.text,
+            'prompt_version': version,
+            'model': model_name,
+            'version': (current or {}).get('version', 0) + 1,
+            'generated_at': datetime.now().isoformat(timespec='seconds')
+        }
+        outcome[city] = "generated"
+        logger.info(f"Generated guide for {city} (version {guides[key]['version']})")
+
+    if "generated" in outcome.values():
+        store.write(guides)
+    return outcome
+
+
+guide_store = GuideStore()
+
+
+def main():
+    """
+    Nightly refresh job: python -m agents.guide_store [--cities ...] [--force]
+
+    Only missing, expired or outdated-prompt guides are regenerated, so it is
+    cheap to run on a schedule (e.g. a 03:00 cron) or right after editing
+    GUIDE_PROMPT.
+    """
+    parser = argparse.ArgumentParser(description="Pre-generate destination guides")
+    parser.add_argument('--cities', help="Comma-separated city list (default: GUIDE_CITIES)")
+    parser.add_argument('--path', default=GUIDE_STORE_PATH, help="Guide store file")
+    parser.add_argument('--force', action='store_true', help="Regenerate every city")
+    args = parser.parse_args()
+
+    from monitoring.logging_config import configure_logging
+    configure_logging(fmt='text')
+
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    api_key = os.getenv('GEMINI_API_KEY')
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    configure_gemini(api_key)
+    model = genai.GenerativeModel(GUIDE_MODEL)
+
+    cities = [city.strip() for city in args.cities.split(',')] if args.cities else GUIDE_CITIES
+    outcome = refresh_guides(model, cities, GuideStore(args.path), force=args.force)
+    for city, status in outcome.items():
+        print(f"{city}: {status}")
+
+
+if __name__ == '__main__':
+    main()
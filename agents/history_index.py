@@ -0,0 +1,309 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from .text_utils import content_words, fold_text
+from .geocoding import find_cities_in_text
+from monitoring.metrics import HISTORY_PROMPT_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Bytes of past conversation quoted in an agent prompt
+HISTORY_CONTEXT_BYTES = int(os.getenv('HISTORY_CONTEXT_BYTES', 1500))
+
+# Longest single snippet; longer passages are cut to this
+HISTORY_SNIPPET_BYTES = int(os.getenv('HISTORY_SNIPPET_BYTES', 400))
+
+# Sessions whose index is kept in memory (least recently used evicted)
+HISTORY_INDEX_SESSIONS = int(os.getenv('HISTORY_INDEX_SESSIONS', 1024))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# How many messages the agents quoted before history was selected by relevance
+RECENT_MESSAGES = 5
+
+# Facts kept per kind, most recent last
+MAX_FACTS = 5
+
+# Passages: lines and sentences of a message
+PASSAGE_BOUNDARY = re.compile(r'\n+|(?<=[.!?])\s+')
+
+# Facts the user states once and expects to be remembered, by context key
+FACT_PATTERNS = {
+    'dates': re.compile(
+        r'\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b|'
+        r'\b(?:ngày|tháng)\s+\d{1,2}(?:\s*(?:/|tháng)\s*\d{1,2})?\b|'
+        r'\b(?:ngày mai|ngày kia|cuối tuần|tuần (?:này|sau|tới)|tháng (?:này|sau|tới))\b', re.IGNORECASE),
+    'preferences': re.compile(
+        r'\b\d+(?:[.,]\d+)?\s*(?:triệu|tr|nghìn|ngàn|k|đồng|vnd|usd)\b|'
+        r'\b\d+\s*(?:người lớn|người|trẻ em|khách|phòng|đêm|sao)\b|'
+        r'\b(?:ăn chay|trẻ em|gia đình|cặp đôi|người già|hồ bơi|gần biển|giá rẻ|cao cấp)\b', re.IGNORECASE),
+}
+
+
+def _passages(text: str) -> List[str]:
+    return [passage.strip() for passage in PASSAGE_BOUNDARY.split(text or '') if passage.strip()]
+
+
+def _clip(text: str, limit: int) -> str:
+    """Cut text to at most limit UTF-8 bytes, on a character boundary."""
+    data = text.encode('utf-8')
+    if len(data) <= limit:
+        return text
+    return data[:max(limit - 3, 0)].decode('utf-8', errors='ignore').rstrip() + '…'
+
+
+def _size(text: str) -> int:
+    return len(text.encode('utf-8'))
+
+
+class HistoryIndex:
+    """
+    One session's past messages, split into passages and indexed for BM25.
+
+    Postings map a folded word to {passage id: term frequency}. Messages
+    are appended as the conversation grows, and the messages the app trims
+    from the front of a full session cookie are unindexed, so keeping the
+    index current costs O(new and trimmed tokens) per turn. Dates, cities
+    and preferences the user states are kept as facts, so they survive
+    however long ago they were said, trimmed or not.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Indexed by message number; trimmed messages are left as None
+        self.messages: List[Optional[Dict[str, Any]]] = []
+        self.start = 0
+        self.passages: Dict[int, Tuple[int, str, int]] = {}
+        self.next_passage = 0
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self.facts: Dict[str, List[str]] = {'locations': [], 'dates': [], 'preferences': []}
+
+    def sync(self, history: List[Dict[str, Any]]):
+        """
+        Index the messages of history not seen yet; rebuild if it is not a continuation.
+
+        history continues the index when its head is the indexed messages
+        from some point on, i.e. the oldest ones may have been trimmed.
+        """
+        with self._lock:
+            trimmed = self._continuation(history)
+            if trimmed is None:
+                self.reset()
+                trimmed = 0
+            self._trim(trimmed)
+            for message in history[len(self.messages) - self.start:]:
+                self._add(message)
+
+    def _continuation(self, history: List[Dict[str, Any]]) -> Optional[int]:
+        """How many indexed messages history leaves out at its head, or None if it starts afresh."""
+        known = len(self.messages) - self.start
+        if not known:
+            return 0
+        last = self.messages[-1]['content']
+        for trimmed in range(known):
+            overlap = known - trimmed
+            if (overlap <= len(history) and history[overlap - 1].get('content') == last
+                    and history[0].get('content') == self.messages[self.start + trimmed]['content']):
+                return trimmed
+        return None
+
+    def _trim(self, count: int):
+        """Unindex the oldest count messages; their facts are kept."""
+        for index in range(self.start, self.start + count):
+            for passage_id in self.messages[index]['passages']:
+                _, passage, length = self.passages.pop(passage_id)
+                self.total_length -= length
+                for word in content_words(passage):
+                    postings = self.postings.get(word)
+                    if postings is not None and postings.pop(passage_id, None) is not None and not postings:
+                        del self.postings[word]
+            self.messages[index] = None
+        self.start += count
+
+    def _add(self, message: Dict[str, Any]):
+        index = len(self.messages)
+        role = message.get('role', 'unknown')
+        content = str(message.get('content') or '')
+        self.messages.append({'role': role, 'content': content, 'passages': []})
+        for passage in _passages(content):
+            words = content_words(passage)
+            if not words:
+                continue
+            passage_id = self.next_passage
+            self.next_passage += 1
+            self.passages[passage_id] = (index, passage, len(words))
+            self.messages[index]['passages'].append(passage_id)
+            self.total_length += len(words)
+            for word in words:
+                postings = self.postings.setdefault(word, {})
+                postings[passage_id] = postings.get(passage_id, 0) + 1
+        if role == 'user':
+            self._add_facts(content)
+
+    def _add_facts(self, content: str):
+        found = {kind: [match.group(0).strip() for match in pattern.finditer(content)]
+                 for kind, pattern in FACT_PATTERNS.items()}
+        found['locations'] = [city.get('name_vi', city['name']) for city in find_cities_in_text(content)]
+        for kind, values in found.items():
+            facts = self.facts[kind]
+            for value in values:
+                if value in facts:
+                    facts.remove(value)
+                facts.append(value)
+            del facts[:-MAX_FACTS]
+
+    def _scores(self, query: str) -> Dict[int, float]:
+        count = len(self.passages)
+        average = self.total_length / count
+        scores: Dict[int, float] = {}
+        for word in set(content_words(query)):
+            postings = self.postings.get(word)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, frequency in postings.items():
+                length = self.passages[passage_id][2]
+                norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * frequency * (BM25_K1 + 1) / norm
+        return scores
+
+    def select(self, query: str, budget: int = HISTORY_CONTEXT_BYTES,
+               snippet_bytes: int = HISTORY_SNIPPET_BYTES) -> List[Dict[str, Any]]:
+        """
+        The passages most relevant to query, within budget bytes.
+
+        Ties go to the more recent passage. When nothing matches (a
+        follow-up like "còn gì nữa?") the last exchange is used instead.
+        Passages are returned grouped per message, in conversation order.
+        """
+        with self._lock:
+            if not self.passages:
+                return []
+            scores = self._scores(query)
+            if scores:
+                ranked = sorted(scores, key=lambda passage_id: (scores[passage_id], passage_id), reverse=True)
+            else:
+                last = len(self.messages) - 2
+                ranked = [passage_id for passage_id in reversed(self.passages)
+                          if self.passages[passage_id][0] >= last]
+
+            chosen: Dict[int, str] = {}
+            remaining = budget
+            for passage_id in ranked:
+                snippet = _clip(self.passages[passage_id][1], snippet_bytes)
+                if _size(snippet) > remaining:
+                    continue
+                chosen[passage_id] = snippet
+                remaining -= _size(snippet)
+
+            selected: List[Dict[str, Any]] = []
+            for passage_id in sorted(chosen):
+                index = self.passages[passage_id][0]
+                if selected and selected[-1]['index'] == index:
+                    selected[-1]['content'] += f" … {chosen[passage_id]}"
+                else:
+                    selected.append({'index': index, 'role': self.messages[index]['role'],
+                                     'content': chosen[passage_id]})
+            return selected
+
+
+class HistoryIndexes:
+    """Per-session history indexes, least recently used evicted."""
+
+    def __init__(self, max_sessions: int = HISTORY_INDEX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._indexes: "OrderedDict[str, HistoryIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index(self, session_id: Optional[str]) -> HistoryIndex:
+        if session_id is None:
+            return HistoryIndex()
+        with self._lock:
+            index = self._indexes.get(session_id)
+            if index is None:
+                index = self._indexes[session_id] = HistoryIndex()
+                while len(self._indexes) > self.max_sessions:
+                    self._indexes.popitem(last=False)
+            self._indexes.move_to_end(session_id)
+            return index
+
+    def _synced(self, session_id: Optional[str],
+                history: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], HistoryIndex]:
+        history = list(history or [])
+        if history and history[-1].get('role') == 'user':
+            history.pop()
+        index = self._index(session_id)
+        index.sync(history)
+        return history, index
+
+    def facts(self, session_id: Optional[str], history: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """
+        The dates, cities and preferences stated earlier in a session.
+
+        They reach the agent's context whatever the current message asks,
+        so answers that depend on them are cached per set of facts.
+        """
+        _, index = self._synced(session_id, history)
+        with index._lock:
+            return {kind: list(values) for kind, values in index.facts.items()}
+
+    def select(self, session_id: Optional[str], history: List[Dict[str, Any]],
+               query: str) -> Tuple[List[Dict[str, Any]], Dict[str, List[str]]]:
+        """
+        (relevant messages, facts) from a session's history for query.
+
+        history is the session's conversation as the app keeps it; the
+        current message, already appended at its end, is left out (it is
+        indexed on the next turn). Sub-queries and supporting-agent queries
+        of the same turn see the same index.
+        """
+        history, index = self._synced(session_id, history)
+        selected = index.select(query)
+
+        HISTORY_PROMPT_BYTES.observe(sum(_size(message['content']) for message in selected), kind='selected')
+        HISTORY_PROMPT_BYTES.observe(
+            sum(_size(str(message.get('content') or '')) for message in history[-RECENT_MESSAGES:]), kind='recent')
+        return selected, {kind: list(values) for kind, values in index.facts.items()}
+
+
+def personal_facts(question: str, facts: Optional[Dict[str, List[str]]]) -> List[str]:
+    """
+    "kind=value" for each fact from earlier in the conversation the question does not restate, sorted.
+
+    A party size or budget said three messages ago shapes the answer as
+    much as the question does, so it belongs in the scope.
+    """
+    asked = f" {fold_text(question)} "
+    personal = set()
+    for kind, values in (facts or {}).items():
+        for value in values:
+            folded = fold_text(value)
+            if folded and f" {folded} " not in asked:
+                personal.add(f"{kind}={folded}")
+    return sorted(personal)
+
+
+def prompt_history(history: List[Dict[str, Any]], limit: int = RECENT_MESSAGES) -> List[Dict[str, Any]]:
+    """
+    The messages an agent quotes in its prompt.
+
+    History selected by HistoryIndexes.select is already relevant and
+    within budget, so it is used whole; a raw conversation falls back to
+    its last `limit` messages.
+    """
+    if history and all('index' in message for message in history):
+        return history
+    return history[-limit:] if history else []
+
+
+history_indexes = HistoryIndexes()
@@ -1,22 +1,28 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 try:
     from serpapi import Client
 except ImportError:
-    print("Warning: SERP API not installed. Please run: pip install serpapi")
+    logger.warning("SERP API not installed. Please run: pip install serpapi")
     Client = None
 
 try:
     from serpapi.google_search import GoogleSearch
 except ImportError:
-    print("Warning: Google Search Results not installed. Please run: pip install google-search-results")
+    logger.warning("Google Search Results not installed. Please run: pip install google-search-results")
     GoogleSearch = None
 
 import os
 from typing import Dict, Any
 from datetime import datetime
 from .base_agent import BaseAgent
-import logging
+from .upstream import generate_content, serp_search, configure_gemini, list_models
+from .history_index import prompt_history
 from dotenv import load_dotenv
 
+
 class HotelAgent(BaseAgent):
     def __init__(self):
         """Initialize the Hotel Agent."""
@@ -32,24 +38,24 @@ class HotelAgent(BaseAgent):
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
-            print("Available models:", [model.name for model in models])
+            models = list_models()
+            logger.debug(f"Available models: {[model.name for model in models]}")
             
             # Try to get the specific model
             try:
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
-                print("Successfully initialized gemini-2.0-flash")
+                logger.info("Successfully initialized gemini-2.0-flash")
             except Exception as model_error:
-                print(f"Error initializing gemini-2.0-flash: {str(model_error)}")
+                logger.warning(f"Error initializing gemini-2.0-flash: {str(model_error)}")
                 # Fallback to gemini-pro
-                print("Falling back to gemini-pro")
+                logger.warning("Falling back to gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
                 
         except Exception as e:
-            print(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing Gemini: {str(e)}")
             self.model = None
         
         # System prompt for the model
@@ -153,8 +159,7 @@ Example response format:
                 "api_key": self.serp_api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = serp_search(params)
             
             if 'hotels_results' in results:
                 # Use Gemini to analyze and summarize the results
@@ -268,7 +273,7 @@ Example response format:
             }
             
         try:
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt)
             if response and hasattr(response, 'text'):
                 return {
                     "status": "success",
@@ -326,7 +331,7 @@ Example response format:
             entities = input_data.get('entities', {})
             history = input_data.get('history', [])
             
-            logging.info(f"HotelAgent processing input with context: {user_input}")
+            logger.info(f"HotelAgent processing input with context: {user_input}")
             
             # Build enhanced prompt with context
             enhanced_prompt = f"{self.system_prompt}\n\n"
@@ -344,7 +349,7 @@ Example response format:
             # Add conversation history for context
             if history and len(history) > 0:
                 enhanced_prompt += "\nLịch sử trò chuyện gần đây:\n"
-                recent_history = history[-5:] if len(history) >= 5 else history
+                recent_history = prompt_history(history)
                 for message in recent_history:
                     role = message.get('role', 'unknown')
                     content = message.get('content', '')
@@ -354,8 +359,8 @@ Example response format:
             enhanced_prompt += f"\nUser: {user_input}"
             
             # Generate response using Gemini
-            logging.info("HotelAgent generating response with context")
-            response = self.model.generate_content(enhanced_prompt)
+            logger.info("HotelAgent generating response with context")
+            response = generate_content(self.model, enhanced_prompt)
             
             if not response or not hasattr(response, 'text'):
                 return {
@@ -363,14 +368,14 @@ Example response format:
                     "message": "Không thể tìm thông tin khách sạn. Vui lòng thử lại."
                 }
                 
-            logging.info(f"HotelAgent response with context: {response.text[:100]}...")
+            logger.info(f"HotelAgent response with context: {response.text[:100]}...")
             return {
                 "status": "success",
                 "content": response.text
             }
                 
         except Exception as e:
-            logging.error(f"HotelAgent error in process_with_context: {str(e)}")
+            logger.error(f"HotelAgent error in process_with_context: {str(e)}")
             return {
                 "status": "error",
                 "message": f"An error occurred: {str(e)}"
@@ -0,0 +1,222 @@
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from .upstream import maps_get
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Radius classes: (max radius in metres, geohash precision, fetch radius).
+# Upstream searches use the fetch radius, the class radius plus a cell
+# diagonal (a precision-5 cell is ~4.9km x 4.9km, ~6.9km across), so the
+# stored search covers a query of the class from anywhere in its cell.
+# Places Nearby Search allows at most 50km.
+RADIUS_CLASSES = [
+    (1000, 6, 2400),
+    (5000, 5, 12000),
+    (50000, 4, 50000),
+]
+
+NEARBY_CACHE_TTL = int(os.getenv('NEARBY_CACHE_TTL', 6 * 3600))  # 6 hours
+NEARBY_CACHE_SIZE = int(os.getenv('NEARBY_CACHE_SIZE', 2048))
+
+EARTH_RADIUS_M = 6371000
+
+
+def geohash_encode(lat: float, lng: float, precision: int) -> str:
+    """Encode a coordinate as a geohash of the given length."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def geohash_neighbours(geohash: str) -> List[str]:
+    """Return the cell itself followed by its (up to) eight neighbours."""
+    min_lat, max_lat, min_lng, max_lng = geohash_bounds(geohash)
+    lat_step = max_lat - min_lat
+    lng_step = max_lng - min_lng
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+
+    cells = [geohash]
+    for d_lat in (-1, 0, 1):
+        for d_lng in (-1, 0, 1):
+            if d_lat == 0 and d_lng == 0:
+                continue
+            lat = center_lat + d_lat * lat_step
+            if not -90 <= lat <= 90:
+                continue
+            lng = (center_lng + d_lng * lng_step + 180) % 360 - 180
+            cell = geohash_encode(lat, lng, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two coordinates in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def radius_class(radius: int) -> Tuple[int, int, int]:
+    """Return (class radius, geohash precision, fetch radius) for a search radius."""
+    for max_radius, precision, fetch_radius in RADIUS_CLASSES:
+        if radius <= max_radius:
+            return max_radius, precision, fetch_radius
+    return RADIUS_CLASSES[-1]
+
+
+class NearbySearchCache:
+    """
+    Nearby-search results bucketed by geohash cell, place type and radius class.
+
+    Each upstream search is stored under the cell of its centre, with the
+    centre and radius it covered. A lookup is a hit when a fresh entry in its
+    own or a neighbouring cell covers the whole query circle (the distance
+    between the centres plus the query radius is within the stored radius):
+    Maps returns a capped result set, so a search centred elsewhere says
+    nothing about places beyond its own circle. The answer merges the fresh
+    entries of those cells and keeps only places within the requested
+    radius of the actual query point.
+    """
+
+    def __init__(self, ttl: int = NEARBY_CACHE_TTL, max_entries: int = NEARBY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, int], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh_entry(self, key: Tuple[str, str, int]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['timestamp'] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, lat: float, lng: float, radius: int, place_type: str) -> Optional[List[Dict[str, Any]]]:
+        """Return cached places within radius of (lat, lng), or None on a miss."""
+        class_radius, precision, _ = radius_class(radius)
+        cells = geohash_neighbours(geohash_encode(lat, lng, precision))
+
+        with self._lock:
+            entries = [self._fresh_entry((cell, place_type, class_radius)) for cell in cells]
+        if not any(entry is not None and haversine_m(lat, lng, entry['lat'], entry['lng']) + radius <= entry['radius']
+                   for entry in entries):
+            return None
+
+        seen = set()
+        places = []
+        for entry in entries:
+            if entry is None:
+                continue
+            for place in entry['results']:
+                place_id = place.get('place_id')
+                if place_id in seen:
+                    continue
+                location = place.get('geometry', {}).get('location')
+                if not location:
+                    continue
+                if haversine_m(lat, lng, location['lat'], location['lng']) <= radius:
+                    seen.add(place_id)
+                    places.append(place)
+        return places
+
+    def put(self, lat: float, lng: float, radius: int, place_type: str, results: List[Dict[str, Any]]):
+        """Store the results of an upstream search centred on (lat, lng) with radius's fetch radius."""
+        class_radius, precision, fetch_radius = radius_class(radius)
+        key = (geohash_encode(lat, lng, precision), place_type, class_radius)
+        with self._lock:
+            self._entries[key] = {'results': results, 'lat': lat, 'lng': lng, 'radius': fetch_radius,
+                                  'timestamp': time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+nearby_cache = NearbySearchCache()
+
+
+def nearby_search(lat: float, lng: float, radius: int, place_type: str, api_key: str) -> Dict[str, Any]:
+    """
+    Places Nearby Search served from the geohash cache when possible.
+
+    On a miss the upstream search is issued with the fetch radius of the
+    class, so the cached bucket can answer queries of the class from the
+    neighbourhood, and the results are cut down to the requested circle.
+    """
+    places = nearby_cache.get(lat, lng, radius, place_type)
+    record_cache('nearby', places is not None)
+    if places is not None:
+        logger.info(f"Nearby search cache hit for {place_type} near {lat},{lng}")
+        return {"status": "OK", "results": places, "source": "nearby_cache"}
+
+    _, _, fetch_radius = radius_class(radius)
+    params = {
+        "location": f"{lat},{lng}",
+        "radius": fetch_radius,
+        "type": place_type,
+        "key": api_key
+    }
+    data = maps_get("place/nearbysearch/json", params)
+    if data.get("status") in ("OK", "ZERO_RESULTS"):
+        nearby_cache.put(lat, lng, radius, place_type, data.get("results", []))
+
+    results = [
+        place for place in data.get("results", [])
+        if 'location' in place.get('geometry', {}) and haversine_m(
+            lat, lng,
+            place['geometry']['location']['lat'],
+            place['geometry']['location']['lng']
+        ) <= radius
+    ]
+    return {**data, "results": results}
@@ -1,21 +1,31 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 try:
     from serpapi import Client
 except ImportError:
-    print("Warning: SERP API not installed. Please run: pip install serpapi")
+    logger.warning("SERP API not installed. Please run: pip install serpapi")
     Client = None
 
 try:
     from serpapi.google_search import GoogleSearch
 except ImportError:
-    print("Warning: Google Search Results not installed. Please run: pip install google-search-results")
+    logger.warning("Google Search Results not installed. Please run: pip install google-search-results")
     GoogleSearch = None
 
 import os
 from typing import Dict, Any
 from datetime import datetime
 from .base_agent import BaseAgent
+from .upstream import generate_content, serp_search, configure_gemini, list_models, upstream_available
+from .geocoding import find_city_in_text
+from .poi_index import get_poi_index, is_freshness_sensitive, format_pois
+from .usage import session_over_budget
+from monitoring.metrics import record_cache
 from dotenv import load_dotenv
 
+
 class PlaceAgent(BaseAgent):
     def __init__(self):
         super().__init__(
@@ -31,28 +41,29 @@ class PlaceAgent(BaseAgent):
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
-            print("Available models:", [model.name for model in models])
+            models = list_models()
+            logger.debug(f"Available models: {[model.name for model in models]}")
             
             # Try to get the specific model
             try:
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
-                print("Successfully initialized gemini-2.0-flash")
+                logger.info("Successfully initialized gemini-2.0-flash")
             except Exception as model_error:
-                print(f"Error initializing gemini-2.0-flash: {str(model_error)}")
+                logger.warning(f"Error initializing gemini-2.0-flash: {str(model_error)}")
                 # Fallback to gemini-pro
-                print("Falling back to gemini-pro")
+                logger.warning("Falling back to gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
                 
         except Exception as e:
-            print(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing Gemini: {str(e)}")
             self.model = None
         
         load_dotenv()
         self.api_key = os.getenv('PLACE_API_KEY')
+        self.serp_api_key = os.getenv('SERP_API_KEY')
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process the input data and return results."""
@@ -83,6 +94,34 @@ class PlaceAgent(BaseAgent):
                 "message": str(e)
             }
     
+    def process_with_context(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process place-related queries with context.
+        
+        Args:
+            input_data (Dict): Dictionary containing user_input, context, entities, history
+            
+        Returns:
+            Dict: Response with place suggestions
+        """
+        user_input = input_data.get('user_input', '')
+        context = input_data.get('context', {})
+        
+        city = find_city_in_text(user_input)
+        if not city and context.get('locations'):
+            city = find_city_in_text(" ".join(context['locations']))
+        city_name = city.get('name_vi', city['name']) if city else ''
+        
+        result = self.search_places(city_name, user_input)
+        if result.get('status') != 'success':
+            return result
+        return {
+            "status": "success",
+            "content": result.get('summary') or result.get('analysis') or '',
+            "places": result.get('places', []),
+            "source": result.get('source', 'serpapi')
+        }
+    
     async def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """Validate the input data."""
         if 'type' not in input_data:
@@ -100,6 +139,22 @@ class PlaceAgent(BaseAgent):
         
     def search_places(self, city: str, query: str) -> Dict[str, Any]:
         try:
+            # Evergreen questions are answered from the local POI index;
+            # only freshness-sensitive ones go to SerpAPI and Gemini, unless
+            # the session has used up its token budget or SerpAPI's breaker is open
+            if not is_freshness_sensitive(query) or session_over_budget() \
+                    or not upstream_available("serpapi", "google"):
+                local_places = get_poi_index().search(query, city=city, limit=10)
+                record_cache('poi_index', bool(local_places))
+                if local_places:
+                    return {
+                        "status": "success",
+                        "places": local_places,
+                        "count": len(local_places),
+                        "summary": format_pois(local_places, f"🗺️ Địa điểm nổi bật ở {city}:"),
+                        "source": "local_poi_index"
+                    }
+
             if not self._check_serp_api():
                 return {
                     "status": "error",
@@ -130,8 +185,7 @@ class PlaceAgent(BaseAgent):
                 "api_key": self.serp_api_key
             }
             
-            search = GoogleSearch(params)
-            results = search.get_dict()
+            results = serp_search(params)
             
             if 'organic_results' in results:
                 # Use Gemini to analyze and summarize the results
@@ -238,24 +292,36 @@ class PlaceAgent(BaseAgent):
         
         return self._generate_response(prompt)
 
-    async def _generate_response(self, prompt):
-        """Generate a response using Gemini."""
+    def _generate_response(self, prompt: str) -> Dict[str, Any]:
+        """Generate a response using Gemini, as {"status", "content"} like BaseAgent."""
         if not self.model:
-            print("Gemini model not initialized")
-            return None
+            logger.error("Gemini model not initialized")
+            return {
+                "status": "error",
+                "message": "Gemini model not initialized"
+            }
             
         try:
-            print(f"Generating response for prompt: {prompt[:100]}...")
-            response = self.model.generate_content(prompt)
+            logger.debug("Generating response", extra={"payload": {"prompt": prompt}})
+            response = generate_content(self.model, prompt)
             if response and hasattr(response, 'text'):
-                print(f"Generated response: {response.text[:100]}...")
-                return response.text
+                logger.debug("Generated response", extra={"payload": {"response": response.text}})
+                return {
+                    "status": "success",
+                    "content": response.text
+                }
             else:
-                print("No response text found in response object")
-                return None
+                logger.warning("No response text found in response object")
+                return {
+                    "status": "error",
+                    "message": "No response text found in response object"
+                }
         except Exception as e:
-            print(f"Error generating response: {str(e)}")
-            return None
+            logger.error(f"Error generating response: {str(e)}")
+            return {
+                "status": "error",
+                "message": str(e)
+            }
 
     def process_place(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -0,0 +1,321 @@
+import os
+import csv
+import json
+import math
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+from .text_utils import fold_text
+from .geocoding import CITIES, lookup_city
+from .nearby_cache import haversine_m
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+BUNDLED_POIS_PATH = os.path.join(DATA_DIR, 'pois.csv')
+
+# Optional on-disk database and extra datasets (comma-separated CSV/GeoJSON paths)
+POI_DB_PATH = os.getenv('POI_DB_PATH', ':memory:')
+POI_DATASETS = [path for path in os.getenv('POI_DATASETS', '').split(',') if path]
+
+# Grid cell size in degrees (~1.1km at the equator)
+GRID_CELL_DEG = 0.01
+
+# Words that make a question about live data rather than evergreen facts
+FRESHNESS_KEYWORDS = [
+    'giá', 'bao nhiêu tiền', 'mở cửa', 'đóng cửa', 'hôm nay', 'tối nay', 'ngày mai',
+    'cuối tuần này', 'bây giờ', 'hiện tại', 'sự kiện', 'khuyến mãi', 'mới mở',
+    'price', 'open now', 'opening hours', 'today', 'tonight', 'tomorrow', 'event'
+]
+
+# Matched on folded text, so "gia" and "mo cua" typed without accents count
+_FRESHNESS_FOLDED = [fold_text(keyword) for keyword in FRESHNESS_KEYWORDS]
+
+# Filler words that would otherwise match every POI description
+STOPWORDS = {
+    'o', 'tai', 'cua', 'va', 'cac', 'nhung', 'nao', 'gi', 'co', 'khong', 'nhat', 'la',
+    'dia', 'diem', 'du', 'lich', 'noi', 'tieng', 'ngon', 'tim', 'goi', 'y', 'cho', 'toi',
+    'minh', 'ban', 'nen', 'di', 'den', 'the', 'in', 'of', 'at', 'to', 'and', 'best', 'top'
+}
+
+# OSM tags mapped to our categories when importing GeoJSON extracts
+OSM_CATEGORIES = {
+    'museum': 'museum',
+    'attraction': 'attraction',
+    'viewpoint': 'nature',
+    'restaurant': 'food',
+    'cafe': 'food',
+    'fast_food': 'food',
+    'food_court': 'food',
+    'marketplace': 'shopping',
+    'bar': 'nightlife',
+    'pub': 'nightlife',
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pois (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    city TEXT,
+    lat REAL,
+    lng REAL,
+    address TEXT,
+    description TEXT,
+    tags TEXT,
+    source TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pois_fts USING fts5(name, body, city, tokenize = 'unicode61');
+CREATE TABLE IF NOT EXISTS poi_grid (
+    cell_lat INTEGER,
+    cell_lng INTEGER,
+    poi_id INTEGER,
+    PRIMARY KEY (cell_lat, cell_lng, poi_id)
+) WITHOUT ROWID;
+"""
+
+
+def is_freshness_sensitive(text: str) -> bool:
+    """Return True if a question needs live data (prices, opening hours, events...)."""
+    text = f" {fold_text(text)} "
+    return any(f" {keyword} " in text for keyword in _FRESHNESS_FOLDED)
+
+
+def _cell(lat: float, lng: float) -> tuple:
+    return int(math.floor(lat / GRID_CELL_DEG)), int(math.floor(lng / GRID_CELL_DEG))
+
+
+def _nearest_city(lat: float, lng: float, max_distance_m: float = 50000) -> Optional[str]:
+    """Name of the closest known city, used when a dataset row has no city."""
+    best_name, best_distance = None, max_distance_m
+    for city in CITIES:
+        distance = haversine_m(lat, lng, city['lat'], city['lng'])
+        if distance < best_distance:
+            best_name, best_distance = city['name'], distance
+    return best_name
+
+
+class POIIndex:
+    """
+    Local store of evergreen points of interest.
+
+    Rows live in SQLite with an FTS5 table over diacritic-folded text and a
+    grid table for radius queries, so agents can answer "what to see / eat
+    in X" without SerpAPI or Gemini.
+    """
+
+    def __init__(self, db_path: str = ':memory:'):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pois").fetchone()[0]
+
+    def add_many(self, pois: Iterable[Dict[str, Any]], source: str = "") -> int:
+        """Insert POIs (dicts with name, category, city, lat, lng, ...); returns the count."""
+        count = 0
+        with self._lock:
+            for poi in pois:
+                lat, lng = float(poi['lat']), float(poi['lng'])
+                city = lookup_city(poi.get('city') or '')
+                city_name = city['name'] if city else (poi.get('city') or _nearest_city(lat, lng) or '')
+                cursor = self._conn.execute(
+                    "INSERT INTO pois (name, category, city, lat, lng, address, description, tags, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (poi['name'], poi.get('category', ''), city_name, lat, lng,
+                     poi.get('address', ''), poi.get('description', ''), poi.get('tags', ''), source)
+                )
+                body = ' '.join([poi.get('category', ''), poi.get('description', ''),
+                                 poi.get('tags', '').replace(';', ' ')])
+                self._conn.execute(
+                    "INSERT INTO pois_fts (rowid, name, body, city) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid, fold_text(poi['name']), fold_text(body), fold_text(city_name))
+                )
+                cell_lat, cell_lng = _cell(lat, lng)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO poi_grid (cell_lat, cell_lng, poi_id) VALUES (?, ?, ?)",
+                    (cell_lat, cell_lng, cursor.lastrowid)
+                )
+                count += 1
+            self._conn.commit()
+        return count
+
+    def load_csv(self, path: str) -> int:
+        """Load a CSV with columns name, category, city, lat, lng, address, description, tags."""
+        with open(path, encoding='utf-8', newline='') as f:
+            return self.add_many(csv.DictReader(f), source=os.path.basename(path))
+
+    def load_geojson(self, path: str) -> int:
+        """Load an OSM GeoJSON export (e.g. from overpass-turbo)."""
+        with open(path, encoding='utf-8') as f:
+            features = json.load(f).get('features', [])
+
+        pois = []
+        for feature in features:
+            props = feature.get('properties', {})
+            name = props.get('name:vi') or props.get('name')
+            category = next(
+                (OSM_CATEGORIES[props[tag]] for tag in ('tourism', 'amenity', 'historic')
+                 if props.get(tag) in OSM_CATEGORIES),
+                'attraction' if props.get('tourism') or props.get('historic') else None
+            )
+            point = _feature_point(feature.get('geometry') or {})
+            if not name or not category or not point:
+                continue
+            pois.append({
+                'name': name,
+                'category': category,
+                'city': props.get('addr:city', ''),
+                'lat': point[1],
+                'lng': point[0],
+                'address': ' '.join(filter(None, [props.get('addr:housenumber'), props.get('addr:street')])),
+                'description': props.get('description', ''),
+                'tags': ';'.join(filter(None, [props.get('name:en'), props.get('cuisine'), props.get('tourism')]))
+            })
+        return self.add_many(pois, source=os.path.basename(path))
+
+    def load(self, path: str) -> int:
+        """Load a dataset, picking the reader from the file extension."""
+        if path.endswith(('.geojson', '.json')):
+            return self.load_geojson(path)
+        return self.load_csv(path)
+
+    def search(self, query: str, city: Optional[str] = None, category: Optional[str] = None,
+               limit: int = 10) -> List[Dict[str, Any]]:
+        """Full-text search ranked by BM25, optionally restricted to a city and category."""
+        terms = [term for term in fold_text(query).split() if term not in STOPWORDS]
+        city_entry = lookup_city(city) if city else None
+        city_name = city_entry['name'] if city_entry else city
+
+        # City names are matched through the city column, not as search terms
+        if city_name:
+            city_terms = set(fold_text(city_name).split())
+            if city_entry:
+                for alias in [city_entry.get('name_vi', '')] + city_entry.get('aliases', []):
+                    city_terms.update(fold_text(alias).split())
+            terms = [term for term in terms if term not in city_terms]
+
+        sql = "SELECT pois.* FROM pois"
+        params: List[Any] = []
+        clauses = []
+        if terms:
+            sql += " JOIN pois_fts ON pois_fts.rowid = pois.id"
+            clauses.append("pois_fts MATCH ?")
+            params.append(' OR '.join(f'"{term}"*' for term in terms))
+        if city_name:
+            clauses.append("pois.city = ?")
+            params.append(city_name)
+        if category:
+            clauses.append("pois.category = ?")
+            params.append(category)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY bm25(pois_fts)" if terms else " ORDER BY pois.id"
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def nearby(self, lat: float, lng: float, radius_m: float, category: Optional[str] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        """Return POIs within radius_m of a point, nearest first."""
+        cell_lat, cell_lng = _cell(lat, lng)
+        lat_span = int(math.ceil(radius_m / 111000 / GRID_CELL_DEG))
+        lng_span = int(math.ceil(radius_m / (111000 * max(math.cos(math.radians(lat)), 0.01)) / GRID_CELL_DEG))
+
+        sql = (
+            "SELECT pois.* FROM poi_grid JOIN pois ON pois.id = poi_grid.poi_id "
+            "WHERE cell_lat BETWEEN ? AND ? AND cell_lng BETWEEN ? AND ?"
+        )
+        params: List[Any] = [cell_lat - lat_span, cell_lat + lat_span, cell_lng - lng_span, cell_lng + lng_span]
+        if category:
+            sql += " AND pois.category = ?"
+            params.append(category)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            distance = haversine_m(lat, lng, row['lat'], row['lng'])
+            if distance <= radius_m:
+                results.append({**dict(row), 'distance_m': round(distance)})
+        results.sort(key=lambda poi: poi['distance_m'])
+        return results[:limit]
+
+
+def _feature_point(geometry: Dict[str, Any]) -> Optional[tuple]:
+    """Return (lng, lat) for a point, or the vertex average for lines/polygons."""
+    coordinates = geometry.get('coordinates')
+    if not coordinates:
+        return None
+    if geometry.get('type') == 'Point':
+        return tuple(coordinates[:2])
+    # Flatten nested rings/lines down to a list of [lng, lat] pairs
+    while coordinates and isinstance(coordinates[0][0], list):
+        coordinates = coordinates[0]
+    lngs = [point[0] for point in coordinates]
+    lats = [point[1] for point in coordinates]
+    return sum(lngs) / len(lngs), sum(lats) / len(lats)
+
+
+_index: Optional[POIIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_poi_index() -> POIIndex:
+    """Return the shared index, building it from the bundled and configured datasets on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = POIIndex(POI_DB_PATH)
+                if len(index) == 0:
+                    for path in [BUNDLED_POIS_PATH] + POI_DATASETS:
+                        try:
+                            loaded = index.load(path)
+                            logger.info(f"Loaded {loaded} POIs from {path}")
+                        except (OSError, ValueError, KeyError) as e:
+                            logger.error(f"Error loading POI dataset {path}: {str(e)}")
+                _index = index
+    return _index
+
+
+def format_pois(pois: List[Dict[str, Any]], title: str) -> str:
+    """Render POIs as a short Vietnamese answer in the agents' emoji style."""
+    lines = [title, ""]
+    for i, poi in enumerate(pois, 1):
+        lines.append(f"{i}. 📍 {poi['name']}")
+        if poi.get('address'):
+            lines.append(f"   🏠 Địa chỉ: {poi['address']}")
+        if poi.get('description'):
+            lines.append(f"   💡 {poi['description']}")
+    return "\n".join(lines)
+
+
+def main():
+    """Build a persistent POI database: python -m agents.poi_index DATASET... --db pois.sqlite3"""
+    parser = argparse.ArgumentParser(description="Import POI datasets (CSV or OSM GeoJSON) into SQLite")
+    parser.add_argument('datasets', nargs='*', help="CSV or GeoJSON files to import")
+    parser.add_argument('--db', required=True, help="SQLite database to create or extend")
+    parser.add_argument('--no-bundled', action='store_true', help="Skip the bundled pois.csv")
+    args = parser.parse_args()
+
+    from monitoring.logging_config import configure_logging
+    configure_logging(fmt='text')
+    index = POIIndex(args.db)
+    paths = ([] if args.no_bundled else [BUNDLED_POIS_PATH]) + args.datasets
+    for path in paths:
+        logger.info(f"Imported {index.load(path)} POIs from {path}")
+    logger.info(f"{len(index)} POIs in {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import threading
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlencode
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Parameters that identify the caller rather than the resource being fetched
+NON_CANONICAL_PARAMS = ('key', 'api_key')
+
+_current_context: contextvars.ContextVar = contextvars.ContextVar('request_context', default=None)
+
+
+class _Entry:
+    """A single memoized upstream fetch, shared by every caller in the turn."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RequestContext:
+    """
+    Memoizes upstream calls for the life of one chat turn.
+
+    Every fetch goes through memoize() under a canonical key, so a resource
+    that several agent methods depend on (the geocode of a city, the nearby
+    hotels around it, ...) is fetched exactly once. Concurrent callers asking
+    for a key that is already in flight wait for that fetch instead of
+    issuing their own.
+    """
+
+    def __init__(self, name: str = "request"):
+        self.name = name
+        self.started_at = time.time()
+        self.calls: List[Dict[str, Any]] = []
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def fetch_count(self) -> int:
+        return sum(1 for call in self.calls if call['source'] == 'fetch')
+
+    @property
+    def hit_count(self) -> int:
+        return sum(1 for call in self.calls if call['source'] == 'memo')
+
+    def memoize(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Return the value for key, calling fetch only if nobody has yet."""
+        with self._lock:
+            entry = self._entries.get(key)
+            is_owner = entry is None
+            if is_owner:
+                entry = _Entry()
+                self._entries[key] = entry
+
+        record_cache('request_memo', not is_owner)
+        if not is_owner:
+            entry.done.wait()
+            self._record(key, 'memo', 0.0)
+            if entry.error is not None:
+                raise entry.error
+            return entry.value
+
+        start = time.perf_counter()
+        try:
+            entry.value = fetch()
+            return entry.value
+        except Exception as e:
+            # Let waiters see the failure, but allow a later caller to retry
+            entry.error = e
+            with self._lock:
+                self._entries.pop(key, None)
+            raise
+        finally:
+            entry.done.set()
+            self._record(key, 'fetch', time.perf_counter() - start)
+
+    def _record(self, key: str, source: str, elapsed: float):
+        with self._lock:
+            self.calls.append({
+                'key': key,
+                'source': source,
+                'elapsed_ms': round(elapsed * 1000, 2)
+            })
+
+    def summary(self) -> Dict[str, Any]:
+        """Return a trace of the upstream calls made during this turn."""
+        return {
+            'name': self.name,
+            'fetches': self.fetch_count,
+            'memo_hits': self.hit_count,
+            'calls': list(self.calls)
+        }
+
+
+def canonical_key(namespace: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Build a stable cache key from a namespace and request parameters."""
+    if not params:
+        return namespace
+    items = sorted(
+        (str(name), str(value).strip())
+        for name, value in params.items()
+        if name not in NON_CANONICAL_PARAMS and value is not None
+    )
+    return f"{namespace}?{urlencode(items)}"
+
+
+def current_context() -> Optional[RequestContext]:
+    """Return the request context of the running chat turn, if any."""
+    return _current_context.get()
+
+
+def memoize(key: str, fetch: Callable[[], Any]) -> Any:
+    """Memoize fetch in the current request context, or just call it."""
+    context = _current_context.get()
+    if context is None:
+        return fetch()
+    return context.memoize(key, fetch)
+
+
+@contextmanager
+def request_scope(name: str = "request") -> Iterator[RequestContext]:
+    """
+    Open a request context for one chat turn.
+
+    Nested scopes reuse the outer context, so an agent method can open its
+    own scope without splitting the memo of the turn that called it.
+    """
+    context = _current_context.get()
+    if context is not None:
+        yield context
+        return
+
+    context = RequestContext(name)
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+        logger.info(
+            f"Upstream calls for {name}: {context.fetch_count} fetched, "
+            f"{context.hit_count} served from request memo"
+        )
+        for call in context.calls:
+            logger.debug(f"  [{call['source']}] {call['key']} ({call['elapsed_ms']}ms)")
@@ -0,0 +1,378 @@
+import os
+import time
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from monitoring.metrics import BULKHEAD_IN_USE, BULKHEAD_REJECTED, CIRCUIT_REJECTED, CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+# Circuit breakers, one per upstream service and target (serpapi/google_flights, ...):
+# trip once CIRCUIT_FAILURE_RATIO of at least CIRCUIT_MIN_CALLS calls in the
+# last CIRCUIT_WINDOW_SECONDS failed, then reject calls for CIRCUIT_OPEN_SECONDS
+CIRCUIT_WINDOW_SECONDS = float(os.getenv('CIRCUIT_WINDOW_SECONDS', 60))
+CIRCUIT_MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', 10))
+CIRCUIT_FAILURE_RATIO = float(os.getenv('CIRCUIT_FAILURE_RATIO', 0.5))
+CIRCUIT_OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 30))
+
+# Calls slower than this count as failures even when they succeed
+CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', 20))
+
+# Trial calls let through while half-open
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_CALLS', 1))
+
+# Bulkheads: concurrent turns per agent, e.g. AGENT_BULKHEAD_LIMITS="flight=4,hotel=4"
+AGENT_BULKHEAD_LIMIT = int(os.getenv('AGENT_BULKHEAD_LIMIT', 8))
+AGENT_BULKHEAD_LIMITS = os.getenv('AGENT_BULKHEAD_LIMITS', '')
+
+# How long a turn may queue for a full bulkhead before being turned away
+BULKHEAD_MAX_WAIT = float(os.getenv('BULKHEAD_MAX_WAIT', 1.0))
+
+# Degraded mode (QuotaMonitor): share of Gemini calls rate limited with 429
+DEGRADED_WINDOW_SECONDS = float(os.getenv('DEGRADED_WINDOW_SECONDS', 60))
+DEGRADED_MIN_CALLS = int(os.getenv('DEGRADED_MIN_CALLS', 5))
+DEGRADED_ENTER_RATIO = float(os.getenv('DEGRADED_ENTER_RATIO', 0.3))
+
+# Shortest stay in degraded mode, share of turns still sent to Gemini as
+# probes, and successful calls in a row that end it
+DEGRADED_MIN_SECONDS = float(os.getenv('DEGRADED_MIN_SECONDS', 30))
+DEGRADED_PROBE_RATE = float(os.getenv('DEGRADED_PROBE_RATE', 0.05))
+DEGRADED_EXIT_PROBES = int(os.getenv('DEGRADED_EXIT_PROBES', 2))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Gauge values for circuit_breaker_state
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_probing: contextvars.ContextVar = contextvars.ContextVar('quota_probe', default=False)
+_rejections: contextvars.ContextVar = contextvars.ContextVar('circuit_rejections', default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """An upstream call rejected without being made because its breaker is open."""
+
+
+class BulkheadFullError(RuntimeError):
+    """An agent already has as many turns in flight as its bulkhead allows."""
+
+
+@contextmanager
+def watch_rejections() -> Iterator[List[str]]:
+    """
+    Collect the breakers that reject calls made inside the block.
+
+    Agents catch upstream errors and return error dicts, so this is how a
+    turn learns afterwards that it failed on an open circuit. Threads
+    started with the block's context (supporting agents) report here too.
+    """
+    rejections: List[str] = []
+    token = _rejections.set(rejections)
+    try:
+        yield rejections
+    finally:
+        _rejections.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over a rolling window of call outcomes.
+
+    Closed: calls go through and outcomes are kept for the last
+    window_seconds. Once enough of them failed the breaker opens and
+    before_call() raises CircuitOpenError straight away, so callers drop to
+    their local fallback instead of waiting on retries and timeouts. After
+    open_seconds a few trial calls are let through (half-open); one
+    success closes the breaker, one failure opens it again.
+    """
+
+    def __init__(self, name: str, window_seconds: float = CIRCUIT_WINDOW_SECONDS,
+                 min_calls: int = CIRCUIT_MIN_CALLS, failure_ratio: float = CIRCUIT_FAILURE_RATIO,
+                 open_seconds: float = CIRCUIT_OPEN_SECONDS, slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+                 half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit {self.name} {self.state} -> {state}")
+        self.state = state
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._reject()
+                self._set_state(HALF_OPEN)
+                self._trials = 0
+            if self.state == HALF_OPEN:
+                if self._trials >= self.half_open_calls:
+                    self._reject()
+                self._trials += 1
+
+    def _reject(self):
+        service, _, target = self.name.partition('/')
+        CIRCUIT_REJECTED.inc(service=service, target=target)
+        rejections = _rejections.get()
+        if rejections is not None:
+            rejections.append(self.name)
+        raise CircuitOpenError(f"{self.name} is unavailable (circuit open), using fallback")
+
+    def record(self, failed: bool, duration: float = 0.0):
+        """Record the outcome of a call that before_call() let through."""
+        failed = failed or duration >= self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self._outcomes.clear()
+                    self._failures = 0
+                    self._set_state(CLOSED)
+                return
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            self._prune(now)
+            calls = len(self._outcomes)
+            if self.state == CLOSED and calls >= self.min_calls and self._failures / calls >= self.failure_ratio:
+                self._open(now)
+
+    def _open(self, now: float):
+        self._opened_at = now
+        self._set_state(OPEN)
+
+    @property
+    def available(self) -> bool:
+        """False while open and not yet due for a trial call."""
+        with self._lock:
+            return self.state != OPEN or time.monotonic() - self._opened_at >= self.open_seconds
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            self._prune(time.monotonic())
+            return {
+                'state': self.state,
+                'calls': len(self._outcomes),
+                'failures': self._failures,
+                'open_for_s': round(max(self.open_seconds - (time.monotonic() - self._opened_at), 0), 1)
+                if self.state == OPEN else 0.0
+            }
+
+
+class Bulkhead:
+    """
+    Caps the turns one agent may run at once.
+
+    A slow dependency then ties up at most `limit` request threads (those
+    of the agent that needs it) instead of all of them; further turns for
+    that agent wait up to max_wait and are then turned away, while other
+    agents keep answering.
+    """
+
+    def __init__(self, name: str, limit: int, max_wait: float = BULKHEAD_MAX_WAIT):
+        self.name = name
+        self.limit = limit
+        self.max_wait = max_wait
+        self.in_use = 0
+        self._semaphore = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        if not self._semaphore.acquire(timeout=self.max_wait):
+            BULKHEAD_REJECTED.inc(agent=self.name)
+            raise BulkheadFullError(f"{self.name} agent is at its limit of {self.limit} concurrent requests")
+        with self._lock:
+            self.in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._semaphore.release()
+
+    def status(self) -> Dict[str, Any]:
+        return {'limit': self.limit, 'in_use': self.in_use}
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for item in spec.split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip().isdigit():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class Resilience:
+    """Breakers per upstream dependency and bulkheads per agent, created on first use."""
+
+    def __init__(self, bulkhead_limits: Optional[Dict[str, int]] = None):
+        self.bulkhead_limits = bulkhead_limits if bulkhead_limits is not None else _parse_limits(AGENT_BULKHEAD_LIMITS)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._bulkheads: Dict[str, Bulkhead] = {}
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set_function(self._circuit_states)
+        BULKHEAD_IN_USE.set_function(self._bulkheads_in_use)
+
+    def _circuit_states(self) -> Dict[Tuple[str, ...], float]:
+        return {tuple(name.split('/', 1)): _STATE_VALUES[breaker.state] for name, breaker in list(self._breakers.items())}
+
+    def _bulkheads_in_use(self) -> Dict[Tuple[str, ...], float]:
+        return {(name,): bulkhead.in_use for name, bulkhead in list(self._bulkheads.items())}
+
+    def breaker(self, service: str, target: str) -> CircuitBreaker:
+        name = f"{service}/{target}"
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name))
+        return breaker
+
+    def bulkhead(self, agent: str) -> Bulkhead:
+        bulkhead = self._bulkheads.get(agent)
+        if bulkhead is None:
+            with self._lock:
+                bulkhead = self._bulkheads.setdefault(
+                    agent, Bulkhead(agent, self.bulkhead_limits.get(agent, AGENT_BULKHEAD_LIMIT)))
+        return bulkhead
+
+    def available(self, service: str, target: str) -> bool:
+        """Whether a call to service/target would be let through (no breaker yet counts as yes)."""
+        breaker = self._breakers.get(f"{service}/{target}")
+        return breaker is None or breaker.available
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'circuits': {name: breaker.status() for name, breaker in sorted(self._breakers.items())},
+            'bulkheads': {name: bulkhead.status() for name, bulkhead in sorted(self._bulkheads.items())},
+            'degraded_mode': quota.status()
+        }
+
+
+
+class QuotaExhaustedError(RuntimeError):
+    """A Gemini call skipped because degraded mode is on and the turn is not a probe."""
+
+
+class QuotaMonitor:
+    """
+    Watches the share of Gemini calls rejected with 429 and switches degraded mode.
+
+    Degraded mode turns on once DEGRADED_ENTER_RATIO of at least
+    DEGRADED_MIN_CALLS calls in the last DEGRADED_WINDOW_SECONDS were rate
+    limited. While it is on, turns are answered from the local answer store
+    (agents/degraded.py) except for a DEGRADED_PROBE_RATE fraction of probe
+    turns, which still call Gemini; none are sent before the longest
+    retryDelay the API asked for. DEGRADED_EXIT_PROBES successful calls in
+    a row (and at least DEGRADED_MIN_SECONDS in the mode) switch it off.
+    """
+
+    def __init__(self, window_seconds: float = DEGRADED_WINDOW_SECONDS, min_calls: int = DEGRADED_MIN_CALLS,
+                 enter_ratio: float = DEGRADED_ENTER_RATIO, min_seconds: float = DEGRADED_MIN_SECONDS,
+                 probe_rate: float = DEGRADED_PROBE_RATE, exit_probes: int = DEGRADED_EXIT_PROBES):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.enter_ratio = enter_ratio
+        self.min_seconds = min_seconds
+        self.probe_rate = probe_rate
+        self.exit_probes = exit_probes
+        self.active = False
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._limited = 0
+        self._entered_at = 0.0
+        self._hold_until = 0.0
+        self._successes = 0
+
+    def record(self, rate_limited: bool, retry_after: Optional[float] = None):
+        """Record one Gemini call outcome."""
+        now = time.monotonic()
+        with self._lock:
+            self._outcomes.append((now, rate_limited))
+            self._limited += rate_limited
+            while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+                _, limited = self._outcomes.popleft()
+                self._limited -= limited
+            if rate_limited:
+                self._successes = 0
+                if retry_after:
+                    self._hold_until = max(self._hold_until, now + retry_after)
+            else:
+                self._successes += 1
+
+            calls = len(self._outcomes)
+            if (rate_limited and not self.active and calls >= self.min_calls
+                    and self._limited / calls >= self.enter_ratio):
+                self.active = True
+                self._entered_at = now
+                self._successes = 0
+                logger.warning(f"Gemini quota exhausted ({self._limited}/{calls} calls rate limited), "
+                               f"entering degraded mode")
+            elif self.active and self._successes >= self.exit_probes and now - self._entered_at >= self.min_seconds:
+                self.active = False
+                # The 429s that tripped the mode are history now; don't let
+                # them re-enter it on the next call
+                self._outcomes.clear()
+                self._limited = 0
+                logger.warning("Gemini answering again, leaving degraded mode")
+
+    def serve_locally(self) -> bool:
+        """Whether this turn should be answered from the local store (False for probe turns)."""
+        if not self.active:
+            return False
+        if time.monotonic() < self._hold_until:
+            return True
+        return random.random() >= self.probe_rate
+
+    @contextmanager
+    def probe(self) -> Iterator[None]:
+        """Let this turn's Gemini calls through while degraded."""
+        token = _probing.set(True)
+        try:
+            yield
+        finally:
+            _probing.reset(token)
+
+    def admit_call(self):
+        """Raise QuotaExhaustedError for Gemini calls outside probe turns while degraded."""
+        if self.active and not _probing.get():
+            raise QuotaExhaustedError("Gemini quota exhausted, answering in degraded mode")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'active': self.active,
+                'calls': calls,
+                'rate_limited': self._limited,
+                'rate_limited_ratio': round(self._limited / calls, 3) if calls else 0.0,
+                'hold_s': round(max(self._hold_until - time.monotonic(), 0), 1)
+            }
+
+
+quota = QuotaMonitor()
+resilience = Resilience()
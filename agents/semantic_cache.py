@@ -0,0 +1,256 @@
+import os
+import re
+import copy
+import time
+import zlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from .text_utils import STOPWORDS, fold_text
+from .geocoding import find_cities_in_text, strip_city_names
+from .degraded import LOCAL_SOURCES, degraded_answers
+from .history_index import personal_facts
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    logger.warning("NumPy not installed, the response cache only matches identical questions. "
+                   "Please run: pip install numpy")
+    np = None
+
+# Cosine similarity above which a cached answer is reused for a new question
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.8))
+SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', 1800))  # 30 minutes
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', 4096))
+
+# Width of the hashed feature vector; 4096 x 512 float32 rows is 8 MB
+SEMANTIC_CACHE_DIM = int(os.getenv('SEMANTIC_CACHE_DIM', 512))
+
+# Phrasings of the same thing, folded, mapped to one concept token. Longer
+# phrases are replaced first, so "quan an ngon" is a restaurant, not a dish.
+CONCEPTS = {
+    'dish': ['mon an dac san', 'dac san', 'mon ngon', 'mon an ngon', 'mon gi ngon', 'mon nao ngon',
+             'an gi', 'an mon gi', 'mon an', 'do an', 'am thuc', 'mon'],
+    'restaurant': ['quan an ngon', 'quan an', 'quan ngon', 'nha hang', 'cho an', 'tiem an', 'quan'],
+    'weather': ['du bao thoi tiet', 'thoi tiet', 'du bao', 'khi hau', 'nhiet do'],
+    'hotel': ['khach san', 'dat phong', 'cho o', 'noi o', 'luu tru', 'nghi ngoi', 'phong', 'resort'],
+    'sight': ['dia diem du lich', 'dia diem', 'tham quan', 'diem den', 'canh dep', 'thang canh',
+              'di dau', 'choi gi', 'du lich'],
+    'cheap': ['gia re', 'binh dan', 'tiet kiem', 'gia tot', 're'],
+    'flight': ['ve may bay', 'chuyen bay', 'may bay', 'bay'],
+}
+
+# Time words kept in the scope, so "tuần này" never answers "tháng 7"
+PERIOD = re.compile(r'\b(?:hom nay|ngay mai|ngay kia|cuoi tuan|tuan (?:nay|sau|toi)|thang (?:nay|sau|\d{1,2})|'
+                    r'\d{1,2} \d{1,2}(?: \d{2,4})?|\d+ (?:ngay|dem))\b')
+
+_CONCEPT_PHRASES = sorted(
+    ((phrase, concept) for concept, phrases in CONCEPTS.items() for phrase in phrases),
+    key=lambda item: -len(item[0])
+)
+_CONCEPT_PATTERN = re.compile(r'\b(?:' + '|'.join(re.escape(phrase) for phrase, _ in _CONCEPT_PHRASES) + r')\b')
+_CONCEPT_OF = dict(_CONCEPT_PHRASES)
+
+
+def question_terms(question: str) -> List[str]:
+    """
+    The meaningful words of a question, folded.
+
+    City names and time words are removed (they scope the entry instead),
+    known phrasings are replaced by concept tokens and filler words dropped:
+    "Món ăn đặc sản ở Hà Nội" and "Hà Nội có món gì ngon" both give ['#dish'].
+    """
+    text = strip_city_names(question)
+    text = PERIOD.sub(' ', text)
+    text = _CONCEPT_PATTERN.sub(lambda match: ' #' + _CONCEPT_OF[match.group(0)] + ' ', text)
+    return [word for word in text.split() if word not in STOPWORDS]
+
+
+def question_scope(agent: str, question: str,
+                   facts: Optional[Dict[str, List[str]]] = None) -> Optional[Tuple[str, ...]]:
+    """
+    (agent, cities..., time words..., session facts...) of a question, or None if it names no city.
+
+    Questions without a city usually lean on the conversation ("còn ở đó
+    thì sao?"), so they are never cached. facts are the session's
+    history facts (HistoryIndexes.facts): an answer shaped by them is only
+    reused by sessions that stated the same ones.
+    """
+    cities = [city['name'] for city in find_cities_in_text(question)]
+    if not cities:
+        return None
+    periods = [' '.join(match.group(0).split()) for match in PERIOD.finditer(fold_text(question))]
+    return (agent, *cities, *periods, *personal_facts(question, facts))
+
+
+def _features(terms: List[str]):
+    """(feature, weight) pairs: whole terms, plus character trigrams of ordinary words."""
+    for term in terms:
+        yield term, 1.0
+        if term.startswith('#'):
+            continue
+        padded = f"<{term}>"
+        for i in range(len(padded) - 2):
+            yield padded[i:i + 3], 0.5
+
+
+def embed(terms: List[str], dim: int = SEMANTIC_CACHE_DIM):
+    """
+    L2-normalised hashed bag of terms and trigrams.
+
+    crc32 (not hash(), which is salted per process) picks the column and
+    the sign, so vectors are stable across restarts and collisions cancel
+    out on average.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(terms):
+        code = zlib.crc32(feature.encode('utf-8'))
+        vector[code % dim] += weight if code & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """
+    Chat answers reused across paraphrased questions.
+
+    Entries are scoped by agent, the cities named, any time words and the
+    session's remembered facts, so a match is only searched among
+    questions about the same thing; within a scope the question vectors
+    are compared by brute force (a scope holds a handful of rows). Rows live in one preallocated NumPy matrix used as
+    a ring buffer, so the oldest entry is overwritten once it is full.
+    Without NumPy only questions with identical terms match.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl: int = SEMANTIC_CACHE_TTL,
+                 capacity: int = SEMANTIC_CACHE_SIZE, dim: int = SEMANTIC_CACHE_DIM):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.capacity = capacity
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32) if np is not None else None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._by_scope: Dict[Tuple[str, ...], List[int]] = {}
+        self._by_key: Dict[Tuple[Tuple[str, ...], str], int] = {}
+        self._next = 0
+
+    def lookup(self, agent: str, question: str,
+               facts: Optional[Dict[str, List[str]]] = None) -> Optional[Dict[str, Any]]:
+        """A copy of the cached answer to this or a similar question, or None."""
+        scope = question_scope(agent, question, facts)
+        if scope is None:
+            return None
+        terms = question_terms(question)
+        asked = fold_text(question)
+        now = time.time()
+
+        with self._lock:
+            slot = self._by_key.get((scope, ' '.join(terms)))
+            similarity = 1.0
+            if slot is None or self._entries[slot]['expires'] <= now:
+                slot, similarity = self._nearest(scope, terms, now)
+            entry = self._entries[slot] if slot is not None else None
+            response = copy.deepcopy(entry['response']) if entry is not None else None
+            # What a cache keyed on the exact question would have done: hit
+            # only on a repeat, and remember this wording from now on
+            exact_hit = entry is not None and asked in entry['asked']
+            if entry is not None:
+                entry['asked'].add(asked)
+
+        record_cache('response_exact', exact_hit)
+        record_cache('response_semantic', response is not None)
+        if response is None:
+            return None
+        logger.info(f"Answering {agent} question from cache (similarity {similarity:.2f}): {entry['question']}")
+        response['cached'] = {'question': entry['question'], 'similarity': round(similarity, 3),
+                              'age_s': round(now - entry['stored'])}
+        return response
+
+    def _nearest(self, scope: Tuple[str, ...], terms: List[str], now: float,
+                 stale: bool = False) -> Tuple[Optional[int], float]:
+        rows = self._by_scope.get(scope)
+        if self._vectors is None or not rows or not terms:
+            return None, 0.0
+        similarities = self._vectors[rows] @ embed(terms, self.dim)
+        for index in np.argsort(-similarities):
+            similarity = float(similarities[index])
+            if similarity < self.threshold:
+                break
+            if stale or self._entries[rows[index]]['expires'] > now:
+                return rows[index], similarity
+        return None, 0.0
+
+    def stale(self, agent: str, question: str,
+              facts: Optional[Dict[str, List[str]]] = None) -> Optional[Tuple[str, float]]:
+        """
+        (content, stored_at) of the answer to this or a similar question, expired or not.
+
+        Expired entries stay in their slot until the ring buffer reaches
+        it again; degraded mode answers from them rather than from nothing.
+        """
+        scope = question_scope(agent, question, facts)
+        if scope is None:
+            return None
+        terms = question_terms(question)
+        with self._lock:
+            slot = self._by_key.get((scope, ' '.join(terms)))
+            if slot is None:
+                slot, _ = self._nearest(scope, terms, time.time(), stale=True)
+            entry = self._entries[slot] if slot is not None else None
+            return (entry['response']['content'], entry['stored']) if entry is not None else None
+
+    def store(self, agent: str, question: str, response: Dict[str, Any],
+              facts: Optional[Dict[str, List[str]]] = None):
+        """Cache a successful answer; local and degraded answers are cheap to rebuild and left out."""
+        if not isinstance(response, dict) or response.get('status') != 'success' or not response.get('content'):
+            return
+        if response.get('source') in LOCAL_SOURCES:
+            return
+        scope = question_scope(agent, question, facts)
+        if scope is None:
+            return
+        terms = question_terms(question)
+        key = ' '.join(terms)
+        now = time.time()
+        entry = {'scope': scope, 'key': key, 'question': question, 'asked': {fold_text(question)},
+                 'stored': now, 'expires': now + self.ttl, 'response': copy.deepcopy(response)}
+
+        with self._lock:
+            slot = self._by_key.get((scope, key))
+            if slot is None:
+                slot = self._next
+                self._next = (self._next + 1) % self.capacity
+                self._evict(slot)
+                self._by_scope.setdefault(scope, []).append(slot)
+                self._by_key[(scope, key)] = slot
+            self._entries[slot] = entry
+            if self._vectors is not None:
+                self._vectors[slot] = embed(terms, self.dim) if terms else 0.0
+
+    def _evict(self, slot: int):
+        old = self._entries[slot]
+        if old is None:
+            return
+        self._entries[slot] = None
+        self._by_key.pop((old['scope'], old['key']), None)
+        rows = self._by_scope.get(old['scope'], [])
+        rows.remove(slot)
+        if not rows:
+            del self._by_scope[old['scope']]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': sum(entry is not None for entry in self._entries),
+                'scopes': len(self._by_scope),
+                'capacity': self.capacity,
+                'vector_search': self._vectors is not None
+            }
+
+
+response_cache = SemanticCache()
+degraded_answers.add_stale_source(response_cache.stale)
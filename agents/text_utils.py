@@ -0,0 +1,36 @@
+import re
+import unicodedata
+from typing import List
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Folded Vietnamese filler words that carry no meaning for matching
+STOPWORDS = frozenset(
+    'o tai cho toi minh xin hay giup voi nhe a ah khong the nao co gi la nhung cac cua va nay '
+    'di den tu thi ban oi nhat nhieu nen biet muon can tim goi y'.split()
+)
+
+
+def fold_text(text: str) -> str:
+    """
+    Lowercase text and strip Vietnamese diacritics for matching.
+
+    "Đà Nẵng" and "da nang" both fold to "da nang"; punctuation collapses
+    to single spaces.
+    """
+    if not text:
+        return ""
+    text = text.replace('Đ', 'D').replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return _NON_ALNUM.sub(' ', text.lower()).strip()
+
+
+def compact_text(text: str) -> str:
+    """Fold text and drop spaces, so "Ha Noi" and "hanoi" compare equal."""
+    return fold_text(text).replace(' ', '')
+
+
+def content_words(text: str) -> List[str]:
+    """Folded words of text, without STOPWORDS."""
+    return [word for word in fold_text(text).split() if word not in STOPWORDS]
@@ -5,14 +5,17 @@ import google.generativeai as genai
 import time
 import re
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from datetime import datetime, timedelta
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from dotenv import load_dotenv
+from .request_context import request_scope
+from .upstream import maps_get, generate_content, configure_gemini, list_models
+from .geocoding import geocode, find_place_id, lookup_city
+from .nearby_cache import nearby_search
+from .guide_store import guide_store
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -53,30 +56,30 @@ Example response format:
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
-            print("Available models:", [model.name for model in models])
+            models = list_models()
+            logger.debug(f"Available models: {[model.name for model in models]}")
             
             # Try to get the specific model
             try:
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
-                print("Successfully initialized gemini-2.0-flash")
+                logger.info("Successfully initialized gemini-2.0-flash")
             except Exception as model_error:
-                print(f"Error initializing gemini-2.0-flash: {str(model_error)}")
+                logger.warning(f"Error initializing gemini-2.0-flash: {str(model_error)}")
                 # Fallback to gemini-pro
-                print("Falling back to gemini-pro")
+                logger.warning("Falling back to gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
                 
         except Exception as e:
-            print(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing Gemini: {str(e)}")
             self.model = None
 
         # Initialize Google Maps API
         self.google_maps_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
         if not self.google_maps_api_key:
-            logging.warning("GOOGLE_MAPS_API_KEY not found in environment variables")
+            logger.warning("GOOGLE_MAPS_API_KEY not found in environment variables")
         
         # Initialize Google Cloud credentials
         try:
@@ -91,46 +94,26 @@ Example response format:
             
             # Initialize Travel Partner API client
             self.travel_service = build('travelpartner', 'v1', credentials=self.credentials)
-            print("Successfully initialized Travel Partner API client")
+            logger.info("Successfully initialized Travel Partner API client")
             
         except Exception as e:
-            logging.error(f"Error initializing Google Cloud credentials: {str(e)}")
+            logger.error(f"Error initializing Google Cloud credentials: {str(e)}")
             self.credentials = None
             self.travel_service = None
         
-        # API endpoints
-        self.places_api_url = "https://maps.googleapis.com/maps/api/place"
-        self.geocoding_api_url = "https://maps.googleapis.com/maps/api/geocode/json"
-
-        # City name mappings
-        self.city_mappings = {
-            # Vietnam cities
-            'hcm': 'Ho Chi Minh City',
-            'hanoi': 'Hanoi',
-            'danang': 'Da Nang',
-            'nhatrang': 'Nha Trang',
-            'phuquoc': 'Phu Quoc',
-            'dalat': 'Da Lat',
-            'haiphong': 'Hai Phong',
-            'cantho': 'Can Tho',
-            'hue': 'Hue',
-            'quynhon': 'Quy Nhon',
-            
-            # International cities
-            'bangkok': 'Bangkok',
-            'singapore': 'Singapore',
-            'tokyo': 'Tokyo',
-            'seoul': 'Seoul',
-            'taipei': 'Taipei',
-            'hongkong': 'Hong Kong',
-            'kualalumpur': 'Kuala Lumpur',
-            'jakarta': 'Jakarta',
-            'manila': 'Manila',
-            'sydney': 'Sydney'
-        }
-
-    def get_hotel_booking_info(self, location: str, check_in: str = None, check_out: str = None) -> Dict[str, Any]:
-        """Get hotel information using Google Places API."""
+        # API endpoints (relative to upstream.MAPS_API_URL)
+        self.places_api_url = "place"
+
+    def _geocode_location(self, location: str) -> Optional[Dict[str, Any]]:
+        """Geocode a city name and return the first result, or None."""
+        return geocode(location, self.google_maps_api_key)
+
+    def get_hotel_booking_info(self, location: Union[str, Dict[str, float]], check_in: str = None, check_out: str = None) -> Dict[str, Any]:
+        """
+        Get hotel information using Google Places API.
+
+        location may be a city name or an already-geocoded {"lat", "lng"} dict.
+        """
         if not self.google_maps_api_key:
             return {"status": "error", "message": "Google Maps API key not configured"}
 
@@ -141,98 +124,19 @@ Example response format:
             if not check_out:
                 check_out = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
 
-            # Map Vietnamese city names to English for better geocoding
-            vietnam_cities = {
-                "Hồ Chí Minh": "Ho Chi Minh City, Vietnam",
-                "Hà Nội": "Hanoi, Vietnam",
-                "Đà Nẵng": "Da Nang, Vietnam",
-                "Hải Phòng": "Hai Phong, Vietnam",
-                "Cần Thơ": "Can Tho, Vietnam",
-                "Nha Trang": "Nha Trang, Vietnam",
-                "Đà Lạt": "Da Lat, Vietnam",
-                "Phú Quốc": "Phu Quoc, Vietnam",
-                "Huế": "Hue, Vietnam"
-            }
-
-            # Map international cities
-            international_cities = {
-                "Tokyo": "Tokyo, Japan",
-                "Seoul": "Seoul, South Korea",
-                "Bangkok": "Bangkok, Thailand",
-                "Singapore": "Singapore",
-                "Kuala Lumpur": "Kuala Lumpur, Malaysia",
-                "Hong Kong": "Hong Kong",
-                "Taipei": "Taipei, Taiwan",
-                "Manila": "Manila, Philippines",
-                "Jakarta": "Jakarta, Indonesia",
-                "Sydney": "Sydney, Australia",
-                "Melbourne": "Melbourne, Australia",
-                "London": "London, UK",
-                "Paris": "Paris, France",
-                "New York": "New York, USA",
-                "Los Angeles": "Los Angeles, USA",
-                "San Francisco": "San Francisco, USA",
-                "Las Vegas": "Las Vegas, USA",
-                "Chicago": "Chicago, USA",
-                "Miami": "Miami, USA",
-                "Dubai": "Dubai, UAE",
-                "Rome": "Rome, Italy",
-                "Barcelona": "Barcelona, Spain",
-                "Amsterdam": "Amsterdam, Netherlands",
-                "Berlin": "Berlin, Germany",
-                "Vienna": "Vienna, Austria",
-                "Prague": "Prague, Czech Republic",
-                "Budapest": "Budapest, Hungary",
-                "Istanbul": "Istanbul, Turkey",
-                "Cairo": "Cairo, Egypt",
-                "Cape Town": "Cape Town, South Africa",
-                "Mumbai": "Mumbai, India",
-                "Delhi": "Delhi, India",
-                "Shanghai": "Shanghai, China",
-                "Beijing": "Beijing, China",
-                "Seoul": "Seoul, South Korea",
-                "Osaka": "Osaka, Japan",
-                "Fukuoka": "Fukuoka, Japan",
-                "Busan": "Busan, South Korea",
-                "Phuket": "Phuket, Thailand",
-                "Bali": "Bali, Indonesia",
-                "Penang": "Penang, Malaysia",
-                "Macau": "Macau",
-                "Manila": "Manila, Philippines",
-                "Hanoi": "Hanoi, Vietnam",
-                "Ho Chi Minh City": "Ho Chi Minh City, Vietnam",
-                "Da Nang": "Da Nang, Vietnam"
-            }
-
-            # Combine all mappings
-            city_mapping = {**vietnam_cities, **international_cities}
-
-            # Use mapped name if available, otherwise use original location
-            search_location = city_mapping.get(location, location)
-
-            # Get location coordinates first
-            geocode_params = {
-                "address": search_location,
-                "key": self.google_maps_api_key
-            }
-            geocode_response = requests.get(self.geocoding_api_url, params=geocode_params)
-            geocode_response.raise_for_status()
-            geocode_data = geocode_response.json()
-
-            if not geocode_data.get("results"):
-                return {"status": "error", "message": f"Location {location} not found"}
-
-            # Get nearby hotels using Places API
-            location = geocode_data["results"][0]["geometry"]["location"]
-            nearby_params = {
-                "location": f"{location['lat']},{location['lng']}",
-                "radius": 5000,  # 5km radius
-                "type": "lodging",  # Search for hotels
-                "key": self.google_maps_api_key
-            }
-            nearby_response = requests.get(f"{self.places_api_url}/nearbysearch/json", params=nearby_params)
-            nearby_response.raise_for_status()
-            hotels_data = nearby_response.json()
+            if isinstance(location, dict):
+                # Coordinates already resolved by the caller (e.g. get_place_info)
+                coordinates = location
+            else:
+                geocode_result = self._geocode_location(location)
+                if not geocode_result:
+                    return {"status": "error", "message": f"Location {location} not found"}
+                coordinates = geocode_result["geometry"]["location"]
+
+            # Get nearby hotels (5km radius) using Places API
+            hotels_data = nearby_search(
+                coordinates['lat'], coordinates['lng'], 5000, "lodging", self.google_maps_api_key
+            )
 
             # Get detailed information for each hotel
             hotels_info = []
@@ -243,9 +147,7 @@ Example response format:
                     "fields": "name,formatted_address,rating,user_ratings_total,price_level,formatted_phone_number,website,opening_hours,reviews",
                     "key": self.google_maps_api_key
                 }
-                details_response = requests.get(f"{self.places_api_url}/details/json", params=details_params)
-                details_response.raise_for_status()
-                hotel_details = details_response.json().get("result", {})
+                hotel_details = maps_get(f"{self.places_api_url}/details/json", details_params).get("result", {})
                 
                 # Convert price level to actual price range
                 price_level = hotel_details.get("price_level", 0)
@@ -278,7 +180,7 @@ Example response format:
                 }
             }
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error calling Google Places API: {str(e)}")
+            logger.error(f"Error calling Google Places API: {str(e)}")
             return {"status": "error", "message": str(e)}
 
     def get_place_info(self, location: str) -> Dict[str, Any]:
@@ -288,42 +190,30 @@ Example response format:
 
         try:
             # First, get coordinates for the location
-            geocode_params = {
-                "address": location,
-                "key": self.google_maps_api_key
-            }
-            geocode_response = requests.get(self.geocoding_api_url, params=geocode_params)
-            geocode_response.raise_for_status()
-            geocode_data = geocode_response.json()
-
-            if not geocode_data.get("results"):
+            geocode_result = self._geocode_location(location)
+            if not geocode_result:
                 return {"status": "error", "message": f"Location {location} not found"}
 
-            # Get place details
-            place_id = geocode_data["results"][0]["place_id"]
+            # Get place details; cities from the bundled table carry no
+            # place_id, so resolve it through the (cached) Find Place API
+            place_id = geocode_result.get("place_id") or find_place_id(
+                geocode_result["formatted_address"], self.google_maps_api_key
+            )
             place_params = {
                 "place_id": place_id,
                 "fields": "name,formatted_address,rating,user_ratings_total,types,photos,reviews,opening_hours,price_level,website,formatted_phone_number",
                 "key": self.google_maps_api_key
             }
-            place_response = requests.get(f"{self.places_api_url}/details/json", params=place_params)
-            place_response.raise_for_status()
-            place_data = place_response.json()
+            place_data = maps_get(f"{self.places_api_url}/details/json", place_params)
 
             # Get nearby places
-            location = geocode_data["results"][0]["geometry"]["location"]
-            nearby_params = {
-                "location": f"{location['lat']},{location['lng']}",
-                "radius": 5000,  # 5km radius
-                "type": "tourist_attraction",
-                "key": self.google_maps_api_key
-            }
-            nearby_response = requests.get(f"{self.places_api_url}/nearbysearch/json", params=nearby_params)
-            nearby_response.raise_for_status()
-            nearby_data = nearby_response.json()
+            coordinates = geocode_result["geometry"]["location"]
+            nearby_data = nearby_search(
+                coordinates['lat'], coordinates['lng'], 5000, "tourist_attraction", self.google_maps_api_key
+            )
 
             # Get hotel booking information
-            booking_info = self.get_hotel_booking_info(location)
+            booking_info = self.get_hotel_booking_info(coordinates)
 
             return {
                 "status": "success",
@@ -332,7 +222,7 @@ Example response format:
                 "booking_info": booking_info.get("booking_info", {})
             }
         except requests.exceptions.RequestException as e:
-            logging.error(f"Error calling Google Maps API: {str(e)}")
+            logger.error(f"Error calling Google Maps API: {str(e)}")
             return {"status": "error", "message": str(e)}
 
     def process(self, user_input: str) -> dict:
@@ -352,11 +242,34 @@ Example response format:
                     'message': 'Could not identify location from input'
                 }
 
-            # Get place information
-            place_info = self.get_place_info(location)
-            
-            # Get hotel information
-            hotel_info = self.get_hotel_booking_info(location)
+            # Top destinations are served from the pre-generated guide store
+            guide = guide_store.get(location)
+            if guide:
+                return {
+                    'status': 'success',
+                    'data': {
+                        'location': location,
+                        'place_info': None,
+                        'hotel_info': None,
+                        'recommendations': guide['content'],
+                        'source': 'guide_store',
+                        'guide_version': guide['version'],
+                        'generated_at': guide['generated_at']
+                    }
+                }
+
+            # Upstream dependency graph for one turn:
+            #   geocode(location) -> place details
+            #                     -> nearby tourist attractions
+            #                     -> nearby lodging -> hotel details (x5)
+            # Both lookups below share these nodes through the request memo,
+            # so each resource is fetched exactly once.
+            with request_scope("TravelAgent.process"):
+                # Get place information
+                place_info = self.get_place_info(location)
+
+                # Get hotel information
+                hotel_info = self.get_hotel_booking_info(location)
 
             # Build prompt for Gemini
             prompt = f"""Based on the following information about {location}, provide travel recommendations:
@@ -374,7 +287,7 @@ Example response format:
             """
 
             # Generate response
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt)
             
             if not response or not hasattr(response, 'text'):
                 return {
@@ -437,21 +350,21 @@ Example response format:
     def _extract_location(self, text: str) -> Optional[str]:
         """Extract location name from text."""
         try:
-            # Check if text is a known city code
-            text_lower = text.lower().strip()
-            if text_lower in self.city_mappings:
-                return self.city_mappings[text_lower]
+            # Check if text is a known city name or code
+            city = lookup_city(text)
+            if city:
+                return city['name']
             
             # Use Gemini to extract location
             prompt = f"Extract the main location or city name from this text: {text}"
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt)
             
             if response and response.text:
                 location = response.text.strip()
-                # Check if extracted location is in our mappings
-                location_lower = location.lower()
-                if location_lower in self.city_mappings:
-                    return self.city_mappings[location_lower]
+                # Check if extracted location is in our city table
+                city = lookup_city(location)
+                if city:
+                    return city['name']
                 return location
                 
             return None
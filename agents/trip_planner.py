@@ -0,0 +1,376 @@
+import os
+import time
+import logging
+from datetime import date, datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from .airports import resolve_airport
+from .degraded import degraded_answers
+from .geocoding import lookup_city
+from .request_context import request_scope
+from .resilience import resilience
+from .upstream import serp_search
+from .usage import usage_scope
+from monitoring.tracing import in_current_context, span
+
+logger = logging.getLogger(__name__)
+
+# Whole-plan deadline; nodes still running then are reported as timed out
+TRIP_PLAN_TIMEOUT = float(os.getenv('TRIP_PLAN_TIMEOUT', 30))
+
+# Threads shared by all plans (a plan runs up to five nodes at once)
+TRIP_PLAN_WORKERS = int(os.getenv('TRIP_PLAN_WORKERS', 16))
+
+# Hotel nights when no return date is given
+TRIP_DEFAULT_NIGHTS = int(os.getenv('TRIP_DEFAULT_NIGHTS', 3))
+
+# Options kept per flight/hotel search
+TRIP_MAX_OPTIONS = 5
+
+_pool = ThreadPoolExecutor(max_workers=TRIP_PLAN_WORKERS, thread_name_prefix='trip-plan')
+
+
+class PlanNode:
+    """One step of a trip plan: run(results) once every dependency has succeeded."""
+
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Any], depends_on: Sequence[str] = (),
+                 agent: Optional[str] = None, bulkhead: Optional[str] = None):
+        self.name = name
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        # Token usage of the node is attributed to this agent
+        self.agent = agent or name
+        # Agent bulkhead the node holds a slot in while it runs, if any
+        self.bulkhead = bulkhead
+
+
+def run_graph(nodes: List[PlanNode], deadline: float, session_id: Optional[str] = None,
+              category: str = "plan") -> Iterator[Dict[str, Any]]:
+    """
+    Run a dependency graph of plan nodes, yielding one event per node as it finishes.
+
+    A node is submitted to the shared pool as soon as all of its
+    dependencies have succeeded, so independent branches overlap and the
+    plan takes about as long as its slowest path. A node whose dependency
+    failed or timed out is skipped. Nodes share the caller's request
+    memo and trace; each runs in a span of the given category.
+    """
+    by_name = {node.name: node for node in nodes}
+    results: Dict[str, Any] = {}
+    outcomes: Dict[str, str] = {}
+    running: Dict[Future, PlanNode] = {}
+    started: Dict[str, float] = {}
+    plan_start = time.perf_counter()
+
+    def event(node: PlanNode, status: str, data: Any = None, error: Optional[str] = None) -> Dict[str, Any]:
+        outcomes[node.name] = status
+        now = time.perf_counter()
+        entry = {
+            'event': 'node',
+            'node': node.name,
+            'status': status,
+            'elapsed_ms': round((now - plan_start) * 1000, 1),
+            'duration_ms': round((now - started[node.name]) * 1000, 1) if node.name in started else 0.0
+        }
+        if data is not None:
+            entry['data'] = data
+        if error:
+            entry['error'] = error
+        return entry
+
+    def call(node: PlanNode, snapshot: Dict[str, Any]) -> Any:
+        with usage_scope(session_id, node.agent), span(f"{node.name} node", category=category):
+            if node.bulkhead is None:
+                return node.run(snapshot)
+            with resilience.bulkhead(node.bulkhead).guard():
+                return node.run(snapshot)
+
+    while True:
+        # Submit or skip every node whose dependencies have all settled
+        for node in nodes:
+            if node.name in outcomes or node.name in started:
+                continue
+            settled = [outcomes.get(dep) for dep in node.depends_on]
+            if any(status is None for status in settled):
+                continue
+            if all(status == 'success' for status in settled):
+                started[node.name] = time.perf_counter()
+                running[_pool.submit(in_current_context(call), node, dict(results))] = node
+            else:
+                failed = [dep for dep in node.depends_on if outcomes[dep] != 'success']
+                yield event(node, 'skipped', error=f"Depends on {', '.join(failed)}")
+
+        if not running:
+            break
+        done, _ = wait(list(running), timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            for future, node in running.items():
+                future.cancel()
+                yield event(node, 'timeout', error="Plan deadline exceeded")
+            break
+
+        for future in done:
+            node = running.pop(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                logger.error(f"Trip plan node {node.name} failed: {str(e)}")
+                yield event(node, 'error', error=str(e))
+                continue
+            results[node.name] = value
+            status = value.get('status', 'success') if isinstance(value, dict) else 'success'
+            if status not in ('success', 'error'):
+                status = 'success'
+            entry = event(node, status, data=value)
+            # Error results are still handed to dependents (the cost estimate
+            # works with whatever prices arrived); only exceptions skip them
+            outcomes[node.name] = 'success'
+            yield entry
+
+    missing = [name for name in by_name if name not in outcomes]
+    for name in missing:
+        # Waiting on a node that ran out of time
+        yield event(by_name[name], 'skipped', error="Plan deadline exceeded")
+
+
+def _parse_date(value: Optional[str], field: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{field} must be a date in YYYY-MM-DD format")
+
+
+def _parse_budget(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _price(item: Dict[str, Any]) -> Optional[float]:
+    """Price of a SerpAPI flight or nightly hotel rate, if the item has one."""
+    for value in (item.get('price'), (item.get('rate_per_night') or {}).get('extracted_lowest'),
+                  item.get('extracted_price')):
+        if isinstance(value, (int, float)):
+            return float(value)
+    return None
+
+
+def _cheapest(items: List[Dict[str, Any]], limit: int = TRIP_MAX_OPTIONS) -> List[Dict[str, Any]]:
+    priced = sorted((item for item in items if _price(item) is not None), key=_price)
+    unpriced = [item for item in items if _price(item) is None]
+    return (priced + unpriced)[:limit]
+
+
+class TripPlanner:
+    """
+    Plans a whole trip from the /api/plan-trip form.
+
+    The plan is a small dependency graph: the destination and dates are
+    resolved first, then flights, hotels, weather, places and food run
+    concurrently, and the cost estimate waits for flights and hotels.
+    """
+
+    def __init__(self, agents: Dict[str, Any]):
+        self.agents = agents
+        self.serp_api_key = os.getenv('SERP_API_KEY')
+
+    def validate(self, data: Dict[str, Any]) -> Optional[str]:
+        """Error message for an unusable request, or None."""
+        for field in ('departure_city', 'arrival_city', 'departure_date'):
+            if not str(data.get(field) or '').strip():
+                return f"{field} is required"
+        try:
+            departure = _parse_date(data.get('departure_date'), 'departure_date')
+            return_date = _parse_date(data.get('return_date'), 'return_date')
+        except ValueError as e:
+            return str(e)
+        if return_date and return_date < departure:
+            return "return_date must not be before departure_date"
+        return None
+
+    def _nodes(self, data: Dict[str, Any]) -> List[PlanNode]:
+        return [
+            PlanNode('destination', lambda results: self._resolve_destination(data)),
+            PlanNode('flights', self._flights, ['destination'], agent='flight', bulkhead='flight'),
+            PlanNode('hotels', self._hotels, ['destination'], agent='hotel', bulkhead='hotel'),
+            PlanNode('weather', self._weather, ['destination'], agent='weather', bulkhead='weather'),
+            PlanNode('places', self._places, ['destination'], agent='place', bulkhead='place'),
+            PlanNode('food', self._food, ['destination'], agent='food', bulkhead='food'),
+            PlanNode('cost', self._estimate_cost, ['flights', 'hotels']),
+        ]
+
+    def run(self, data: Dict[str, Any], session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield an event per plan node as it finishes, then the whole plan.
+
+        The last event is {"event": "plan", "status": ..., "data": ...} in
+        the shape static/js/main.js reads.
+        """
+        start = time.perf_counter()
+        results: Dict[str, Any] = {}
+        timings: Dict[str, float] = {}
+        with request_scope("trip plan"):
+            for entry in run_graph(self._nodes(data), time.monotonic() + TRIP_PLAN_TIMEOUT, session_id):
+                timings[entry['node']] = entry['duration_ms']
+                if entry['status'] in ('success', 'error') and 'data' in entry:
+                    results[entry['node']] = entry['data']
+                yield entry
+
+        destination = results.get('destination')
+        if not destination:
+            yield {'event': 'plan', 'status': 'error', 'message': "Could not resolve the destination"}
+            return
+        cost = results.get('cost') or {}
+        yield {
+            'event': 'plan',
+            'status': 'success',
+            'data': {
+                'request': {
+                    'departure_city': data.get('departure_city'),
+                    'arrival_city': data.get('arrival_city'),
+                    'departure_date': data.get('departure_date'),
+                    'return_date': data.get('return_date'),
+                    'budget': data.get('budget')
+                },
+                'destination': destination,
+                'currency': destination['currency'],
+                'estimated_cost': cost.get('total', 0.0),
+                'cost_breakdown': cost.get('breakdown', {}),
+                'within_budget': cost.get('within_budget'),
+                'flights': results.get('flights'),
+                'hotels': results.get('hotels'),
+                'weather': results.get('weather'),
+                'places': results.get('places'),
+                'food': results.get('food')
+            },
+            'timings': timings,
+            'total_ms': round((time.perf_counter() - start) * 1000, 1)
+        }
+
+    def plan(self, data: Dict[str, Any], session_id: Optional[str] = None) -> Dict[str, Any]:
+        """The final plan without the per-node events."""
+        final = {'status': 'error', 'message': "Trip plan produced no result"}
+        for entry in self.run(data, session_id):
+            if entry['event'] == 'plan':
+                final = {key: value for key, value in entry.items() if key != 'event'}
+        return final
+
+    def _resolve_destination(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        departure = _parse_date(data.get('departure_date'), 'departure_date')
+        return_date = _parse_date(data.get('return_date'), 'return_date')
+        check_out = return_date or departure + timedelta(days=TRIP_DEFAULT_NIGHTS)
+        origin = lookup_city(data['departure_city'])
+        city = lookup_city(data['arrival_city'])
+        return {
+            'status': 'success',
+            'origin': origin['name'] if origin else data['departure_city'].strip(),
+            'city': city['name'] if city else data['arrival_city'].strip(),
+            'location': {'lat': city['lat'], 'lng': city['lng']} if city else None,
+            'departure_date': departure.isoformat(),
+            'return_date': return_date.isoformat() if return_date else None,
+            'check_out': check_out.isoformat(),
+            'nights': max((check_out - departure).days, 1),
+            'currency': (data.get('currency') or 'USD').upper(),
+            'budget': _parse_budget(data.get('budget'))
+        }
+
+    def _flights(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        # FlightAgent.search_flights wraps the search in three Gemini calls;
+        # the plan only needs the options and prices
+        trip = results['destination']
+        departure_id = resolve_airport(trip['origin'])
+        arrival_id = resolve_airport(trip['city'])
+        if not departure_id or not arrival_id:
+            unknown = trip['origin'] if not departure_id else trip['city']
+            return {'status': 'error', 'message': f"No airport found for {unknown}"}
+        params = {
+            'engine': 'google_flights',
+            'departure_id': departure_id,
+            'arrival_id': arrival_id,
+            'outbound_date': trip['departure_date'],
+            'type': '1' if trip['return_date'] else '2',
+            'currency': trip['currency'],
+            'hl': 'en',
+            'gl': 'us',
+            'api_key': self.serp_api_key
+        }
+        if trip['return_date']:
+            params['return_date'] = trip['return_date']
+        found = serp_search(params)
+        if 'error' in found:
+            return {'status': 'error', 'message': found['error']}
+        flights = (found.get('best_flights') or []) + (found.get('other_flights') or [])
+        flights = flights or found.get('flights_results') or []
+        if not flights:
+            return {'status': 'error', 'message': "No flights found"}
+        return {'status': 'success', 'options': _cheapest(flights), 'count': len(flights)}
+
+    def _hotels(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        trip = results['destination']
+        found = serp_search({
+            'engine': 'google_hotels',
+            'q': f"hotels in {trip['city']}",
+            'check_in_date': trip['departure_date'],
+            'check_out_date': trip['check_out'],
+            'currency': trip['currency'],
+            'hl': 'en',
+            'gl': 'us',
+            'api_key': self.serp_api_key
+        })
+        if 'error' in found:
+            return {'status': 'error', 'message': found['error']}
+        hotels = found.get('properties') or found.get('hotels_results') or []
+        if not hotels:
+            return {'status': 'error', 'message': "No hotels found"}
+        return {'status': 'success', 'options': _cheapest(hotels), 'count': len(hotels)}
+
+    def _ask_agent(self, agent_name: str, question: str, trip: Dict[str, Any]) -> Dict[str, Any]:
+        context = {'locations': [trip['city']], 'dates': [d for d in (trip['departure_date'], trip['return_date']) if d]}
+        response = degraded_answers.run(agent_name, question, lambda: self.agents[agent_name].process_with_context({
+            'user_input': question,
+            'context': context,
+            'entities': {'locations': [trip['city']], 'dates': context['dates'], 'keywords': []},
+            'history': []
+        }))
+        return {key: value for key, value in response.items()
+                if key in ('status', 'content', 'message', 'source', 'freshness')}
+
+    def _weather(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        trip = results['destination']
+        period = f"từ {trip['departure_date']} đến {trip['check_out']}"
+        return self._ask_agent('weather', f"Thời tiết ở {trip['city']} {period}", trip)
+
+    def _food(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        trip = results['destination']
+        return self._ask_agent('food', f"Món ăn đặc sản và nhà hàng ngon ở {trip['city']}", trip)
+
+    def _places(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        trip = results['destination']
+        found = self.agents['place'].search_places(trip['city'], "địa điểm tham quan nổi tiếng")
+        if found.get('status') != 'success':
+            return {'status': 'error', 'message': found.get('message', "No places found")}
+        return {'status': 'success', 'places': found.get('places', [])[:10], 'summary': found.get('summary'),
+                'source': found.get('source')}
+
+    def _estimate_cost(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        trip = results['destination']
+        breakdown = {}
+        flight_prices = [_price(item) for item in (results['flights'].get('options') or [])]
+        flight_prices = [price for price in flight_prices if price is not None]
+        if flight_prices:
+            # google_flights prices round trips as a whole when type=1
+            breakdown['flights'] = min(flight_prices)
+        hotel_prices = [_price(item) for item in (results['hotels'].get('options') or [])]
+        hotel_prices = [price for price in hotel_prices if price is not None]
+        if hotel_prices:
+            breakdown['hotel'] = min(hotel_prices) * trip['nights']
+        total = round(sum(breakdown.values()), 2)
+        return {
+            'status': 'success',
+            'total': total,
+            'breakdown': breakdown,
+            'within_budget': total <= trip['budget'] if trip['budget'] is not None and breakdown else None
+        }
@@ -0,0 +1,293 @@
+import os
+import re
+import json
+import time
+import logging
+import requests
+from functools import lru_cache
+from types import SimpleNamespace
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from monitoring.metrics import UPSTREAM_REQUESTS, UPSTREAM_LATENCY, UPSTREAM_RATE_LIMITED, UPSTREAM_IN_PROGRESS, LLM_BUDGET_DEGRADED
+from monitoring.tracing import span
+from .cassette import CassetteMissError, cassette
+from .resilience import quota, resilience
+from .request_context import canonical_key, memoize
+from .usage import BUDGET_FALLBACK_MODEL, BUDGET_MAX_OUTPUT_TOKENS, current_intent, record_response, session_over_budget
+
+logger = logging.getLogger(__name__)
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+try:
+    from serpapi.google_search import GoogleSearch
+except ImportError:
+    GoogleSearch = None
+
+# Base URLs, overridable to point at a stand-in such as fake_upstream.py
+MAPS_API_BASE_URL = os.getenv('MAPS_API_BASE_URL', 'https://maps.googleapis.com').rstrip('/')
+SERPAPI_BASE_URL = os.getenv('SERPAPI_BASE_URL', '').rstrip('/')
+GEMINI_API_BASE_URL = os.getenv('GEMINI_API_BASE_URL', '').rstrip('/')
+
+# Google Maps web services
+MAPS_API_URL = f"{MAPS_API_BASE_URL}/maps/api"
+
+# Maps requests had no timeout; a hung connection held the request thread forever
+MAPS_TIMEOUT = float(os.getenv('MAPS_TIMEOUT', 10))
+
+# Failures SerpAPI and Maps return in the body instead of raising; "no results" is not one
+SERPAPI_NO_RESULTS = re.compile(r"hasn't returned any results|no results", re.IGNORECASE)
+MAPS_ERROR_STATUSES = ('OVER_QUERY_LIMIT', 'REQUEST_DENIED', 'UNKNOWN_ERROR')
+
+# Open-Meteo daily forecasts; no API key needed
+FORECAST_API_BASE_URL = os.getenv('FORECAST_API_BASE_URL', 'https://api.open-meteo.com').rstrip('/')
+FORECAST_TIMEOUT = float(os.getenv('FORECAST_TIMEOUT', 5))
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """True for HTTP 429 / quota-exhausted errors from any upstream client."""
+    if getattr(error, 'code', None) == 429:
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    message = str(error).lower()
+    return '429' in message and ('quota' in message or 'rate' in message or 'resource' in message)
+
+
+def retry_delay(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait before retrying a 429, if it said."""
+    for detail in getattr(error, 'details', None) or ():
+        if isinstance(detail, dict):
+            # REST transport: {"@type": ".../google.rpc.RetryInfo", "retryDelay": "7s"}
+            delay = detail.get('retryDelay')
+            if isinstance(delay, str) and delay.endswith('s'):
+                return float(delay[:-1])
+        else:
+            delay = getattr(detail, 'retry_delay', None)
+            if delay is not None and hasattr(delay, 'seconds'):
+                return delay.seconds + getattr(delay, 'nanos', 0) / 1e9
+    # gRPC errors render RetryInfo as text: retry_delay { seconds: 7 }
+    match = re.search(r"retry_?delay\W+(?:seconds:\s*)?(\d+(?:\.\d+)?)", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
+
+
+@contextmanager
+def observe_upstream(service: str, target: str) -> Iterator[SimpleNamespace]:
+    """
+    Count, time and trace one upstream call; 429s are counted separately.
+
+    Set .outcome on the yielded object for calls that returned an error
+    instead of raising one.
+    """
+    UPSTREAM_IN_PROGRESS.inc(service=service)
+    start = time.perf_counter()
+    observation = SimpleNamespace(outcome='ok')
+    try:
+        with span(f"{service} {target}", category=service):
+            yield observation
+    except Exception as e:
+        if is_rate_limited(e):
+            observation.outcome = 'rate_limited'
+            UPSTREAM_RATE_LIMITED.inc(service=service, target=target)
+        else:
+            observation.outcome = 'error'
+        raise
+    finally:
+        UPSTREAM_IN_PROGRESS.dec(service=service)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, service=service, target=target)
+        UPSTREAM_REQUESTS.inc(service=service, target=target, outcome=observation.outcome)
+
+
+# Called as listener(service, target, request, response) after each successful call
+_response_listeners: List[Callable[[str, str, Dict[str, Any], Any], None]] = []
+
+
+def add_response_listener(listener: Callable[[str, str, Dict[str, Any], Any], None]):
+    """Have listener see every successful upstream response (e.g. to keep a local copy)."""
+    _response_listeners.append(listener)
+
+
+def _through_cassette(service: str, target: str, request: Dict[str, Any], live: Callable[[], Any]) -> Any:
+    """Make the live call, or record/replay it when UPSTREAM_CASSETTE is set."""
+    if cassette is None:
+        return live()
+    return cassette.call(service, target, request, live)
+
+
+def _call_upstream(service: str, target: str, request: Dict[str, Any], live: Callable[[], Any],
+                   is_error: Optional[Callable[[Any], bool]] = None) -> Any:
+    """
+    One upstream call behind its circuit breaker, observed and cassette-aware.
+
+    While the breaker of service/target is open this raises
+    CircuitOpenError at once, without touching the network. is_error
+    recognises failures a client returns rather than raises (SerpAPI's
+    {"error": ...}); they count against the breaker like exceptions.
+    """
+    breaker = resilience.breaker(service, target)
+    breaker.before_call()
+    start = time.perf_counter()
+    failed = False
+    try:
+        with observe_upstream(service, target) as observation:
+            response = _through_cassette(service, target, request, live)
+            if is_error is not None and is_error(response):
+                failed = True
+                observation.outcome = 'error'
+    except CassetteMissError:
+        # A gap in the recording says nothing about the upstream's health
+        raise
+    except Exception as e:
+        failed = True
+        if service == "gemini":
+            limited = is_rate_limited(e)
+            quota.record(limited, retry_delay(e) if limited else None)
+        raise
+    finally:
+        breaker.record(failed, time.perf_counter() - start)
+
+    if service == "gemini":
+        quota.record(False)
+    for listener in _response_listeners:
+        try:
+            listener(service, target, request, response)
+        except Exception as e:
+            logger.error(f"Upstream response listener failed: {str(e)}")
+    return response
+
+
+def serp_error(response: Any) -> bool:
+    """
+    Whether a SerpAPI response is a failure of the service (quota, key, backend).
+
+    SerpAPI reports an empty result set as {"error": "Google hasn't returned
+    any results..."} with a successful search status; that is an answer,
+    not a failure.
+    """
+    if not isinstance(response, dict) or 'error' not in response:
+        return False
+    if (response.get('search_metadata') or {}).get('status') == 'Success':
+        return False
+    return not SERPAPI_NO_RESULTS.search(str(response['error']))
+
+
+def maps_error(response: Any) -> bool:
+    """Whether a Maps web service response is a quota, key or server error (ZERO_RESULTS is not)."""
+    return isinstance(response, dict) and response.get('status') in MAPS_ERROR_STATUSES
+
+
+def upstream_available(service: str, target: str) -> bool:
+    """False while service/target's breaker is open, so callers can go straight to a local fallback."""
+    return resilience.available(service, target)
+
+
+def model_available(model) -> bool:
+    """upstream_available() for a Gemini GenerativeModel."""
+    return upstream_available("gemini", _model_name(model))
+
+
+def _model_name(model) -> str:
+    return getattr(model, 'model_name', 'gemini').replace('models/', '')
+
+
+def maps_get(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Call a Google Maps web service endpoint (e.g. "geocode/json").
+
+    Calls are memoized in the current request context, so repeating the same
+    request within one chat turn does not hit the network again.
+    """
+    url = f"{MAPS_API_URL}/{endpoint}"
+
+    def get() -> Dict[str, Any]:
+        response = requests.get(url, params=params, timeout=MAPS_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch() -> Dict[str, Any]:
+        return _call_upstream("maps", endpoint, params, get, maps_error)
+
+    return memoize(canonical_key(f"maps/{endpoint}", params), fetch)
+
+
+def forecast_get(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Call the Open-Meteo forecast API (/v1/forecast), memoized per request like maps_get()."""
+    url = f"{FORECAST_API_BASE_URL}/v1/forecast"
+
+    def get() -> Dict[str, Any]:
+        response = requests.get(url, params=params, timeout=FORECAST_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch() -> Dict[str, Any]:
+        return _call_upstream("forecast", "open_meteo", params, get)
+
+    return memoize(canonical_key("forecast/open_meteo", params), fetch)
+
+
+def serp_search(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a SerpAPI search (GoogleSearch(params).get_dict())."""
+    def search() -> Dict[str, Any]:
+        if GoogleSearch is None:
+            raise RuntimeError("Google Search Results is not installed. Please run: pip install google-search-results")
+        client = GoogleSearch(params)
+        if SERPAPI_BASE_URL:
+            client.BACKEND = SERPAPI_BASE_URL
+        return client.get_dict()
+
+    return _call_upstream("serpapi", params.get("engine", "google"), params, search, serp_error)
+
+
+def configure_gemini(api_key: str):
+    """genai.configure(), sent to GEMINI_API_BASE_URL over REST when that is set."""
+    if GEMINI_API_BASE_URL:
+        genai.configure(api_key=api_key, transport='rest',
+                        client_options={'api_endpoint': GEMINI_API_BASE_URL})
+    else:
+        genai.configure(api_key=api_key)
+
+
+def list_models() -> List[Any]:
+    """genai.list_models(); only names are kept when recorded to a cassette."""
+    if cassette is None:
+        return list(genai.list_models())
+    names = cassette.call("gemini", "models", {}, lambda: [model.name for model in genai.list_models()])
+    return [SimpleNamespace(name=name) for name in names]
+
+
+@lru_cache(maxsize=None)
+def _budget_model():
+    return genai.GenerativeModel(BUDGET_FALLBACK_MODEL) if genai is not None else None
+
+
+def generate_content(model, prompt, **kwargs):
+    """
+    Call model.generate_content(prompt) on a Gemini GenerativeModel.
+
+    Token usage is recorded against the current session and agent. Once a
+    session is over its soft budget, the call goes to the cheaper fallback
+    model with a capped output length instead.
+    """
+    # Fails fast while degraded mode is on, except in probe turns
+    quota.admit_call()
+
+    # The enclosing agent method, captured before the upstream span opens
+    intent = current_intent()
+    if session_over_budget():
+        LLM_BUDGET_DEGRADED.inc()
+        model = _budget_model() or model
+        config = kwargs.get('generation_config')
+        if config is None or isinstance(config, dict):
+            # The cap wins over whatever output length the agent asked for
+            kwargs['generation_config'] = {**(config or {}), 'max_output_tokens': BUDGET_MAX_OUTPUT_TOKENS}
+
+    model_name = _model_name(model)
+    request = {'prompt': prompt if isinstance(prompt, str) else str(prompt),
+               **{name: json.dumps(value, sort_keys=True, default=str) for name, value in kwargs.items()}}
+    response = _call_upstream("gemini", model_name, request, lambda: model.generate_content(prompt, **kwargs))
+    record_response(model_name, prompt, response, intent)
+    return response
@@ -0,0 +1,184 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+from monitoring.metrics import LLM_TOKENS
+from monitoring.tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Soft per-session budget; past it, agents switch to cheaper paths
+SESSION_TOKEN_BUDGET = int(os.getenv('SESSION_TOKEN_BUDGET', 40000))
+BUDGET_FALLBACK_MODEL = os.getenv('BUDGET_FALLBACK_MODEL', 'gemini-2.0-flash-lite')
+BUDGET_MAX_OUTPUT_TOKENS = int(os.getenv('BUDGET_MAX_OUTPUT_TOKENS', 512))
+
+# Sessions kept in memory for the report (least recently active dropped first)
+MAX_TRACKED_SESSIONS = int(os.getenv('MAX_TRACKED_SESSIONS', 10000))
+
+_usage_scope: contextvars.ContextVar = contextvars.ContextVar('usage_scope', default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline token estimate for when a response carries no usage_metadata.
+
+    Gemini averages about four bytes of UTF-8 per token; counting bytes
+    rather than characters accounts for Vietnamese diacritics costing more.
+    """
+    if not text:
+        return 0
+    return max(1, round(len(text.encode('utf-8')) / 4))
+
+
+def _prompt_text(prompt: Any) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, (list, tuple)):
+        return '\n'.join(_prompt_text(part) for part in prompt)
+    return str(prompt)
+
+
+def _response_text(response: Any) -> str:
+    try:
+        return response.text or ''
+    except Exception:
+        # .text raises when the candidate was blocked or has no text part
+        return ''
+
+
+def count_tokens(prompt: Any, response: Any) -> Tuple[int, int, bool]:
+    """Return (prompt_tokens, output_tokens, estimated) for one generate_content call."""
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) if usage else None
+    output_tokens = getattr(usage, 'candidates_token_count', None) if usage else None
+    if prompt_tokens is not None and output_tokens is not None:
+        return int(prompt_tokens), int(output_tokens), False
+    return estimate_tokens(_prompt_text(prompt)), estimate_tokens(_response_text(response)), True
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'estimated_calls': 0}
+
+
+def _add(totals: Dict[str, Any], prompt_tokens: int, output_tokens: int, estimated: bool):
+    totals['calls'] += 1
+    totals['prompt_tokens'] += prompt_tokens
+    totals['output_tokens'] += output_tokens
+    totals['estimated_calls'] += int(estimated)
+
+
+class UsageTracker:
+    """
+    Token usage aggregated overall and per session, agent, intent and model.
+
+    The intent of a call is the agent operation that issued it (the
+    enclosing trace span, e.g. FlightAgent.search_flights).
+    """
+
+    def __init__(self, budget: int = SESSION_TOKEN_BUDGET, max_sessions: int = MAX_TRACKED_SESSIONS):
+        self.budget = budget
+        self.max_sessions = max_sessions
+        self.started_at = time.time()
+        self._totals = _empty_totals()
+        self._by_agent: Dict[str, Dict[str, Any]] = {}
+        self._by_intent: Dict[str, Dict[str, Any]] = {}
+        self._by_model: Dict[str, Dict[str, Any]] = {}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, model: str, prompt_tokens: int, output_tokens: int, estimated: bool,
+               session_id: Optional[str] = None, agent: Optional[str] = None, intent: Optional[str] = None):
+        agent = agent or 'unknown'
+        intent = intent or 'unknown'
+        with self._lock:
+            _add(self._totals, prompt_tokens, output_tokens, estimated)
+            _add(self._by_agent.setdefault(agent, _empty_totals()), prompt_tokens, output_tokens, estimated)
+            _add(self._by_intent.setdefault(intent, _empty_totals()), prompt_tokens, output_tokens, estimated)
+            _add(self._by_model.setdefault(model, _empty_totals()), prompt_tokens, output_tokens, estimated)
+            if session_id:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    session = self._sessions[session_id] = _empty_totals()
+                    while len(self._sessions) > self.max_sessions:
+                        self._sessions.popitem(last=False)
+                self._sessions.move_to_end(session_id)
+                _add(session, prompt_tokens, output_tokens, estimated)
+                session['last_agent'] = agent
+                session['last_seen'] = time.time()
+
+        source = 'estimated' if estimated else 'reported'
+        LLM_TOKENS.inc(prompt_tokens, agent=agent, intent=intent, kind='prompt', source=source)
+        LLM_TOKENS.inc(output_tokens, agent=agent, intent=intent, kind='output', source=source)
+
+    def session_tokens(self, session_id: str) -> int:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session['prompt_tokens'] + session['output_tokens'] if session else 0
+
+    def over_budget(self, session_id: Optional[str]) -> bool:
+        return bool(session_id) and self.budget > 0 and self.session_tokens(session_id) >= self.budget
+
+    def report(self, top_sessions: int = 20) -> Dict[str, Any]:
+        with self._lock:
+            sessions = sorted(
+                self._sessions.items(),
+                key=lambda item: item[1]['prompt_tokens'] + item[1]['output_tokens'],
+                reverse=True
+            )[:top_sessions]
+            return {
+                'since': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+                'session_budget': self.budget,
+                'totals': dict(self._totals),
+                'by_agent': {name: dict(totals) for name, totals in self._by_agent.items()},
+                'by_intent': {name: dict(totals) for name, totals in self._by_intent.items()},
+                'by_model': {name: dict(totals) for name, totals in self._by_model.items()},
+                'tracked_sessions': len(self._sessions),
+                'over_budget_sessions': sum(
+                    1 for totals in self._sessions.values()
+                    if self.budget > 0 and totals['prompt_tokens'] + totals['output_tokens'] >= self.budget
+                ),
+                'top_sessions': [{'session_id': session_id, **totals} for session_id, totals in sessions]
+            }
+
+
+usage_tracker = UsageTracker()
+
+
+@contextmanager
+def usage_scope(session_id: Optional[str], agent: str) -> Iterator[None]:
+    """Attribute every Gemini call made inside to this session and agent."""
+    token = _usage_scope.set((session_id, agent))
+    try:
+        yield
+    finally:
+        _usage_scope.reset(token)
+
+
+def current_scope() -> Tuple[Optional[str], Optional[str]]:
+    """Return (session_id, agent) of the running turn, or (None, None)."""
+    return _usage_scope.get() or (None, None)
+
+
+def current_intent() -> Optional[str]:
+    span = current_span()
+    return span.name if span is not None else None
+
+
+def record_response(model: str, prompt: Any, response: Any, intent: Optional[str] = None):
+    """Account one generate_content response to the current scope."""
+    prompt_tokens, output_tokens, estimated = count_tokens(prompt, response)
+    session_id, agent = current_scope()
+    usage_tracker.record(
+        model, prompt_tokens, output_tokens, estimated,
+        session_id=session_id, agent=agent, intent=intent or current_intent()
+    )
+
+
+def session_over_budget() -> bool:
+    """True when the running turn's session has used up its soft budget."""
+    session_id, _ = current_scope()
+    return usage_tracker.over_budget(session_id)
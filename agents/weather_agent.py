@@ -1,4 +1,10 @@
 from .base_agent import BaseAgent
+from .upstream import generate_content, configure_gemini, retry_delay, list_models
+from .resilience import CircuitOpenError, QuotaExhaustedError, quota
+from .geocoding import find_city_in_text, lookup_city
+from .climate import parse_period, is_near_term, climate_answer
+from .forecast import forecasts, format_forecast_answer
+from .history_index import prompt_history
 import os
 import google.generativeai as genai
 import time
@@ -6,8 +12,6 @@ import re
 import logging
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class WeatherAgent(BaseAgent):
@@ -29,24 +33,24 @@ Use emojis to make responses more engaging and informative.
             if not api_key:
                 raise ValueError("GEMINI_API_KEY not found in environment variables")
                 
-            genai.configure(api_key=api_key)
+            configure_gemini(api_key)
             
             # List available models
-            models = genai.list_models()
-            print("Available models:", [model.name for model in models])
+            models = list_models()
+            logger.debug(f"Available models: {[model.name for model in models]}")
             
             # Try to get the specific model
             try:
                 self.model = genai.GenerativeModel('gemini-2.0-flash')
-                print("Successfully initialized gemini-2.0-flash")
+                logger.info("Successfully initialized gemini-2.0-flash")
             except Exception as model_error:
-                print(f"Error initializing gemini-2.0-flash: {str(model_error)}")
+                logger.warning(f"Error initializing gemini-2.0-flash: {str(model_error)}")
                 # Fallback to gemini-pro
-                print("Falling back to gemini-pro")
+                logger.warning("Falling back to gemini-pro")
                 self.model = genai.GenerativeModel('gemini-pro')
                 
         except Exception as e:
-            print(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing Gemini: {str(e)}")
             self.model = None
 
     def process(self, input_data, conversation_history=None):
@@ -78,39 +82,39 @@ Use emojis to make responses more engaging and informative.
             }
     
     def _extract_location(self, text):
-        """Extract location from input text"""
-        # TODO: Implement location extraction logic
-        return "Hồ Chí Minh"  # Default for now
+        """The city the question is about (Ho Chi Minh City when it names none)"""
+        return find_city_in_text(text) or lookup_city("Ho Chi Minh City")
     
     def _extract_time_period(self, text):
-        """Extract time period from input text"""
-        # TODO: Implement time period extraction logic
-        return "tuần này"  # Default for now
+        """The period the question is about, see climate.parse_period"""
+        return parse_period(text)
     
     def _generate_response(self, location, time_period):
-        """Generate weather information"""
-        # TODO: Implement weather information logic
-        return f"""Dự báo thời tiết {location} {time_period}:
+        """Weather information for a city and period from the forecast or climate normals"""
+        answer = self._local_answer(location, time_period)
+        if answer:
+            return answer[0]
+        return (f"Xin lỗi, mình chưa có số liệu thời tiết cho {location.get('name_vi', location['name'])} "
+                f"{time_period['label']}. 😊")
 
-🌡️ Nhiệt độ:
-- Cao nhất: 32°C
-- Thấp nhất: 25°C
-- Trung bình: 28°C
-
-🌧️ Lượng mưa:
-- Khả năng mưa: 60%
-- Lượng mưa dự kiến: 20-30mm
-
-🌬️ Gió:
-- Tốc độ: 10-15 km/h
-- Hướng: Đông Nam
-
-💡 Lời khuyên:
-- Mang theo ô khi ra ngoài
-- Mặc quần áo thoáng mát
-- Uống đủ nước
+    def _local_answer(self, city, period):
+        """
+        (answer, source) for a known city without asking the model, or None.
 
-Lưu ý: Thông tin thời tiết có thể thay đổi. Bạn nên cập nhật thường xuyên. 😊"""
+        Near-term questions get the live forecast; seasonal ones, and
+        near-term ones while the forecast is unavailable, get the month's
+        climate normals.
+        """
+        display = city.get('name_vi', city['name'])
+        note = None
+        if is_near_term(period):
+            days = forecasts.daily(city, period['start'], period['end'])
+            if days:
+                return format_forecast_answer(display, period['label'], days), "forecast"
+            if forecasts.enabled:
+                note = "⚠️ Chưa lấy được dự báo mới nhất, dưới đây là mức trung bình của tháng."
+        answer = climate_answer("", city['name'], display, period=period, note=note)
+        return (answer, "climate_normals") if answer else None
 
     def process_with_context(self, input_data: dict) -> dict:
         """
@@ -128,6 +132,22 @@ Lưu ý: Thông tin thời tiết có thể thay đổi. Bạn nên cập nhật
             entities = input_data.get('entities', {})
             history = input_data.get('history', [])
             
+            # Questions about a known city are answered from the forecast or
+            # climate normals; the model only sees the rest
+            city = find_city_in_text(user_input)
+            if not city and context.get('locations'):
+                city = find_city_in_text(" ".join(context['locations']))
+            if city:
+                # A date said earlier in the conversation applies when this message names none
+                period = parse_period(user_input, default=False) or parse_period(" ".join(context.get('dates') or []))
+                local = self._local_answer(city, period)
+                if local:
+                    return {
+                        "status": "success",
+                        "content": local[0],
+                        "source": local[1]
+                    }
+            
             # Build enhanced prompt with context
             enhanced_prompt = f"{self.system_prompt}\n\n"
             
@@ -144,7 +164,7 @@ Lưu ý: Thông tin thời tiết có thể thay đổi. Bạn nên cập nhật
             # Add conversation history for context
             if history and len(history) > 0:
                 enhanced_prompt += "\nRecent conversation:\n"
-                recent_history = history[-5:] if len(history) >= 5 else history
+                recent_history = prompt_history(history)
                 for message in recent_history:
                     role = message.get('role', 'unknown')
                     content = message.get('content', '')
@@ -159,7 +179,7 @@ Lưu ý: Thông tin thời tiết có thể thay đổi. Bạn nên cập nhật
             
             for attempt in range(max_retries):
                 try:
-                    response = self.model.generate_content(enhanced_prompt)
+                    response = generate_content(self.model, enhanced_prompt)
                     
                     if not response or not hasattr(response, 'text'):
                         raise ValueError("Empty or invalid response from model")
@@ -169,20 +189,31 @@ Lưu ý: Thông tin thời tiết có thể thay đổi. Bạn nên cập nhật
                         "content": response.text
                     }
                     
+                except (CircuitOpenError, QuotaExhaustedError) as e:
+                    # Refused without a call; retrying now would only be refused again
+                    logger.warning(str(e))
+                    return {
+                        "status": "error",
+                        "message": str(e)
+                    }
                 except Exception as e:
                     error_str = str(e)
                     if "429" in error_str and "quota" in error_str.lower():
-                        retry_match = re.search(r'retry_delay\s*{\s*seconds:\s*(\d+)', error_str)
-                        if retry_match:
-                            delay = int(retry_match.group(1))
-                        else:
+                        if quota.active:
+                            # Degraded mode answers from the local store instead of waiting
+                            return {
+                                "status": "error",
+                                "message": f"Quota exceeded: {error_str}"
+                            }
+                        delay = retry_delay(e)
+                        if delay is None:
                             delay = base_delay * (2 ** attempt)
                         
-                        print(f"Quota exceeded, retrying in {delay} seconds...")
+                        logger.warning(f"Quota exceeded, retrying in {delay} seconds...")
                         time.sleep(delay)
                         continue
                     
-                    print(f"Error: {str(e)}")
+                    logger.error(f"Error: {str(e)}")
                     if attempt == max_retries - 1:
                         return {
                             "status": "error",
@@ -1,40 +1,70 @@
 import os
+import hmac
+import json
 import logging
 import uuid
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from functools import wraps
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash, make_response, send_from_directory, stream_with_context
 from dotenv import load_dotenv
-from agents.agent_manager import AgentManager
-from werkzeug.serving import WSGIRequestHandler
+from monitoring.logging_config import configure_logging
 
 # Load environment variables
 load_dotenv()
 
-# Enable logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Structured logging (LOG_LEVEL, LOG_FORMAT); set up before the agents log anything
+configure_logging()
+
+from agents.agent_manager import AgentManager  # noqa: E402
+from agents.trip_planner import TripPlanner  # noqa: E402
+from agents.usage import usage_tracker  # noqa: E402
+from agents.resilience import resilience  # noqa: E402
+import static_assets  # noqa: E402
+from page_cache import page_cache  # noqa: E402
+from monitoring import metrics, tracing  # noqa: E402
+from monitoring.profiling import profiler  # noqa: E402
+from werkzeug.serving import WSGIRequestHandler  # noqa: E402
 
 # Initialize agent manager
 agent_manager = AgentManager()
 
+# Trip plans run the same agent instances as a dependency graph
+trip_planner = TripPlanner(agent_manager.agents)
+
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", os.urandom(24).hex())
 
+# Request metrics, exposed at /metrics
+metrics.init_app(app)
+
+# Fingerprinted, precompressed assets from build_assets.py (if built)
+static_assets.init_app(app)
+
 # Configure WSGI server
 WSGIRequestHandler.protocol_version = "HTTP/1.1"
 
 # Store unlocked IPs in a set
 unlocked_ips = set()
 
+# Largest signed session cookie kept; browsers drop cookies over 4 KB
+SESSION_COOKIE_BYTES = int(os.getenv('SESSION_COOKIE_BYTES', 3800))
+
+# Characters of each message kept in the session history (answers run long)
+SESSION_MESSAGE_CHARS = int(os.getenv('SESSION_MESSAGE_CHARS', 600))
+
 @app.route("/", methods=["GET"])
+@page_cache.cached
 def home():
     """Render the home page."""
     return render_template("home.html")
 
 @app.route("/author", methods=["GET"])
+@page_cache.cached
 def author():
     """Render the author page."""
     return render_template("author.html")
 
 @app.route("/project-docs", methods=["GET"])
+@page_cache.cached
 def project_docs():
     """Render the project documentation page."""
     return render_template("project_docs.html")
@@ -63,7 +93,41 @@ def chatbot():
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
-    """Handle chat requests."""
+    """Handle chat requests, reporting where the time went in Server-Timing."""
+    with tracing.start_trace("POST /api/chat") as trace:
+        # Sampled cProfile/stack profile when enabled at /admin/profiling
+        with profiler.profile(trace):
+            response = make_response(_handle_chat())
+
+    response.headers["Server-Timing"] = trace.server_timing()
+    if app.debug and response.is_json:
+        # Full span breakdown for local debugging
+        payload = response.get_json()
+        payload["trace"] = trace.to_dict()
+        response.set_data(json.dumps(payload, ensure_ascii=False, default=str))
+    return response
+
+def _save_history(history):
+    """
+    Keep the conversation in the session cookie, within SESSION_COOKIE_BYTES.
+
+    Messages are cut to SESSION_MESSAGE_CHARS (a merged multi-intent
+    answer alone can pass 4 KB) and the oldest exchanges dropped until the
+    signed cookie fits; a cookie over the limit would be dropped by the
+    browser and the whole history with it.
+    """
+    history = [
+        {**message, "content": message["content"][:SESSION_MESSAGE_CHARS].rstrip() + "…"}
+        if len(message.get("content") or "") > SESSION_MESSAGE_CHARS else message
+        for message in history
+    ]
+    serializer = app.session_interface.get_signing_serializer(app)
+    session['conversation_history'] = history
+    while len(history) > 2 and len(serializer.dumps(dict(session))) > SESSION_COOKIE_BYTES:
+        history = history[2:]
+        session['conversation_history'] = history
+
+def _handle_chat():
     try:
         # Get message from request
         data = request.get_json()
@@ -93,20 +157,35 @@ def chat():
             
             # Add response to history
             conversation_history.append({"role": "assistant", "content": response.get("content", response.get("message", ""))})
-            session['conversation_history'] = conversation_history
+            _save_history(conversation_history)
             
             if response["status"] == "success":
-                return jsonify({
+                payload = {
                     "response": response.get("content", response.get("message", "")),
                     "agent": response.get("agent", "unknown"),
                     "status": "success"
-                })
+                }
+                if "sections" in response:
+                    # Multi-intent answers: agent, sub-query, status and timing per part
+                    payload["sections"] = response["sections"]
+                if "freshness" in response:
+                    # Degraded-mode answers: where the stored answer came from and how old it is
+                    payload["freshness"] = response["freshness"]
+                if "cached" in response:
+                    # Reused answer to an earlier, similar question
+                    payload["cached"] = response["cached"]
+                return jsonify(payload)
             else:
-                return jsonify({
+                payload = {
                     "error": response.get("message", "Unknown error"),
                     "agent": response.get("agent", "unknown"),
                     "status": "error"
-                }), 500
+                }
+                if "freshness" in response:
+                    # Degraded mode with nothing stored for the question: retry later
+                    payload["freshness"] = response["freshness"]
+                    return jsonify(payload), 503
+                return jsonify(payload), 500
                 
         except Exception as e:
             logging.error(f"Error processing message: {str(e)}")
@@ -124,18 +203,97 @@ def chat():
             "agent": "system"
         }), 500
 
+@app.route("/api/plan-trip", methods=["POST"])
+def plan_trip():
+    """
+    Plan a trip from the travel form.
+
+    With "Accept: application/x-ndjson" every plan node (flights, hotels,
+    weather, places, food, cost) is streamed as a JSON line when it
+    finishes, followed by the whole plan; otherwise only the plan is returned.
+    """
+    data = request.get_json(silent=True) or {}
+    error = trip_planner.validate(data)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
+    session_id = session.get('session_id')
+
+    if request.accept_mimetypes.best == "application/x-ndjson":
+        def events():
+            with tracing.start_trace("POST /api/plan-trip"):
+                for event in trip_planner.run(data, session_id):
+                    yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+
+    with tracing.start_trace("POST /api/plan-trip") as trace:
+        plan = trip_planner.plan(data, session_id)
+    response = make_response(jsonify(plan), 200 if plan["status"] == "success" else 502)
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
 @app.route('/project-idea')
+@page_cache.cached
 def project_idea():
     return render_template("project_idea.html")
 
 @app.route('/reference-docs')
+@page_cache.cached
 def reference_docs():
     return render_template("reference_docs.html")
 
+def admin_required(view):
+    """Allow only requests carrying ADMIN_TOKEN in X-Admin-Token; hidden when unset."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = os.getenv("ADMIN_TOKEN")
+        if not admin_token:
+            return jsonify({"error": "Not found"}), 404
+        if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), admin_token):
+            return jsonify({"error": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route("/admin/usage", methods=["GET"])
+@admin_required
+def admin_usage():
+    """Gemini token usage per agent, intent, model and top sessions."""
+    top = request.args.get("top", 20, type=int)
+    return jsonify(usage_tracker.report(top_sessions=top))
+
+@app.route("/admin/profiling", methods=["GET", "POST"])
+@admin_required
+def admin_profiling():
+    """Show or change request profiling: {"enabled": true, "sample_rate": 0.1}."""
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(enabled=data.get("enabled"), sample_rate=data.get("sample_rate"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(profiler.status())
+
+@app.route("/admin/profiling/<path:filename>", methods=["GET"])
+@admin_required
+def admin_profile_file(filename):
+    """Download a .pstats or .collapsed profile listed by /admin/profiling."""
+    if not filename.endswith((".pstats", ".collapsed")):
+        return jsonify({"error": "Not found"}), 404
+    return send_from_directory(profiler.directory, filename, as_attachment=True)
+
+@app.route("/admin/resilience", methods=["GET"])
+@admin_required
+def admin_resilience():
+    """Circuit breaker state per upstream target and bulkhead use per agent."""
+    return jsonify(resilience.status())
+
 @app.errorhandler(405)
 def method_not_allowed(e):
     return render_template("405.html"), 405
 
+# Render the informational pages once per deploy instead of per request
+if os.getenv("PRERENDER_PAGES", "1") == "1":
+    page_cache.prerender(app)
+
 if __name__ == "__main__":
     # Verify required environment variables
     required_vars = ["GEMINI_API_KEY"]
@@ -0,0 +1,468 @@
+"""
+End-to-end load benchmark for /api/chat: python bench_chat.py
+
+By default the app runs in-process against fake_upstream.py, so the whole
+pipeline (routing, agents, caches, upstream clients) is exercised on an
+isolated machine without API quota. Pass --target to drive a running
+server instead.
+
+Each simulated user is a chat session of --turns turns drawn from a
+weighted query mix (the flight/hotel/place/weather/food queries of
+test_multi_agent.py, with the cities varied, and --paraphrase-rate of
+them reworded). --concurrency sessions run at once. Reports throughput,
+p50/p95/p99 latency overall and per category, error rate, cache hit
+rates (with the semantic response cache's uplift over exact matching)
+and upstream calls (scraped from /metrics), and RSS.
+
+    python bench_chat.py --sessions 200 --concurrency 16 --output bench/HEAD.json
+    python bench_chat.py --compare bench/main.json --output bench/HEAD.json
+
+With --record the upstream calls of a run are saved to a cassette;
+--replay serves them back (latencies scaled by --latency-scale) so runs
+see byte-identical upstream responses.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import fake_upstream
+
+# From test_multi_agent.py; {city}, {origin} and {destination} are varied per turn
+QUERY_MIX = {
+    'flight': [
+        "Tìm chuyến bay từ {origin} đến {destination} ngày mai",
+        "Giá vé máy bay từ {origin} đến {destination} tháng 7",
+    ],
+    'hotel': [
+        "Khách sạn 5 sao ở {city} gần biển",
+        "Đặt phòng khách sạn ở {city} giá rẻ",
+    ],
+    'place': [
+        "Địa điểm du lịch nổi tiếng ở {city}",
+        "Nhà hàng ngon ở {city}",
+    ],
+    'weather': [
+        "Thời tiết ở {city} tuần này",
+        "Dự báo thời tiết {city} tháng 7",
+    ],
+    'food': [
+        "Món ăn đặc sản ở {city}",
+        "Quán ăn ngon ở {city}",
+    ],
+}
+
+# Other ways users ask the same things, mixed in with --paraphrase-rate
+PARAPHRASES = {
+    'flight': [
+        "Vé máy bay {origin} đi {destination} ngày mai giá bao nhiêu",
+        "Có chuyến bay nào từ {origin} đến {destination} ngày mai không",
+    ],
+    'hotel': [
+        "Khách sạn 5 sao gần biển ở {city}",
+        "Tìm khách sạn giá rẻ tại {city}",
+    ],
+    'place': [
+        "{city} có địa điểm du lịch nào nổi tiếng",
+        "Gợi ý nhà hàng ngon ở {city}",
+    ],
+    'weather': [
+        "Tuần này thời tiết {city} thế nào",
+        "Thời tiết {city} tháng 7 ra sao",
+    ],
+    'food': [
+        "{city} có món gì ngon",
+        "Ăn gì ở {city}",
+    ],
+}
+
+CITIES = ['Hà Nội', 'Đà Nẵng', 'Hồ Chí Minh', 'Sài Gòn', 'Huế', 'Hội An', 'Nha Trang', 'Đà Lạt', 'Phú Quốc']
+
+# Lower is better for all of these; used by --compare
+COMPARED_METRICS = [
+    ('latency_ms.p50', 'p50 latency (ms)'),
+    ('latency_ms.p95', 'p95 latency (ms)'),
+    ('latency_ms.p99', 'p99 latency (ms)'),
+    ('error_rate', 'error rate'),
+    ('rss_mb.peak', 'peak RSS (MB)'),
+    ('upstream_calls_per_request', 'upstream calls / request'),
+]
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    """Parse "flight=3,hotel=1" into category weights (default: equal)."""
+    if not text:
+        return {category: 1.0 for category in QUERY_MIX}
+    weights = {}
+    for part in text.split(','):
+        category, _, weight = part.partition('=')
+        category = category.strip()
+        if category not in QUERY_MIX:
+            raise ValueError(f"Unknown query category {category!r}; expected one of {', '.join(QUERY_MIX)}")
+        weights[category] = float(weight or 1)
+    return weights
+
+
+def make_query(rng: random.Random, weights: Dict[str, float], paraphrase_rate: float = 0.0) -> Tuple[str, str]:
+    category = rng.choices(list(weights), weights=list(weights.values()))[0]
+    origin, destination = rng.sample(CITIES, 2)
+    templates = PARAPHRASES if rng.random() < paraphrase_rate else QUERY_MIX
+    template = rng.choice(templates[category])
+    return category, template.format(city=rng.choice(CITIES), origin=origin, destination=destination)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    return {
+        'mean': round(sum(values) / len(values), 1) if values else 0.0,
+        'p50': round(percentile(values, 50), 1),
+        'p95': round(percentile(values, 95), 1),
+        'p99': round(percentile(values, 99), 1),
+        'max': round(values[-1], 1) if values else 0.0,
+    }
+
+
+_SAMPLE_LINE = re.compile(r'^(?P<name>[a-z_]+)\{(?P<labels>[^}]*)\} (?P<value>\S+)$')
+
+
+def parse_counters(text: str, name: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+    """Samples of one counter from Prometheus text, keyed by label pairs."""
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE_LINE.match(line)
+        if match and match.group('name') == name:
+            labels = tuple(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group('labels')))
+            samples[labels] = float(match.group('value'))
+    return samples
+
+
+def counter_delta(before: str, after: str, name: str) -> Dict[Tuple[Tuple[str, str], ...], float]:
+    start = parse_counters(before, name)
+    return {labels: value - start.get(labels, 0) for labels, value in parse_counters(after, name).items()
+            if value - start.get(labels, 0)}
+
+
+def cache_hit_rates(before: str, after: str) -> Dict[str, Dict[str, Any]]:
+    caches: Dict[str, Dict[str, Any]] = {}
+    for labels, count in counter_delta(before, after, 'cache_requests_total').items():
+        labels = dict(labels)
+        totals = caches.setdefault(labels['cache'], {'hits': 0, 'misses': 0})
+        totals['hits' if labels['result'] == 'hit' else 'misses'] += int(count)
+    for totals in caches.values():
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = round(totals['hits'] / lookups, 3) if lookups else 0.0
+    return dict(sorted(caches.items()))
+
+
+def upstream_calls(before: str, after: str) -> Dict[str, Dict[str, int]]:
+    calls: Dict[str, Dict[str, int]] = {}
+    for labels, count in counter_delta(before, after, 'upstream_requests_total').items():
+        labels = dict(labels)
+        service = calls.setdefault(labels['service'], {})
+        service[labels['outcome']] = service.get(labels['outcome'], 0) + int(count)
+    return dict(sorted(calls.items()))
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size of this process (Linux)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class InProcessClient:
+    """One chat session against the Flask app via its test client."""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def chat(self, message: str) -> Tuple[int, Dict[str, Any]]:
+        response = self._client.post('/api/chat', json={'message': message})
+        return response.status_code, response.get_json(silent=True) or {}
+
+
+class HttpClient:
+    """One chat session against a running server; cookies carry the session."""
+
+    def __init__(self, base_url: str, timeout: float):
+        import requests
+        self._session = requests.Session()
+        self._url = f"{base_url.rstrip('/')}/api/chat"
+        self._timeout = timeout
+
+    def chat(self, message: str) -> Tuple[int, Dict[str, Any]]:
+        response = self._session.post(self._url, json={'message': message}, timeout=self._timeout)
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, {}
+
+
+def run_sessions(new_client: Callable[[], Any], sessions: int, turns: int, concurrency: int,
+                 weights: Dict[str, float], seed: int,
+                 paraphrase_rate: float = 0.0) -> Tuple[List[Dict[str, Any]], float]:
+    """Run every session; returns one record per request and the wall time."""
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def run_session(index: int):
+        rng = random.Random(f"{seed}-{index}")
+        client = new_client()
+        for turn in range(turns):
+            category, message = make_query(rng, weights, paraphrase_rate)
+            start = time.perf_counter()
+            try:
+                status, body = client.chat(message)
+                error = None if status == 200 and body.get('status') == 'success' else (
+                    body.get('error') or f"HTTP {status}")
+            except Exception as e:
+                status, body, error = 0, {}, str(e)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                records.append({
+                    'category': category, 'turn': turn, 'status': status,
+                    'agent': body.get('agent'), 'latency_ms': elapsed_ms, 'error': error
+                })
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(run_session, i) for i in range(sessions)]:
+            future.result()
+    return records, time.perf_counter() - start
+
+
+def summarize(records: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    errors = [record for record in records if record['error']]
+    by_category = {}
+    for category in sorted({record['category'] for record in records}):
+        subset = [record for record in records if record['category'] == category]
+        by_category[category] = {
+            'requests': len(subset),
+            'error_rate': round(sum(1 for record in subset if record['error']) / len(subset), 4),
+            'latency_ms': latency_summary([record['latency_ms'] for record in subset]),
+            'agents': sorted({record['agent'] for record in subset if record['agent']}),
+        }
+    error_samples: Dict[str, int] = {}
+    for record in errors:
+        key = str(record['error'])[:120]
+        error_samples[key] = error_samples.get(key, 0) + 1
+    return {
+        'requests': len(records),
+        'wall_s': round(wall_s, 2),
+        'throughput_rps': round(len(records) / wall_s, 2) if wall_s else 0.0,
+        'error_rate': round(len(errors) / len(records), 4) if records else 0.0,
+        'latency_ms': latency_summary([record['latency_ms'] for record in records]),
+        'by_category': by_category,
+        'top_errors': dict(sorted(error_samples.items(), key=lambda item: -item[1])[:5]),
+    }
+
+
+def _lookup(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result.get('summary', {})
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table; return the metrics that regressed past threshold (%)."""
+    regressions = []
+    print(f"\n{'metric':<28}{'baseline':>12}{'current':>12}{'change':>10}")
+    rows = [('throughput_rps', 'throughput (req/s)', False)] + [(path, label, True) for path, label in COMPARED_METRICS]
+    for path, label, lower_is_better in rows:
+        old, new = _lookup(baseline, path), _lookup(current, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else (0.0 if new == old else float('inf'))
+        worse = change > threshold if lower_is_better else change < -threshold
+        flag = '  REGRESSION' if worse else ''
+        print(f"{label:<28}{old:>12.4g}{new:>12.4g}{change:>9.1f}%{flag}")
+        if worse:
+            regressions.append(label)
+    for cache, stats in current.get('summary', {}).get('caches', {}).items():
+        old = baseline.get('summary', {}).get('caches', {}).get(cache, {}).get('hit_rate')
+        if old is not None:
+            print(f"{'hit rate ' + cache:<28}{old:>12.3f}{stats['hit_rate']:>12.3f}"
+                  f"{(stats['hit_rate'] - old) * 100:>9.1f}pp")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]):
+    summary = result['summary']
+    latency = summary['latency_ms']
+    print(f"\n{summary['requests']} requests in {summary['wall_s']} s "
+          f"({summary['throughput_rps']} req/s), error rate {summary['error_rate']:.2%}")
+    print(f"latency ms: p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    for category, stats in summary['by_category'].items():
+        latency = stats['latency_ms']
+        print(f"  {category:<8} n={stats['requests']:<5} p50 {latency['p50']:>8}  p95 {latency['p95']:>8}  "
+              f"p99 {latency['p99']:>8}  errors {stats['error_rate']:.1%}")
+    if summary.get('caches'):
+        print("cache hit rates: " + ', '.join(
+            f"{cache} {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']})"
+            for cache, stats in summary['caches'].items()))
+    if 'semantic_cache_uplift' in summary:
+        print(f"semantic response cache: +{summary['semantic_cache_uplift'] * 100:.1f}pp hit rate over exact matching")
+    if summary.get('upstream'):
+        print("upstream calls: " + ', '.join(
+            f"{service} {sum(outcomes.values())}" for service, outcomes in summary['upstream'].items()))
+    if summary.get('cassette'):
+        cassette = summary['cassette']
+        print(f"cassette ({cassette['mode']}): {cassette['recorded']} recorded, "
+              f"{cassette['replayed']} replayed, {cassette['misses']} misses")
+    if summary.get('rss_mb'):
+        print(f"RSS MB: start {summary['rss_mb']['start']}  end {summary['rss_mb']['end']}  peak {summary['rss_mb']['peak']}")
+    for error, count in summary['top_errors'].items():
+        print(f"  error x{count}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for /api/chat")
+    parser.add_argument('--target', help="Base URL of a running server (default: in-process app with fake upstreams)")
+    parser.add_argument('--sessions', type=int, default=100, help="Chat sessions to simulate")
+    parser.add_argument('--turns', type=int, default=3, help="Turns per session")
+    parser.add_argument('--concurrency', type=int, default=8, help="Sessions running at once")
+    parser.add_argument('--mix', help="Category weights, e.g. flight=2,hotel=1,place=1,weather=1,food=1")
+    parser.add_argument('--paraphrase-rate', type=float, default=0.5,
+                        help="Share of turns asked with a paraphrased template (0 = original mix only)")
+    parser.add_argument('--warmup', type=int, default=5, help="Untimed sessions before the run")
+    parser.add_argument('--bench-seed', type=int, default=1, help="Seed for the query mix")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout with --target (s)")
+    parser.add_argument('--output', help="Write JSON results here")
+    parser.add_argument('--compare', help="Baseline JSON results to compare against")
+    parser.add_argument('--regression-threshold', type=float, default=10.0,
+                        help="Percent change that counts as a regression (exit status 1)")
+    parser.add_argument('--record', metavar='CASSETTE', help="Record every upstream call to this cassette (.jsonl.gz)")
+    parser.add_argument('--replay', metavar='CASSETTE', help="Replay upstream calls from a recorded cassette")
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help="Multiplier for replayed latencies (0 = answer instantly)")
+    parser.add_argument('--keep-caches', action='store_true',
+                        help="Reuse the persistent geocode cache instead of a fresh one per run")
+    fake_upstream.add_arguments(parser)
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+
+    server = None
+    if args.target:
+        import requests
+        new_client = lambda: HttpClient(args.target, args.timeout)  # noqa: E731
+        scrape = lambda: requests.get(f"{args.target.rstrip('/')}/metrics", timeout=10).text  # noqa: E731
+    else:
+        # The upstream base URLs, keys and cassette are read at import, so set them first
+        if args.replay:
+            os.environ.update(UPSTREAM_CASSETTE=args.replay, UPSTREAM_CASSETTE_MODE='replay',
+                              UPSTREAM_CASSETTE_LATENCY_SCALE=str(args.latency_scale))
+        else:
+            server = fake_upstream.start_in_thread(fake_upstream.config_from_args(args))
+            os.environ.update(server.client_env())
+            if args.record:
+                os.environ.update(UPSTREAM_CASSETTE=args.record, UPSTREAM_CASSETTE_MODE='record')
+        for key in ('GEMINI_API_KEY', 'SERP_API_KEY', 'GOOGLE_MAPS_API_KEY'):
+            os.environ[key] = 'offline-benchmark'
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        if not args.keep_caches:
+            os.environ['GEOCODE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'geocode.sqlite3')
+        import app as app_module
+        new_client = lambda: InProcessClient(app_module.app)  # noqa: E731
+        scrape = lambda: app_module.app.test_client().get('/metrics').get_data(as_text=True)  # noqa: E731
+
+    in_process = not args.target
+    rss_start = rss_mb() if in_process else None
+    if args.warmup:
+        run_sessions(new_client, args.warmup, args.turns, min(args.concurrency, args.warmup),
+                     weights, seed=-args.bench_seed, paraphrase_rate=args.paraphrase_rate)
+
+    metrics_before = scrape()
+    records, wall_s = run_sessions(new_client, args.sessions, args.turns, args.concurrency,
+                                   weights, args.bench_seed, args.paraphrase_rate)
+    metrics_after = scrape()
+
+    summary = summarize(records, wall_s)
+    summary['caches'] = cache_hit_rates(metrics_before, metrics_after)
+    exact, semantic = summary['caches'].get('response_exact'), summary['caches'].get('response_semantic')
+    if exact and semantic:
+        # Extra answers the semantic cache reuses over matching the exact question
+        summary['semantic_cache_uplift'] = round(semantic['hit_rate'] - exact['hit_rate'], 3)
+    summary['upstream'] = upstream_calls(metrics_before, metrics_after)
+    total_upstream = sum(sum(outcomes.values()) for outcomes in summary['upstream'].values())
+    summary['upstream_calls_per_request'] = round(total_upstream / len(records), 3) if records else 0.0
+    if in_process:
+        summary['rss_mb'] = {'start': rss_start, 'end': rss_mb(), 'peak': peak_rss_mb()}
+        from agents.cassette import cassette
+        if cassette is not None:
+            summary['cassette'] = cassette.stats()
+            cassette.close()
+    if server:
+        summary['fake_upstream'] = server.upstream.stats_report()
+        server.shutdown()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    result = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'mode': 'target' if args.target else 'in-process',
+            'config': config,
+        },
+        'summary': summary,
+    }
+    print_report(result)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('meta', {}).get('commit')})")
+        if compare(baseline, result, args.regression_threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Static asset build: python build_assets.py
+
+Produces static/dist/ for production:
+- css/tailwind.css: purged Tailwind build of the classes used in templates
+  (replaces the in-browser static/js/tailwind.min.js runtime)
+- WOFF2 subsets (Latin + Vietnamese) of the GoogleSans TTF fonts, added to
+  the @font-face rules ahead of the TTF fallback
+- every file copied under a content-hashed name, with manifest.json mapping
+  logical paths to fingerprinted ones
+- .gz and .br variants of compressible files
+
+Tailwind needs the standalone `tailwindcss` CLI (or TAILWIND_BIN, or npx);
+fonts need fontTools and brotli. Each step is skipped with a warning when
+its tool is missing, and the site keeps working from the unbuilt files.
+"""
+import os
+import re
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import posixpath
+import subprocess
+import tempfile
+from typing import Dict, Optional
+from static_assets import STATIC_DIR, DIST_DIR, TAILWIND_CSS
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(ROOT_DIR, 'templates')
+TAILWIND_RUNTIME = 'js/tailwind.min.js'
+
+# Same release line as the bundled browser runtime (@tailwindcss/browser 4.1)
+TAILWIND_NPX_PACKAGE = '@tailwindcss/cli@4.1'
+
+# Basic Latin, Latin-1 and the Vietnamese ranges Google Fonts uses
+FONT_UNICODES = (
+    'U+0000-00FF,U+0102-0103,U+0110-0111,U+0128-0129,U+0168-0169,U+01A0-01A1,'
+    'U+01AF-01B0,U+0300-0301,U+0303-0304,U+0308-0309,U+0323,U+0329,U+1EA0-1EF9,'
+    'U+2000-206F,U+20AB,U+20AC,U+2122'
+)
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.txt', '.html', '.webmanifest', '.ttf', '.ico'}
+
+HASH_LENGTH = 10
+
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_TTF_SRC = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\.ttf\1\s*\)\s*format\(\s*[\'"]truetype[\'"]\s*\)')
+
+
+def collect_sources() -> Dict[str, bytes]:
+    """Read every file under static/ (except previous builds) by logical path."""
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(STATIC_DIR):
+        if os.path.abspath(dirpath) == STATIC_DIR and 'dist' in dirnames:
+            dirnames.remove('dist')
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            logical = os.path.relpath(path, STATIC_DIR).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                sources[logical] = f.read()
+    return sources
+
+
+def _tailwind_command() -> Optional[list]:
+    if os.getenv('TAILWIND_BIN'):
+        return [os.getenv('TAILWIND_BIN')]
+    if shutil.which('tailwindcss'):
+        return ['tailwindcss']
+    if shutil.which('npx'):
+        return ['npx', '--yes', TAILWIND_NPX_PACKAGE]
+    return None
+
+
+def build_tailwind() -> Optional[bytes]:
+    """Compile the utilities used in templates and scripts, minified."""
+    command = _tailwind_command()
+    if not command:
+        logger.warning("Tailwind CLI not found; pages keep using the browser runtime")
+        return None
+
+    runtime_path = os.path.join(STATIC_DIR, TAILWIND_RUNTIME)
+    entry = (
+        '@import "tailwindcss" source(none);\n'
+        f'@source "{TEMPLATES_DIR}";\n'
+        f'@source "{os.path.join(STATIC_DIR, "js")}";\n'
+        f'@source not "{runtime_path}";\n'
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, 'input.css')
+        output_path = os.path.join(tmp, 'tailwind.css')
+        with open(input_path, 'w', encoding='utf-8') as f:
+            f.write(entry)
+        try:
+            subprocess.run(
+                command + ['-i', input_path, '-o', output_path, '--minify'],
+                cwd=ROOT_DIR, check=True, capture_output=True, timeout=300
+            )
+            with open(output_path, 'rb') as f:
+                css = f.read()
+        except (OSError, subprocess.SubprocessError) as e:
+            stderr = getattr(e, 'stderr', None) or b''
+            logger.warning(f"Tailwind build failed ({str(e)}): {stderr.decode(errors='replace')[-500:]}")
+            return None
+
+    logger.info(f"Tailwind: {len(css)} bytes of CSS (runtime was {os.path.getsize(runtime_path)} bytes)")
+    return css
+
+
+def build_woff2(ttf: bytes) -> Optional[bytes]:
+    """Subset a TTF to FONT_UNICODES and return it as WOFF2."""
+    try:
+        from io import BytesIO
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+        import brotli  # noqa: F401  (required by fontTools for WOFF2)
+    except ImportError:
+        return None
+
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['*']
+    options.name_IDs = ['*']
+    options.notdef_outline = True
+    font = TTFont(BytesIO(ttf))
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(FONT_UNICODES))
+    subsetter.subset(font)
+    out = BytesIO()
+    subset.save_font(font, out, options)
+    return out.getvalue()
+
+
+def add_woff2_sources(css: str, has_woff2) -> str:
+    """Put a WOFF2 source ahead of each TTF source that has a WOFF2 build."""
+    def replace(match):
+        quote, stem = match.group(1), match.group(2)
+        if not has_woff2(stem + '.woff2'):
+            return match.group(0)
+        return f'url({quote}{stem}.woff2{quote}) format("woff2"), {match.group(0)}'
+    return _TTF_SRC.sub(replace, css)
+
+
+def fingerprint(logical: str, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = posixpath.splitext(logical)
+    return f"{stem}.{digest}{ext}"
+
+
+def rewrite_css_urls(css: str, css_logical: str, mapping: Dict[str, str]) -> str:
+    """
+    Point relative url() references at the fingerprinted files.
+
+    Fingerprinting keeps files in their directory, so paths stay relative
+    to the stylesheet's own (logical) location.
+    """
+    base = posixpath.dirname(css_logical)
+
+    def replace(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if url.startswith(('data:', 'http:', 'https:', '//', '#', '/')):
+            return match.group(0)
+        split = re.search(r'[?#]', url)
+        path, suffix = (url[:split.start()], url[split.start():]) if split else (url, '')
+        target = posixpath.normpath(posixpath.join(base, path))
+        if target not in mapping:
+            return match.group(0)
+        relative = posixpath.relpath(mapping[target], base)
+        return f'url({quote}{relative}{suffix}{quote})'
+    return _CSS_URL.sub(replace, css)
+
+
+def compress_variants(content: bytes):
+    """Yield (suffix, bytes) for each precompressed variant worth keeping."""
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gz) < len(content):
+        yield '.gz', gz
+    try:
+        import brotli
+    except ImportError:
+        return
+    br = brotli.compress(content, quality=11)
+    if len(br) < len(content):
+        yield '.br', br
+
+
+def build(tailwind: bool = True, fonts: bool = True) -> Dict[str, str]:
+    """Run the full pipeline and return the manifest."""
+    sources = collect_sources()
+
+    if tailwind:
+        css = build_tailwind()
+        if css is not None:
+            sources[TAILWIND_CSS] = css
+
+    if fonts:
+        built = 0
+        for logical in sorted(sources):
+            if logical.endswith('.ttf'):
+                woff2 = build_woff2(sources[logical])
+                if woff2 is None:
+                    logger.warning("fontTools/brotli not installed; fonts stay TTF only")
+                    break
+                sources[logical[:-4] + '.woff2'] = woff2
+                built += 1
+        if built:
+            logger.info(f"Fonts: built {built} WOFF2 subsets")
+
+    # Non-CSS files first so stylesheets can reference their final names
+    mapping = {}
+    for logical in sorted(sources):
+        if not logical.endswith('.css'):
+            mapping[logical] = fingerprint(logical, sources[logical])
+
+    for logical in sorted(sources):
+        if not logical.endswith('.css'):
+            continue
+        css_dir = posixpath.dirname(logical)
+        text = sources[logical].decode('utf-8')
+        text = add_woff2_sources(
+            text, lambda url: posixpath.normpath(posixpath.join(css_dir, url)) in sources
+        )
+        # Hash after rewriting, so a changed font or image busts the CSS too
+        text = rewrite_css_urls(text, logical, mapping)
+        sources[logical] = text.encode('utf-8')
+        mapping[logical] = fingerprint(logical, sources[logical])
+
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    total = compressed = 0
+    for logical, hashed in mapping.items():
+        path = os.path.join(DIST_DIR, *hashed.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = sources[logical]
+        with open(path, 'wb') as f:
+            f.write(content)
+        total += 1
+        if posixpath.splitext(logical)[1] in COMPRESSIBLE_EXTENSIONS:
+            for suffix, data in compress_variants(content):
+                with open(path + suffix, 'wb') as f:
+                    f.write(data)
+                compressed += 1
+
+    manifest = {'format': 1, 'assets': {logical: f"dist/{hashed}" for logical, hashed in sorted(mapping.items())}}
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Wrote {total} fingerprinted assets and {compressed} precompressed variants to {DIST_DIR}")
+    return manifest['assets']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets")
+    parser.add_argument('--no-tailwind', action='store_true', help="Skip the Tailwind CSS build")
+    parser.add_argument('--no-fonts', action='store_true', help="Skip WOFF2 font subsetting")
+    args = parser.parse_args()
+
+    from monitoring.logging_config import configure_logging
+    configure_logging(fmt='text')
+    build(tailwind=not args.no_tailwind, fonts=not args.no_fonts)
+
+
+if __name__ == '__main__':
+    main()
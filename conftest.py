@@ -0,0 +1,21 @@
+"""
+pytest setup: the app's upstream clients talk to fake_upstream.py.
+
+The base URLs and keys are read when the agents are imported, so the
+stand-in is started and the environment set here, before any test module
+is collected. Set UPSTREAM_LIVE=1 to run against the real services with
+the keys from the environment or .env.
+"""
+import os
+import tempfile
+import fake_upstream
+
+if not os.getenv('UPSTREAM_LIVE'):
+    # No latency: the checks are about behaviour, bench_chat.py is about timing
+    fake_server = fake_upstream.start_in_thread(fake_upstream.FakeUpstreamConfig(
+        latency_ms={service: 0 for service in fake_upstream.SERVICES}, seed=0))
+    os.environ.update(fake_server.client_env())
+    for key in ('GEMINI_API_KEY', 'SERP_API_KEY', 'GOOGLE_MAPS_API_KEY'):
+        os.environ[key] = 'offline-test'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['GEOCODE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='test-'), 'geocode.sqlite3')
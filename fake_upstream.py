@@ -0,0 +1,665 @@
+"""
+Offline stand-in for Gemini, SerpAPI, Google Maps and Open-Meteo: python fake_upstream.py
+
+Serves canned but realistically shaped responses so the whole chat
+pipeline can be load-tested without network access or API quota:
+- Gemini REST (v1beta): models list/get, generateContent and
+  streamGenerateContent (JSON array or ?alt=sse), 429 RESOURCE_EXHAUSTED
+  with a RetryInfo retryDelay
+- SerpAPI /search: google_flights, google_hotels, google_maps and google
+- Maps web services: geocode, place nearbysearch, details, findplacefromtext
+  and textsearch
+- Open-Meteo /v1/forecast: daily forecasts
+
+Point the app at it (any non-empty API keys work):
+
+    GEMINI_API_BASE_URL=http://127.0.0.1:8765
+    SERPAPI_BASE_URL=http://127.0.0.1:8765
+    MAPS_API_BASE_URL=http://127.0.0.1:8765
+    FORECAST_API_BASE_URL=http://127.0.0.1:8765
+
+Latency, error and rate-limit rates can be set per service
+("gemini=800,serpapi=1500,maps=60", or one value for all); response size is
+set with --results, --text-chars and --item-bytes. GET /_stats returns
+request counts per service and outcome.
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from agents.text_utils import fold_text
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ('gemini', 'serpapi', 'maps', 'forecast')
+
+# Medians seen from an App Engine instance in asia-southeast1
+DEFAULT_LATENCY_MS = {'gemini': 1200, 'serpapi': 1800, 'maps': 80, 'forecast': 150}
+
+CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'agents', 'data', 'cities.json')
+
+MODELS = [
+    ('gemini-2.0-flash', 'Gemini 2.0 Flash', 1048576, 8192),
+    ('gemini-2.0-flash-lite', 'Gemini 2.0 Flash-Lite', 1048576, 8192),
+    ('gemini-1.5-flash', 'Gemini 1.5 Flash', 1048576, 8192),
+    ('gemini-pro', 'Gemini 1.0 Pro', 30720, 2048),
+]
+
+FILLER = [
+    "🌤️ Thời điểm lý tưởng để đi là từ tháng 2 đến tháng 4, khi trời khô ráo và mát mẻ.",
+    "🍜 Đừng bỏ lỡ các món đặc sản địa phương tại chợ đêm gần trung tâm thành phố.",
+    "✈️ Nên đặt vé sớm 3-4 tuần để có giá tốt, đặc biệt vào dịp lễ Tết.",
+    "🏨 Khu vực trung tâm thuận tiện đi lại, nhiều khách sạn 3-4 sao giá hợp lý.",
+    "📍 Các điểm tham quan nổi tiếng thường đông vào cuối tuần, hãy đi sớm buổi sáng.",
+    "💡 Mang theo áo mưa mỏng và kem chống nắng vì thời tiết có thể thay đổi nhanh.",
+]
+
+AIRLINES = [('Vietnam Airlines', 'VN'), ('VietJet Air', 'VJ'), ('Bamboo Airways', 'QH'), ('Vietravel Airlines', 'VU')]
+
+
+def parse_service_values(text: Optional[str], default: Dict[str, float]) -> Dict[str, float]:
+    """Parse "gemini=800,maps=50" (or a bare "800" for every service)."""
+    values = dict(default)
+    if not text:
+        return values
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '=' in part:
+            service, value = part.split('=', 1)
+            if service.strip() not in SERVICES:
+                raise ValueError(f"Unknown service {service!r}; expected one of {', '.join(SERVICES)}")
+            values[service.strip()] = float(value)
+        else:
+            values = {service: float(part) for service in SERVICES}
+    return values
+
+
+class FakeUpstreamConfig:
+    """Latency and fault injection settings; safe to change while serving."""
+
+    def __init__(self, latency_ms: Optional[Dict[str, float]] = None, jitter: float = 0.3,
+                 error_rate: Optional[Dict[str, float]] = None,
+                 rate_limit_rate: Optional[Dict[str, float]] = None,
+                 retry_delay: int = 7, results: int = 10, text_chars: int = 1200,
+                 item_bytes: int = 0, stream_chunks: int = 4, seed: Optional[int] = None):
+        self.latency_ms = dict(DEFAULT_LATENCY_MS if latency_ms is None else latency_ms)
+        self.jitter = jitter
+        self.error_rate = error_rate or {service: 0.0 for service in SERVICES}
+        self.rate_limit_rate = rate_limit_rate or {service: 0.0 for service in SERVICES}
+        self.retry_delay = retry_delay
+        self.results = results
+        self.text_chars = text_chars
+        self.item_bytes = item_bytes
+        self.stream_chunks = max(1, stream_chunks)
+        self.random = random.Random(seed)
+
+    def latency(self, service: str) -> float:
+        """Seconds to wait before answering, log-normally spread around the median."""
+        median = self.latency_ms.get(service, 0) / 1000
+        if median <= 0:
+            return 0.0
+        return median * self.random.lognormvariate(0, self.jitter) if self.jitter else median
+
+    def fault(self, service: str) -> Optional[str]:
+        """None, "rate_limited" or "error" for one request."""
+        roll = self.random.random()
+        rate_limited = self.rate_limit_rate.get(service, 0)
+        if roll < rate_limited:
+            return 'rate_limited'
+        if roll < rate_limited + self.error_rate.get(service, 0):
+            return 'error'
+        return None
+
+
+class _Cities:
+    """City coordinates from the bundled table, so geocodes look plausible."""
+
+    def __init__(self, path: str = CITIES_PATH):
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.cities = json.load(f)['cities']
+        except OSError:
+            self.cities = []
+        self.index = {}
+        for city in self.cities:
+            for name in [city['name'], city.get('name_vi', ''), city['query']] + city.get('aliases', []):
+                if name:
+                    self.index.setdefault(fold_text(name), city)
+
+    def find(self, text: str) -> Dict[str, Any]:
+        folded = fold_text(text or '')
+        if folded in self.index:
+            return self.index[folded]
+        for name, city in self.index.items():
+            if name and len(name) > 3 and name in folded:
+                return city
+        # Unknown place: a stable point somewhere in Vietnam
+        digest = int(hashlib.sha256(folded.encode('utf-8')).hexdigest()[:8], 16)
+        return {
+            'name': text or 'Unknown', 'query': f"{text}, Vietnam",
+            'lat': 10.0 + (digest % 1200) / 100, 'lng': 104.5 + (digest // 1200 % 400) / 100
+        }
+
+
+class FakeUpstream:
+    """Builds response bodies; the HTTP handler only routes and injects faults."""
+
+    def __init__(self, config: FakeUpstreamConfig):
+        self.config = config
+        self.cities = _Cities()
+        self.stats: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, service: str, outcome: str):
+        with self._lock:
+            self.stats[(service, outcome)] = self.stats.get((service, outcome), 0) + 1
+
+    def stats_report(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            report: Dict[str, Dict[str, int]] = {}
+            for (service, outcome), count in self.stats.items():
+                report.setdefault(service, {})[outcome] = count
+            return report
+
+    def _padding(self) -> List[str]:
+        size = self.config.item_bytes
+        return ['x' * min(size - offset, 200) for offset in range(0, size, 200)] if size > 0 else []
+
+    def _rng(self, *parts: Any) -> random.Random:
+        """Deterministic per request, so repeated queries get identical answers."""
+        return random.Random(hashlib.sha256('|'.join(map(str, parts)).encode('utf-8')).digest())
+
+    # Gemini
+
+    def gemini_models(self) -> Dict[str, Any]:
+        return {'models': [self.gemini_model(name) for name, *_ in MODELS]}
+
+    def gemini_model(self, name: str) -> Dict[str, Any]:
+        name = name.replace('models/', '')
+        display, input_limit, output_limit = next(
+            ((display, inp, out) for model, display, inp, out in MODELS if model == name),
+            (name, 1048576, 8192)
+        )
+        return {
+            'name': f"models/{name}",
+            'baseModelId': name,
+            'version': '001',
+            'displayName': display,
+            'description': f"Offline stand-in for {display}",
+            'inputTokenLimit': input_limit,
+            'outputTokenLimit': output_limit,
+            'supportedGenerationMethods': ['generateContent', 'countTokens'],
+            'temperature': 1.0,
+            'topP': 0.95,
+            'topK': 40
+        }
+
+    def gemini_text(self, prompt: str, max_output_tokens: Optional[int] = None) -> str:
+        lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+        topic = lines[-1][:120] if lines else ''
+        rng = self._rng('gemini', prompt)
+        chars = self.config.text_chars
+        if max_output_tokens:
+            chars = min(chars, max_output_tokens * 4)
+        parts = [f"[offline] {topic}"]
+        length = len(parts[0])
+        while length < chars:
+            sentence = rng.choice(FILLER)
+            parts.append(sentence)
+            length += len(sentence) + 1
+        return '\n'.join(parts)[:max(chars, 1)]
+
+    def gemini_response(self, text: str, prompt: str, finish: bool = True, usage: bool = True) -> Dict[str, Any]:
+        candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+        if finish:
+            candidate['finishReason'] = 'STOP'
+        if not usage:
+            return {'candidates': [candidate]}
+        prompt_tokens = max(1, round(len(prompt.encode('utf-8')) / 4))
+        output_tokens = max(1, round(len(text.encode('utf-8')) / 4))
+        return {
+            'candidates': [candidate],
+            'usageMetadata': {
+                'promptTokenCount': prompt_tokens,
+                'candidatesTokenCount': output_tokens,
+                'totalTokenCount': prompt_tokens + output_tokens
+            }
+        }
+
+    def gemini_error(self, fault: str) -> Tuple[int, Dict[str, Any]]:
+        if fault == 'rate_limited':
+            return 429, {'error': {
+                'code': 429,
+                'message': 'Resource has been exhausted (e.g. check quota).',
+                'status': 'RESOURCE_EXHAUSTED',
+                'details': [{
+                    '@type': 'type.googleapis.com/google.rpc.RetryInfo',
+                    'retryDelay': f"{self.config.retry_delay}s"
+                }]
+            }}
+        return 500, {'error': {'code': 500, 'message': 'An internal error has occurred.', 'status': 'INTERNAL'}}
+
+    # SerpAPI
+
+    def serpapi(self, params: Dict[str, str]) -> Dict[str, Any]:
+        engine = params.get('engine', 'google')
+        builder = {
+            'google_flights': self._flights,
+            'google_hotels': self._hotels,
+            'google_maps': self._maps_search,
+        }.get(engine, self._google)
+        result = builder(params)
+        result['search_metadata'] = {
+            'id': hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:24],
+            'status': 'Success',
+            'total_time_taken': round(self.config.latency_ms.get('serpapi', 0) / 1000, 2)
+        }
+        result['search_parameters'] = {key: value for key, value in params.items() if key != 'api_key'}
+        return result
+
+    def _flights(self, params: Dict[str, str]) -> Dict[str, Any]:
+        origin = params.get('departure_id', 'SGN')
+        destination = params.get('arrival_id', 'HAN')
+        date = params.get('outbound_date', time.strftime('%Y-%m-%d'))
+        rng = self._rng('flights', origin, destination, date)
+        flights = []
+        for i in range(self.config.results):
+            airline, code = rng.choice(AIRLINES)
+            departure = rng.randrange(5 * 60, 22 * 60, 5)
+            duration = rng.randrange(60, 140, 5)
+            arrival = departure + duration
+            flights.append({
+                'flights': [{
+                    'departure_airport': {'name': f"{origin} Airport", 'id': origin,
+                                          'time': f"{date} {departure // 60:02d}:{departure % 60:02d}"},
+                    'arrival_airport': {'name': f"{destination} Airport", 'id': destination,
+                                        'time': f"{date} {arrival // 60 % 24:02d}:{arrival % 60:02d}"},
+                    'duration': duration,
+                    'airplane': rng.choice(['Airbus A321', 'Airbus A320neo', 'Boeing 787']),
+                    'airline': airline,
+                    'travel_class': 'Economy',
+                    'flight_number': f"{code} {rng.randrange(100, 1999)}",
+                    'legroom': '29 in',
+                    'extensions': self._padding()
+                }],
+                'total_duration': duration,
+                'price': rng.randrange(45, 260) * (1 if params.get('currency', 'USD') == 'USD' else 25000),
+                'type': 'One way' if params.get('type') == '2' else 'Round trip'
+            })
+        best = flights[:3]
+        other = flights[3:]
+        # flights_results is the flat list FlightAgent reads
+        return {'best_flights': best, 'other_flights': other, 'flights_results': flights}
+
+    def _hotels(self, params: Dict[str, str]) -> Dict[str, Any]:
+        city = self.cities.find(params.get('q') or params.get('location', ''))
+        rng = self._rng('hotels', city['name'], params.get('check_in_date') or params.get('check_in'))
+        properties = []
+        for i in range(self.config.results):
+            stars = rng.randint(2, 5)
+            nightly = rng.randrange(15, 60) * stars
+            properties.append({
+                'type': 'hotel',
+                'name': f"{city['name']} {rng.choice(['Riverside', 'Central', 'Garden', 'Boutique', 'Grand'])} Hotel {i + 1}",
+                'description': rng.choice(FILLER),
+                'gps_coordinates': {'latitude': city['lat'] + rng.uniform(-0.03, 0.03),
+                                    'longitude': city['lng'] + rng.uniform(-0.03, 0.03)},
+                'check_in_time': '2:00 PM',
+                'check_out_time': '12:00 PM',
+                'rate_per_night': {'lowest': f"${nightly}", 'extracted_lowest': nightly},
+                'hotel_class': f"{stars}-star hotel",
+                'extracted_hotel_class': stars,
+                'overall_rating': round(rng.uniform(3.5, 4.9), 1),
+                'reviews': rng.randrange(40, 5000),
+                'amenities': rng.sample(['Free Wi-Fi', 'Pool', 'Breakfast', 'Air conditioning', 'Spa',
+                                         'Airport shuttle', 'Fitness centre', 'Restaurant'], 4),
+                'extensions': self._padding()
+            })
+        # hotels_results is the list HotelAgent reads
+        return {'properties': properties, 'hotels_results': properties}
+
+    def _maps_search(self, params: Dict[str, str]) -> Dict[str, Any]:
+        query = params.get('q', '')
+        return {'local_results': [
+            {'position': i + 1, 'title': place['name'], 'place_id': place['place_id'],
+             'gps_coordinates': {'latitude': place['geometry']['location']['lat'],
+                                 'longitude': place['geometry']['location']['lng']},
+             'rating': place['rating'], 'reviews': place['user_ratings_total'],
+             'address': place['vicinity'], 'type': place['types'][0]}
+            for i, place in enumerate(self._places(query, None))
+        ]}
+
+    def _google(self, params: Dict[str, str]) -> Dict[str, Any]:
+        query = params.get('q', '')
+        rng = self._rng('google', query)
+        organic = [{
+            'position': i + 1,
+            'title': f"{query} - {rng.choice(['Hướng dẫn du lịch', 'Kinh nghiệm', 'Top 10', 'Review'])} {i + 1}",
+            'link': f"https://example.com/{i + 1}",
+            'snippet': rng.choice(FILLER),
+            'extensions': self._padding()
+        } for i in range(self.config.results)]
+        places = [{'position': i + 1, 'title': place['name'], 'rating': place['rating'],
+                   'address': place['vicinity'], 'place_id': place['place_id']}
+                  for i, place in enumerate(self._places(query, None)[:3])]
+        return {'organic_results': organic, 'local_results': {'places': places}}
+
+    # Maps
+
+    def maps(self, endpoint: str, params: Dict[str, str]) -> Dict[str, Any]:
+        if endpoint == 'geocode/json':
+            city = self.cities.find(params.get('address', ''))
+            return {'status': 'OK', 'results': [{
+                'formatted_address': city['query'],
+                'geometry': {'location': {'lat': city['lat'], 'lng': city['lng']}, 'location_type': 'APPROXIMATE'},
+                'place_id': self._place_id('city', city['name']),
+                'types': ['locality', 'political']
+            }]}
+        if endpoint in ('place/nearbysearch/json', 'place/textsearch/json'):
+            return {'status': 'OK', 'results': self._places(params.get('query') or params.get('keyword', ''),
+                                                            params.get('location'), params.get('type'))}
+        if endpoint == 'place/findplacefromtext/json':
+            place = self._places(params.get('input', ''), params.get('locationbias', '').replace('point:', '') or None)[0]
+            return {'status': 'OK', 'candidates': [place]}
+        if endpoint == 'place/details/json':
+            return {'status': 'OK', 'result': self._details(params.get('place_id', ''))}
+        return {'status': 'INVALID_REQUEST', 'error_message': f"Unsupported endpoint {endpoint}"}
+
+    # Open-Meteo
+
+    def forecast(self, params: Dict[str, str]) -> Dict[str, Any]:
+        start = date.fromisoformat(params.get('start_date') or date.today().isoformat())
+        end = date.fromisoformat(params.get('end_date') or start.isoformat())
+        lat = float(params.get('latitude') or 16.0)
+        daily: Dict[str, List[Any]] = {name: [] for name in (
+            'time', 'weather_code', 'temperature_2m_max', 'temperature_2m_min',
+            'precipitation_sum', 'precipitation_probability_max')}
+        for offset in range(max(1, min(16, (end - start).days + 1))):
+            day = (start + timedelta(days=offset)).isoformat()
+            rng = self._rng('forecast', params.get('latitude'), params.get('longitude'), day)
+            # Warmer towards the equator, as in the real data
+            high = round(38 - abs(lat) * 0.5 + rng.uniform(-3, 3), 1)
+            chance = rng.choice([0, 10, 20, 40, 60, 80, 90])
+            daily['time'].append(day)
+            daily['weather_code'].append(rng.choice([0, 2, 3]) if chance < 50 else rng.choice([61, 63, 80, 95]))
+            daily['temperature_2m_max'].append(high)
+            daily['temperature_2m_min'].append(round(high - rng.uniform(5, 9), 1))
+            daily['precipitation_sum'].append(round(chance / 10 * rng.uniform(0, 3), 1))
+            daily['precipitation_probability_max'].append(chance)
+        return {'latitude': lat, 'longitude': float(params.get('longitude') or 108.0),
+                'timezone': 'Asia/Bangkok', 'daily': daily}
+
+    def _place_id(self, *parts: Any) -> str:
+        return 'ChIJ' + hashlib.sha256('|'.join(map(str, parts)).encode('utf-8')).hexdigest()[:23]
+
+    def _places(self, query: str, location: Optional[str], place_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        if location and ',' in location:
+            lat, lng = (float(value) for value in location.split(',', 1))
+            area = f"{lat:.2f},{lng:.2f}"
+        else:
+            city = self.cities.find(query)
+            lat, lng, area = city['lat'], city['lng'], city['name']
+        rng = self._rng('places', query, area, place_type)
+        kind = place_type or 'tourist_attraction'
+        places = []
+        for i in range(self.config.results):
+            name = f"{query or kind.replace('_', ' ').title()} {i + 1}".strip()
+            places.append({
+                'name': name,
+                'place_id': self._place_id(area, kind, query, i),
+                'geometry': {'location': {'lat': lat + rng.uniform(-0.02, 0.02), 'lng': lng + rng.uniform(-0.02, 0.02)}},
+                'rating': round(rng.uniform(3.6, 4.9), 1),
+                'user_ratings_total': rng.randrange(20, 8000),
+                'vicinity': f"{rng.randrange(1, 300)} Đường {rng.choice(['Trần Phú', 'Lê Lợi', 'Nguyễn Huệ', 'Bạch Đằng'])}",
+                'types': [kind, 'point_of_interest', 'establishment'],
+                'price_level': rng.randint(1, 3),
+                'opening_hours': {'open_now': rng.random() > 0.2}
+            })
+        return places
+
+    def _details(self, place_id: str) -> Dict[str, Any]:
+        rng = self._rng('details', place_id)
+        city = rng.choice(self.cities.cities) if self.cities.cities else self.cities.find('')
+        return {
+            'place_id': place_id,
+            'name': f"{city['name']} {rng.choice(['Museum', 'Market', 'Pagoda', 'Beach', 'Park'])}",
+            'formatted_address': f"{rng.randrange(1, 300)} Trần Phú, {city['query']}",
+            'formatted_phone_number': f"0{rng.randrange(200, 299)} {rng.randrange(100, 999)} {rng.randrange(1000, 9999)}",
+            'website': 'https://example.com',
+            'geometry': {'location': {'lat': city['lat'], 'lng': city['lng']}},
+            'rating': round(rng.uniform(3.6, 4.9), 1),
+            'user_ratings_total': rng.randrange(20, 8000),
+            'opening_hours': {'weekday_text': [f"{day}: 7:00 AM – 9:00 PM" for day in
+                                               ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')]},
+            'reviews': [{'author_name': f"Guest {i + 1}", 'rating': rng.randint(3, 5), 'text': rng.choice(FILLER)}
+                        for i in range(min(5, self.config.results))],
+            'extensions': self._padding()
+        }
+
+
+_GEMINI_PATH = re.compile(r'^/v1(?:beta)?/models(?:/(?P<model>[^/:]+))?(?::(?P<method>\w+))?$')
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeUpstream/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def upstream(self) -> FakeUpstream:
+        return self.server.upstream
+
+    def log_message(self, format: str, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if url.path == '/_stats':
+            return self._json(200, self.upstream.stats_report())
+        if _GEMINI_PATH.match(url.path):
+            return self._gemini(_GEMINI_PATH.match(url.path), params, body)
+        if url.path in ('/search', '/search.json'):
+            return self._serpapi(params)
+        if url.path.startswith('/maps/api/'):
+            return self._maps(url.path[len('/maps/api/'):], params)
+        if url.path == '/v1/forecast':
+            return self._forecast(params)
+        self._json(404, {'error': f"No stand-in for {url.path}"})
+
+    def _delay_and_fault(self, service: str, latency: Optional[float] = None) -> Optional[str]:
+        config = self.upstream.config
+        time.sleep(config.latency(service) if latency is None else latency)
+        fault = config.fault(service)
+        self.upstream.count(service, fault or 'ok')
+        return fault
+
+    def _gemini(self, match: 're.Match', params: Dict[str, str], body: bytes):
+        model, method = match.group('model'), match.group('method')
+        if model is None:
+            return self._json(200, self.upstream.gemini_models())
+        if method is None:
+            return self._json(200, self.upstream.gemini_model(model))
+        if method not in ('generateContent', 'streamGenerateContent'):
+            return self._json(404, {'error': {'code': 404, 'message': f"Method {method} not emulated", 'status': 'NOT_FOUND'}})
+
+        request = json.loads(body or b'{}')
+        prompt = '\n'.join(
+            part.get('text', '')
+            for content in request.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        max_tokens = (request.get('generationConfig') or {}).get('maxOutputTokens')
+        config = self.upstream.config
+        total = config.latency('gemini')
+        streaming = method == 'streamGenerateContent'
+        # Streaming answers start after time-to-first-token, then trickle in
+        fault = self._delay_and_fault('gemini', total * 0.3 if streaming else total)
+        if fault:
+            return self._json(*self.upstream.gemini_error(fault))
+
+        text = self.upstream.gemini_text(prompt, max_tokens)
+        if not streaming:
+            return self._json(200, self.upstream.gemini_response(text, prompt))
+
+        size = -(-len(text) // config.stream_chunks)
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+        sse = params.get('alt') == 'sse'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if sse else 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        if not sse:
+            self._chunk(b'[')
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(total * 0.7 / len(chunks))
+            # google-generativeai 0.3 parses stream chunks strictly and has no usageMetadata field
+            event = json.dumps(self.upstream.gemini_response(chunk, prompt, finish=i == len(chunks) - 1, usage=False),
+                               ensure_ascii=False)
+            if sse:
+                self._chunk(f"data: {event}\r\n\r\n".encode('utf-8'))
+            else:
+                self._chunk(((',' if i else '') + event).encode('utf-8'))
+        if not sse:
+            self._chunk(b']')
+        self._chunk(b'')
+
+    def _serpapi(self, params: Dict[str, str]):
+        fault = self._delay_and_fault('serpapi')
+        if fault == 'rate_limited':
+            return self._json(429, {'error': 'Your account has run out of searches.'})
+        if fault:
+            return self._json(500, {'error': 'Internal server error.'})
+        self._json(200, self.upstream.serpapi(params))
+
+    def _maps(self, endpoint: str, params: Dict[str, str]):
+        fault = self._delay_and_fault('maps')
+        if fault == 'rate_limited':
+            # Maps reports quota errors in the body of a 200 response
+            return self._json(200, {'status': 'OVER_QUERY_LIMIT', 'results': [],
+                                    'error_message': 'You have exceeded your rate-limit for this API.'})
+        if fault:
+            return self._json(500, {'status': 'UNKNOWN_ERROR', 'results': []})
+        self._json(200, self.upstream.maps(endpoint, params))
+
+    def _forecast(self, params: Dict[str, str]):
+        fault = self._delay_and_fault('forecast')
+        if fault == 'rate_limited':
+            return self._json(429, {'error': True, 'reason': 'Too many requests'})
+        if fault:
+            return self._json(500, {'error': True, 'reason': 'Internal server error'})
+        self._json(200, self.upstream.forecast(params))
+
+    def _json(self, status: int, payload: Any):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+class FakeUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: FakeUpstreamConfig, host: str = '127.0.0.1', port: int = 8765):
+        super().__init__((host, port), FakeUpstreamHandler)
+        self.upstream = FakeUpstream(config)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def client_env(self) -> Dict[str, str]:
+        """Environment that points the app's upstream clients at this server."""
+        return {
+            'GEMINI_API_BASE_URL': self.base_url,
+            'SERPAPI_BASE_URL': self.base_url,
+            'MAPS_API_BASE_URL': self.base_url,
+            'FORECAST_API_BASE_URL': self.base_url,
+        }
+
+
+def start_in_thread(config: FakeUpstreamConfig, host: str = '127.0.0.1', port: int = 0) -> FakeUpstreamServer:
+    """Serve on a background thread (port 0 picks a free port); call shutdown() to stop."""
+    server = FakeUpstreamServer(config, host, port)
+    threading.Thread(target=server.serve_forever, name='fake-upstream', daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', help="Median latency in ms, e.g. gemini=1200,serpapi=1800,maps=80,forecast=150")
+    parser.add_argument('--jitter', type=float, default=0.3, help="Log-normal sigma of the latency (0 = fixed)")
+    parser.add_argument('--error-rate', help="Fraction of 5xx responses, per service or for all")
+    parser.add_argument('--rate-limit-rate', help="Fraction of 429 / quota responses, per service or for all")
+    parser.add_argument('--retry-delay', type=int, default=7, help="retryDelay seconds sent with Gemini 429s")
+    parser.add_argument('--results', type=int, default=10, help="Items per SerpAPI / Places response")
+    parser.add_argument('--text-chars', type=int, default=1200, help="Length of generated Gemini text")
+    parser.add_argument('--item-bytes', type=int, default=0, help="Extra bytes of padding per result item")
+    parser.add_argument('--seed', type=int, help="Seed for latency and fault injection")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeUpstreamConfig:
+    zero = {service: 0.0 for service in SERVICES}
+    return FakeUpstreamConfig(
+        latency_ms=parse_service_values(args.latency, DEFAULT_LATENCY_MS),
+        jitter=args.jitter,
+        error_rate=parse_service_values(args.error_rate, zero),
+        rate_limit_rate=parse_service_values(args.rate_limit_rate, zero),
+        retry_delay=args.retry_delay,
+        results=args.results,
+        text_chars=args.text_chars,
+        item_bytes=args.item_bytes,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Gemini/SerpAPI/Maps/Open-Meteo stand-in for load testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    from monitoring.logging_config import configure_logging
+    configure_logging(fmt='text')
+
+    server = FakeUpstreamServer(config_from_args(args), args.host, args.port)
+    logger.info(f"Fake upstream listening on {server.base_url}")
+    for name, value in server.client_env().items():
+        logger.info(f"  {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Any, Optional
+from .tracing import current_span
+
+# Payloads (prompts, API responses) attached with extra={"payload": ...}
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', 2000))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', 0.1))
+
+# Records waiting for the listener; beyond this they are dropped, not blocked on
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Chatty third-party loggers
+QUIET_LOGGERS = ('urllib3', 'googleapiclient.discovery_cache', 'fontTools')
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def cap_payload(value: Any, max_chars: int = LOG_PAYLOAD_MAX_CHARS) -> Any:
+    """Truncate long strings and large containers so one record stays small."""
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return f"{value[:max_chars]}... [{len(value) - max_chars} more chars]"
+    if isinstance(value, dict):
+        capped = {}
+        for i, (key, item) in enumerate(value.items()):
+            if i >= 50:
+                capped['...'] = f"{len(value) - 50} more keys"
+                break
+            capped[str(key)] = cap_payload(item, max_chars // 2 or 1)
+        return capped
+    if isinstance(value, (list, tuple)):
+        items = [cap_payload(item, max_chars // 2 or 1) for item in value[:20]]
+        if len(value) > 20:
+            items.append(f"... {len(value) - 20} more items")
+        return items
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return cap_payload(str(value), max_chars)
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Runs on the calling thread: tags records with the current trace and
+    decides payload sampling before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace.trace_id
+            record.span_id = span.span_id
+        if hasattr(record, 'payload') and record.levelno < logging.WARNING:
+            if random.random() >= LOG_PAYLOAD_SAMPLE_RATE:
+                record.payload = None
+                record.payload_sampled_out = True
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key in _RESERVED or value is None:
+                continue
+            entry[key] = cap_payload(value)
+        if record.exc_info:
+            entry['exception'] = cap_payload(self.formatException(record.exc_info), 8000)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development; payloads are capped too."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        payload = getattr(record, 'payload', None)
+        if payload is not None:
+            line += f" | payload={json.dumps(cap_payload(payload), ensure_ascii=False, default=str)}"
+        return line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never stall a request thread on a backed-up log sink
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (arguments may change later) but leave
+        # formatting and serialisation to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Route all logging through a queue to a single stderr handler.
+
+    Request threads only enqueue records; a QueueListener thread formats
+    them and does the I/O. Level and format default to LOG_LEVEL and
+    LOG_FORMAT ("json", or "text" for local development). Safe to call more
+    than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json')
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    log_queue: 'queue.Queue[logging.LogRecord]' = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,318 @@
+import time
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upstream calls range from a cached Maps lookup to a slow Gemini generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+
+class _Metric:
+    """
+    Base for metrics whose samples are kept in per-thread shards.
+
+    Each thread writes only to its own shard, so recording is a dict update
+    with no lock. The collector sums shards at scrape time. The shards of
+    finished threads are folded into a retired total whenever a new shard
+    is created, so servers that spawn a thread per request keep about one
+    shard per live thread even if nothing ever scrapes.
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire(self):
+        """Fold the shards of finished threads into the retired total; call with the lock held."""
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge(self._retired, dict(shard))
+        self._shards = alive
+
+    def _labels(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        # Values are stringified at scrape time, not on the hot path
+        return tuple([labels.get(name, '') for name in self.labelnames])
+
+    def _merge(self, total: dict, shard: dict):
+        raise NotImplementedError
+
+    def _snapshot(self) -> dict:
+        with self._lock:
+            self._retire()
+            total: dict = {}
+            self._merge(total, self._retired)
+            for _, shard in self._shards:
+                # dict() copies atomically under the GIL
+                self._merge(total, dict(shard))
+        return total
+
+    def collect(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter: counter.inc(agent="flight")."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._labels(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, total: dict, shard: dict):
+        for key, value in shard.items():
+            total[key] = total.get(key, 0) + value
+
+    def value(self, **labels) -> float:
+        return self._snapshot().get(self._labels(labels), 0)
+
+    def collect(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in _sorted(self._snapshot())
+        ]
+
+
+class Gauge(Counter):
+    """
+    Up/down gauge (in-progress requests, queue depth) summed across shards.
+
+    set_function() replaces the samples with a callback evaluated at scrape
+    time, for values that are cheaper to read than to track.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], Dict[Tuple[str, ...], float]]):
+        self._function = function
+
+    def _snapshot(self) -> dict:
+        if self._function is not None:
+            return dict(self._function())
+        return super()._snapshot()
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram: histogram.observe(seconds, route="/api/chat")."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._labels(labels)
+        # [count per bucket..., +Inf count, sum]
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _merge(self, total: dict, shard: dict):
+        for key, series in shard.items():
+            merged = total.get(key)
+            if merged is None:
+                total[key] = list(series)
+            else:
+                for i, value in enumerate(series):
+                    merged[i] += value
+
+    def collect(self) -> List[str]:
+        lines = []
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        for key, series in _sorted(self._snapshot()):
+            cumulative = 0
+            for bound, count in zip(bounds, series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _sorted(samples: dict) -> list:
+    return sorted(samples.items(), key=lambda item: tuple(str(value) for value in item[0]))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# HTTP routes (label is the URL rule, not the raw path, to bound cardinality)
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status'))
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('route',))
+HTTP_IN_PROGRESS = registry.gauge(
+    'http_requests_in_progress', 'Requests currently being handled (worker queue depth)', ('route',))
+
+# Agents, as chosen by AgentManager._route_to_agent
+AGENT_REQUESTS = registry.counter(
+    'agent_requests_total', 'Chat turns handled per agent and outcome', ('agent', 'status'))
+AGENT_LATENCY = registry.histogram(
+    'agent_duration_seconds', 'Time spent in agent.process per agent', ('agent',))
+SUPPORTING_REQUESTS = registry.counter(
+    'supporting_agent_requests_total',
+    'Supporting-agent calls by outcome (merged/late/error/unused)', ('agent', 'outcome'))
+
+# Upstream services: gemini/<model>, serpapi/<engine>, maps/<endpoint>
+UPSTREAM_REQUESTS = registry.counter(
+    'upstream_requests_total', 'Upstream calls by service, target and outcome', ('service', 'target', 'outcome'))
+UPSTREAM_LATENCY = registry.histogram(
+    'upstream_duration_seconds', 'Upstream call latency', ('service', 'target'))
+UPSTREAM_RATE_LIMITED = registry.counter(
+    'upstream_rate_limited_total', 'Upstream calls rejected with HTTP 429 / quota errors', ('service', 'target'))
+UPSTREAM_IN_PROGRESS = registry.gauge(
+    'upstream_requests_in_progress', 'Upstream calls currently in flight', ('service',))
+
+# Circuit breakers per upstream target and bulkheads per agent (agents/resilience.py)
+CIRCUIT_STATE = registry.gauge(
+    'circuit_breaker_state', 'Breaker state per upstream target: 0 closed, 1 half-open, 2 open', ('service', 'target'))
+CIRCUIT_REJECTED = registry.counter(
+    'circuit_breaker_rejected_total', 'Upstream calls failed fast by an open breaker', ('service', 'target'))
+BULKHEAD_IN_USE = registry.gauge(
+    'agent_bulkhead_in_use', 'Turns currently holding a slot in the agent bulkhead', ('agent',))
+BULKHEAD_REJECTED = registry.counter(
+    'agent_bulkhead_rejected_total', 'Turns turned away by a full agent bulkhead', ('agent',))
+
+# Degraded mode while Gemini's quota is exhausted (agents/degraded.py)
+DEGRADED_MODE = registry.gauge(
+    'degraded_mode', '1 while turns are answered from the local answer store')
+DEGRADED_ANSWERS = registry.counter(
+    'degraded_answers_total', 'Turns answered in degraded mode by agent and source', ('agent', 'source'))
+
+# Conversation history quoted in agent prompts (agents/history_index.py)
+HISTORY_PROMPT_BYTES = registry.histogram(
+    'history_prompt_bytes',
+    'Bytes of history per agent prompt: selected (BM25 within budget) or recent (the last 5 messages)', ('kind',),
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768))
+
+# Flight routes resolved to airport codes (agents/airports.py); result is exact, fuzzy or unresolved
+AIRPORT_RESOLUTIONS = registry.counter(
+    'airport_resolutions_total', 'Place names resolved to IATA codes by result', ('result',))
+
+# Gemini token usage; source is "reported" (usage_metadata) or "estimated"
+LLM_TOKENS = registry.counter(
+    'llm_tokens_total', 'Gemini tokens by agent, intent, kind (prompt/output) and source', ('agent', 'intent', 'kind', 'source'))
+LLM_BUDGET_DEGRADED = registry.counter(
+    'llm_budget_degraded_total', 'Gemini calls switched to the cheaper path by a session budget')
+
+# Caches: hit ratio = hits / (hits + misses)
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ('cache', 'result'))
+
+
+def record_cache(cache: str, hit: bool):
+    """Count one lookup against a named cache."""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def init_app(app):
+    """Time every request and serve the registry at /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_IN_PROGRESS.inc(route=g.metrics_route)
+
+    @app.teardown_request
+    def _finish_request_timer(exc=None):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        route = g.pop('metrics_route')
+        HTTP_IN_PROGRESS.dec(route=route)
+        HTTP_LATENCY.observe(time.perf_counter() - start, route=route)
+
+    @app.after_request
+    def _count_request(response):
+        if 'metrics_route' in g:
+            HTTP_REQUESTS.inc(route=g.metrics_route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.expose(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,262 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import cProfile
+import logging
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List
+from .tracing import Trace
+
+logger = logging.getLogger(__name__)
+
+# Off unless switched on at /admin/profiling (or PROFILE_ENABLED=1 at boot)
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.05))
+
+# App Engine only allows writes under /tmp
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'travel-assistant-profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 200))
+
+# Stack sampler period for the collapsed-stack output
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+INDEX_FILE = 'index.jsonl'
+
+_DISABLED = nullcontext()
+
+
+class _StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval.
+
+    Unlike cProfile this also catches time spent blocked (socket reads,
+    sleeps in retry loops), so wall time not covered by CPU shows up as
+    stacks ending in the blocking call.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({_short_path(code.co_filename)})")
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format, input for flamegraph.pl or speedscope."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _short_path(filename: str) -> str:
+    for marker in ('site-packages' + os.sep, 'lib' + os.sep + 'python'):
+        index = filename.rfind(marker)
+        if index != -1:
+            return filename[index + len(marker):]
+    return os.path.relpath(filename) if os.path.isabs(filename) else filename
+
+
+def _tags(trace: Trace) -> Dict[str, str]:
+    """Agent and intent of a chat turn, read from its spans."""
+    agent = 'none'
+    entry = None
+    methods = []
+    for span in list(trace.spans):
+        if span.category == 'agent':
+            agent = span.name.rsplit(' ', 1)[0]
+        elif span.category is None and span is not trace.root:
+            # Traced agent methods (BaseAgent.__init_subclass__)
+            if span.name.endswith('.process'):
+                entry = entry or span.name
+            else:
+                methods.append(span)
+    if methods:
+        intent = max(methods, key=lambda span: span.duration_ms).name
+    else:
+        intent = entry or 'none'
+    return {'agent': agent, 'intent': intent}
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', '1'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('false', '0'):
+        return False
+    raise ValueError("enabled must be true or false")
+
+
+class RequestProfiler:
+    """
+    Profiles a sampled fraction of chat turns.
+
+    Each sampled turn is run under cProfile (written as .pstats) and a stack
+    sampler (written as .collapsed for flame graphs), tagged with the agent
+    and intent that handled it. When disabled, profile() returns a shared
+    null context after a single attribute check.
+
+    Only the request thread is sampled. Work handed to pool threads
+    (supporting agents, multi-intent sections, trip plan nodes) shows up
+    as the request thread waiting on it; profile those agents by asking
+    them directly. On Python 3.12+ only one cProfile can be active at a
+    time, so a turn sampled while another is being profiled is skipped.
+    """
+
+    def __init__(self, enabled: bool = PROFILE_ENABLED, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: Any = None, sample_rate: Any = None):
+        """
+        Switch profiling and set its sample rate, e.g. from /admin/profiling JSON.
+
+        Raises ValueError, changing nothing, unless enabled is a boolean, 0/1
+        or "true"/"false"/"1"/"0" and sample_rate a number.
+        """
+        if enabled is not None:
+            enabled = _parse_bool(enabled)
+        if sample_rate is not None:
+            if isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float, str)):
+                raise ValueError("sample_rate must be a number")
+            try:
+                sample_rate = float(sample_rate)
+            except ValueError:
+                raise ValueError("sample_rate must be a number") from None
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if enabled is not None:
+            self.enabled = enabled
+        logger.info(f"Request profiling {'enabled' if self.enabled else 'disabled'} "
+                    f"(sample rate {self.sample_rate})")
+
+    def profile(self, trace: Trace):
+        """Context manager around one chat turn."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return _DISABLED
+        return self._profile(trace)
+
+    @contextmanager
+    def _profile(self, trace: Trace) -> Iterator[None]:
+        sampler = _StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+        profile = cProfile.Profile()
+        try:
+            # Raises ValueError on Python 3.12+ while another profiler is active
+            profile.enable()
+        except ValueError as e:
+            logger.warning(f"Turn not profiled: {str(e)}")
+            profile = None
+        if profile is None:
+            yield
+            return
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            sampler.start()
+            yield
+        finally:
+            profile.disable()
+            cpu_ms = (time.thread_time() - cpu_start) * 1000
+            wall_ms = (time.perf_counter() - wall_start) * 1000
+            sampler.stop()
+            try:
+                self._write(trace, profile, sampler, wall_ms, cpu_ms)
+            except OSError as e:
+                logger.error(f"Error writing profile to {self.directory}: {str(e)}")
+
+    def _write(self, trace: Trace, profile: cProfile.Profile, sampler: _StackSampler,
+               wall_ms: float, cpu_ms: float):
+        tags = _tags(trace)
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{tags['agent']}-{tags['intent']}")
+        name = f"{stamp}-{slug}-{trace.trace_id[:8]}"
+
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(os.path.join(self.directory, f"{name}.pstats"))
+        with open(os.path.join(self.directory, f"{name}.collapsed"), 'w', encoding='utf-8') as f:
+            f.write(sampler.collapsed())
+
+        entry = {
+            'name': name,
+            'trace_id': trace.trace_id,
+            'ts': stamp,
+            **tags,
+            'wall_ms': round(wall_ms, 1),
+            'cpu_ms': round(cpu_ms, 1),
+            # Share of the turn spent on this thread's CPU rather than waiting
+            'cpu_ratio': round(cpu_ms / wall_ms, 3) if wall_ms else 0.0,
+            'samples': sum(sampler.stacks.values())
+        }
+        with self._lock:
+            with open(os.path.join(self.directory, INDEX_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._prune()
+        logger.info(f"Profiled {tags['agent']} turn ({tags['intent']}): "
+                    f"{entry['wall_ms']} ms wall, {entry['cpu_ms']} ms CPU", extra={'profile': name})
+
+    def _prune(self):
+        # Names start with a timestamp, so they sort oldest first
+        stems = sorted({n.rsplit('.', 1)[0] for n in os.listdir(self.directory) if n.endswith('.pstats')})
+        for stem in stems[:max(0, len(stems) - self.max_files)]:
+            for suffix in ('.pstats', '.collapsed'):
+                path = os.path.join(self.directory, stem + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+        index = os.path.join(self.directory, INDEX_FILE)
+        with open(index, encoding='utf-8') as f:
+            lines = f.readlines()
+        if len(lines) > self.max_files * 2:
+            with open(index, 'w', encoding='utf-8') as f:
+                f.writelines(lines[-self.max_files:])
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest profiles still on disk, from the index."""
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with self._lock, open(path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        present = set(os.listdir(self.directory))
+        entries = [entry for entry in entries if f"{entry['name']}.pstats" in present]
+        return entries[-limit:][::-1]
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'directory': self.directory,
+            'profiles': self.recent()
+        }
+
+
+profiler = RequestProfiler()
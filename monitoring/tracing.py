@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import queue
+import logging
+import secrets
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'travel-assistant')
+
+# One line of OTLP/JSON (ExportTraceServiceRequest) per finished trace
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH')
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """A timed operation within a trace; category groups it for Server-Timing."""
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'category', 'attributes',
+                 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str],
+                 category: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.category = category
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'category': self.category,
+            'start_offset_ms': round((self.start_ns - self.trace.root.start_ns) / 1e6, 2),
+            'duration_ms': round(self.duration_ms, 2),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class Trace:
+    """All spans of one request; spans from worker threads are appended here too."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self._add(name, None, 'total', attributes)
+
+    def _add(self, name: str, parent_id: Optional[str], category: Optional[str],
+             attributes: Dict[str, Any]) -> Span:
+        span = Span(self, name, parent_id, category, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def timings(self) -> Dict[str, float]:
+        """Total milliseconds per span category (overlapping spans add up)."""
+        totals: Dict[str, float] = {}
+        for span in list(self.spans):
+            if span.category:
+                totals[span.category] = totals.get(span.category, 0.0) + span.duration_ms
+        return totals
+
+    def server_timing(self) -> str:
+        """Render timings as a Server-Timing header value."""
+        timings = self.timings()
+        counts: Dict[str, int] = {}
+        for span in list(self.spans):
+            if span.category:
+                counts[span.category] = counts.get(span.category, 0) + 1
+        return ', '.join(
+            f'{category};dur={duration:.1f};desc="{counts[category]} span(s)"'
+            for category, duration in timings.items()
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'timings_ms': {category: round(ms, 2) for category, ms in self.timings().items()},
+            'spans': [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start_ns)]
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode the trace as an OTLP/JSON ExportTraceServiceRequest."""
+        spans = []
+        for span in self.spans:
+            attributes = dict(span.attributes)
+            if span.category:
+                attributes['category'] = span.category
+            encoded = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 2 if span is self.root else 1,  # SERVER / INTERNAL
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or span.start_ns),
+                'attributes': [_otlp_attribute(key, value) for key, value in attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+            }
+            if span.parent_id:
+                encoded['parentSpanId'] = span.parent_id
+            spans.append(encoded)
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_otlp_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+            }]
+        }
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+class FileSpanExporter:
+    """
+    Appends finished traces to a file as OTLP/JSON lines.
+
+    Encoding and file I/O run on a background thread; when the queue is full
+    traces are dropped rather than blocking the request.
+    """
+
+    def __init__(self, path: str, max_queue: int = 1000):
+        self.path = path
+        self._queue: 'queue.Queue[Trace]' = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+
+    def export(self, trace: Trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(trace.to_otlp(), ensure_ascii=False, default=str) + '\n')
+            except OSError as e:
+                logger.error(f"Error exporting trace to {self.path}: {str(e)}")
+
+
+exporter = FileSpanExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace() -> Optional[Trace]:
+    span = _current_span.get()
+    return span.trace if span else None
+
+
+@contextmanager
+def start_trace(name: str, **attributes) -> Iterator[Trace]:
+    """Open the root span of a request; the trace is exported when it ends."""
+    trace = Trace(name, attributes)
+    token = _current_span.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.error = str(e)
+        raise
+    finally:
+        trace.root.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if exporter is not None:
+            exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, category: Optional[str] = None, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time a child span of the current span.
+
+    Outside a trace this does nothing, so instrumented code costs one
+    context variable lookup when tracing is not active.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.trace._add(name, parent.span_id, category, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = str(e)
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+def traced(name: str, category: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """Decorator form of span()."""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return function(*args, **kwargs)
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_current_context(function: Callable) -> Callable:
+    """
+    Bind a callable to the caller's context variables (trace, request memo).
+
+    Use when handing work to another thread, e.g.
+    executor.submit(in_current_context(fn), arg). Asyncio tasks copy the
+    context on their own.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # A Context can only be entered by one thread at a time
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,82 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from functools import wraps
+from typing import Callable, Dict, List, Tuple
+from flask import Flask, Response, current_app, request, session, url_for
+from monitoring.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Rendered output only changes between deploys. App Engine sets GAE_VERSION;
+# elsewhere DEPLOY_VERSION can be set, else every process start is a version.
+DEPLOY_VERSION = os.getenv('GAE_VERSION') or os.getenv('DEPLOY_VERSION') or f"dev-{int(time.time())}"
+
+# Browsers keep the page but revalidate it, so repeat visits are a 304
+CACHE_CONTROL = 'public, no-cache'
+
+
+class PageCache:
+    """
+    Rendered HTML of the informational pages, keyed by endpoint and deploy version.
+
+    Each entry carries a strong ETag derived from the body and deploy version,
+    so conditional requests are answered with 304 without rendering. Requests
+    with pending flash messages bypass the cache, because base.html renders
+    them into the page, and so does debug mode.
+    """
+
+    def __init__(self, version: str = DEPLOY_VERSION):
+        self.version = version
+        self.endpoints: List[str] = []
+        self._pages: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, view: Callable) -> Callable:
+        """Decorator for views whose output depends only on the deploy."""
+        self.endpoints.append(view.__name__)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Debug mode reloads templates on change, so never serve stale HTML
+            if current_app.debug or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            key = (request.endpoint, self.version)
+            entry = self._pages.get(key)
+            if entry is None:
+                body = view(*args, **kwargs)
+                if not isinstance(body, str):
+                    return body
+                body = body.encode('utf-8')
+                etag = hashlib.sha256(self.version.encode() + b'\0' + body).hexdigest()[:32]
+                entry = (body, etag)
+                with self._lock:
+                    self._pages[key] = entry
+                record_cache('page', False)
+            else:
+                record_cache('page', True)
+
+            body, etag = entry
+            response = Response(body, mimetype='text/html')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CACHE_CONTROL
+            return response.make_conditional(request)
+        return wrapper
+
+    def prerender(self, app: Flask):
+        """Render every cached page once, e.g. at startup, so no visitor pays for it."""
+        for endpoint in self.endpoints:
+            with app.test_request_context():
+                path = url_for(endpoint)
+            with app.test_request_context(path):
+                try:
+                    app.view_functions[endpoint]()
+                except Exception as e:
+                    logger.error(f"Error pre-rendering {path}: {str(e)}")
+        logger.info(f"Pre-rendered {len(self._pages)} pages for version {self.version}")
+
+
+page_cache = PageCache()
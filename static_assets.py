@@ -0,0 +1,96 @@
+import os
+import json
+import logging
+import mimetypes
+from typing import Dict, Optional
+from flask import Flask, request, send_from_directory, abort
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Logical path of the purged Tailwind build inside the manifest
+TAILWIND_CSS = 'css/tailwind.css'
+
+# Fingerprinted files never change, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Precompressed variants in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, str]:
+    """Return {logical path: fingerprinted path}, or {} when no build exists."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)['assets']
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Ignoring unreadable asset manifest {path}: {str(e)}")
+        return {}
+
+
+def _accepted_encodings() -> set:
+    header = request.headers.get('Accept-Encoding', '')
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def init_app(app: Flask, manifest_path: str = MANIFEST_PATH):
+    """
+    Serve the output of build_assets.py when a build is present.
+
+    url_for('static', filename=...) is rewritten to the fingerprinted copy
+    under static/dist, which is served with an immutable Cache-Control and
+    the best precompressed variant the client accepts. Without a manifest
+    nothing changes and the Tailwind browser runtime stays in use.
+    """
+    manifest = {} if os.getenv('USE_BUILT_ASSETS', '1') == '0' else load_manifest(manifest_path)
+    if manifest:
+        logger.info(f"Serving {len(manifest)} fingerprinted static assets from {DIST_DIR}")
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint: str, values: dict):
+        if endpoint == 'static' and manifest:
+            filename = values.get('filename')
+            if filename in manifest:
+                values['filename'] = manifest[filename]
+
+    @app.context_processor
+    def inject_asset_helpers():
+        return {'compiled_tailwind': TAILWIND_CSS in manifest}
+
+    @app.route('/static/dist/<path:filename>')
+    def built_asset(filename: str):
+        path = os.path.join(DIST_DIR, filename)
+        if not os.path.isfile(path):
+            abort(404)
+
+        accepted = _accepted_encodings()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding: Optional[str] = None
+        served = filename
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.isfile(path + suffix):
+                encoding, served = name, filename + suffix
+                break
+
+        response = send_from_directory(DIST_DIR, served, mimetype=mimetype, max_age=31536000)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,19 @@
+"""Airport resolution from Vietnamese and English place names."""
+from agents.airports import resolve_airport, resolve_route
+
+
+def test_resolve_airport_names_codes_and_typos():
+    assert resolve_airport("Hà Nội") == 'HAN'
+    assert resolve_airport("Sài Gòn") == 'SGN'
+    assert resolve_airport("TP. Hồ Chí Minh") == 'SGN'
+    assert resolve_airport("Danang") == 'DAD'
+    assert resolve_airport("Tokyo") == 'NRT,HND'
+    assert resolve_airport("han") == 'HAN'
+    assert resolve_airport("Hà Nộii") == 'HAN'
+    assert resolve_airport("xyzabc") is None
+    assert resolve_airport("") is None
+
+
+def test_resolve_route_reads_departure_and_arrival():
+    assert resolve_route("vé máy bay từ Hà Nội đến Đà Nẵng") == ('HAN', 'DAD')
+    assert resolve_route("bay Sài Gòn đi Phú Quốc") == ('SGN', 'PQC')
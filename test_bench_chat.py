@@ -0,0 +1,48 @@
+"""The /api/chat load benchmark: statistics, metric deltas, regressions and a short run."""
+import pytest
+import app as app_module
+import bench_chat
+
+BEFORE = '''cache_requests_total{cache="poi_index",result="hit"} 2
+cache_requests_total{cache="poi_index",result="miss"} 1
+upstream_requests_total{service="maps",outcome="ok"} 10
+'''
+AFTER = '''cache_requests_total{cache="poi_index",result="hit"} 5
+cache_requests_total{cache="poi_index",result="miss"} 2
+upstream_requests_total{service="maps",outcome="ok"} 14
+upstream_requests_total{service="gemini",outcome="rate_limited"} 1
+'''
+
+
+def test_percentiles_interpolate():
+    assert bench_chat.percentile([10.0, 20.0, 30.0, 40.0], 50) == 25.0
+    assert bench_chat.latency_summary([5.0])['p99'] == 5.0
+    assert bench_chat.percentile([], 95) == 0.0
+
+
+def test_parse_mix_rejects_unknown_categories():
+    assert bench_chat.parse_mix("flight=3,hotel") == {'flight': 3.0, 'hotel': 1.0}
+    with pytest.raises(ValueError):
+        bench_chat.parse_mix("visa=1")
+
+
+def test_metric_deltas_between_scrapes():
+    assert bench_chat.cache_hit_rates(BEFORE, AFTER) == {'poi_index': {'hits': 3, 'misses': 1, 'hit_rate': 0.75}}
+    assert bench_chat.upstream_calls(BEFORE, AFTER) == {'gemini': {'rate_limited': 1}, 'maps': {'ok': 4}}
+
+
+def test_compare_flags_regressions_past_the_threshold():
+    baseline = {'summary': {'throughput_rps': 10.0, 'latency_ms': {'p50': 100.0, 'p95': 200.0}}}
+    current = {'summary': {'throughput_rps': 9.5, 'latency_ms': {'p50': 104.0, 'p95': 260.0}}}
+    assert bench_chat.compare(baseline, current, threshold=10) == ['p95 latency (ms)']
+    current['summary']['throughput_rps'] = 8.0
+    assert 'throughput (req/s)' in bench_chat.compare(baseline, current, threshold=10)
+
+
+def test_short_in_process_run_has_no_errors():
+    weights = bench_chat.parse_mix(None)
+    records, wall_s = bench_chat.run_sessions(lambda: bench_chat.InProcessClient(app_module.app),
+                                              sessions=2, turns=3, concurrency=2, weights=weights, seed=1)
+    summary = bench_chat.summarize(records, wall_s)
+    assert summary['requests'] == 6
+    assert summary['error_rate'] == 0.0, summary['top_errors']
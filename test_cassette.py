@@ -0,0 +1,68 @@
+"""Recording upstream calls to a cassette and replaying them."""
+import pytest
+from agents import upstream
+from agents.cassette import Cassette, CassetteMissError, ReplayedError
+
+
+class _Usage:
+    prompt_token_count = 120
+    candidates_token_count = 30
+
+
+class _GeminiResponse:
+    text = "Đà Nẵng có biển đẹp."
+    usage_metadata = _Usage()
+
+
+class _QuotaError(Exception):
+    code = 429
+    details = [{'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': "7s"}]
+
+
+def _quota_exceeded():
+    raise _QuotaError("429 Resource has been exhausted")
+
+
+def test_recorded_calls_replay_in_order(tmp_path):
+    path = str(tmp_path / 'run.jsonl.gz')
+    recorder = Cassette(path, 'record')
+    geocode = {'address': "Huế", 'key': 'secret'}
+    recorder.call('maps', 'geocode/json', geocode, lambda: {'status': 'OK', 'n': 1})
+    recorder.call('maps', 'geocode/json', geocode, lambda: {'status': 'OK', 'n': 2})
+    recorder.call('gemini', 'gemini-2.0-flash', {'prompt': "Biển"}, lambda: _GeminiResponse())
+    with pytest.raises(_QuotaError):
+        recorder.call('gemini', 'gemini-2.0-flash', {'prompt': "Quota"}, _quota_exceeded)
+    recorder.close()
+    assert recorder.recorded == 4
+
+    player = Cassette(path, 'replay', latency_scale=0)
+    live = lambda: pytest.fail("replay made a live call")
+    # Another API key is the same request
+    geocode = {'address': "Huế", 'key': 'other'}
+    assert player.call('maps', 'geocode/json', geocode, live)['n'] == 1
+    assert player.call('maps', 'geocode/json', geocode, live)['n'] == 2
+    assert player.call('maps', 'geocode/json', geocode, live)['n'] == 2
+
+    response = player.call('gemini', 'gemini-2.0-flash', {'prompt': "Biển"}, live)
+    assert response.text == _GeminiResponse.text
+    assert response.usage_metadata.total_token_count == 150
+
+    with pytest.raises(ReplayedError) as error:
+        player.call('gemini', 'gemini-2.0-flash', {'prompt': "Quota"}, live)
+    assert error.value.code == 429
+    assert upstream.retry_delay(error.value) == 7.0
+
+    with pytest.raises(CassetteMissError):
+        player.call('maps', 'geocode/json', {'address': "Vinh"}, live)
+    assert player.stats()['misses'] == 1
+
+
+def test_upstream_calls_go_through_the_cassette(monkeypatch, tmp_path):
+    path = str(tmp_path / 'maps.jsonl.gz')
+    monkeypatch.setattr(upstream, 'cassette', Cassette(path, 'record'))
+    recorded = upstream.maps_get("geocode/json", {'address': "Mộc Châu", 'key': 'offline-test'})
+    upstream.cassette.close()
+
+    monkeypatch.setattr(upstream, 'cassette', Cassette(path, 'replay', latency_scale=0))
+    assert upstream.maps_get("geocode/json", {'address': "Mộc Châu", 'key': 'offline-test'}) == recorded
+    assert upstream.cassette.stats()['replayed'] == 1
@@ -0,0 +1,90 @@
+"""End-to-end /api/chat checks against fake_upstream.py (see conftest.py)."""
+import pytest
+import app as app_module
+from agents import agent_manager
+
+# One message per agent route, as the router sends them
+ROUTES = [
+    ('flight', "Vé máy bay từ Hà Nội đến Đà Nẵng ngày 20/11"),
+    ('hotel', "Khách sạn ở Đà Nẵng"),
+    ('place', "Địa điểm du lịch ở Huế"),
+    ('weather', "Thời tiết Đà Lạt ngày mai"),
+    ('food', "Món ăn đặc sản ở Hà Nội"),
+]
+
+
+def chat(message: str, client=None):
+    client = client or app_module.app.test_client()
+    response = client.post('/api/chat', json={'message': message})
+    return response.status_code, response.get_json(silent=True) or {}
+
+
+@pytest.mark.parametrize('agent, message', ROUTES)
+def test_each_route_answers(agent, message):
+    status, body = chat(message)
+    assert status == 200, body
+    assert body['agent'] == agent
+    assert body['response']
+
+
+@pytest.mark.parametrize('agent, message', ROUTES)
+def test_each_route_is_given_the_context_dict(agent, message, monkeypatch):
+    manager = app_module.agent_manager
+    received = []
+    monkeypatch.setattr(manager.agents[agent], 'process',
+                        lambda *args: pytest.fail("chat turns go through process_with_context()"))
+    monkeypatch.setattr(manager.agents[agent], 'process_with_context',
+                        lambda data: received.append(data) or {'status': 'success', 'content': 'ok'})
+    monkeypatch.setattr(agent_manager.response_cache, 'lookup', lambda *args: None)
+    history = [{'role': 'user', 'content': "Tôi sẽ ở Nha Trang ngày 20/11"},
+               {'role': 'assistant', 'content': "Nha Trang tháng 11 có mưa."},
+               {'role': 'user', 'content': message}]
+
+    response = manager.process(message, f"route-{agent}", history)
+    assert response == {'status': 'success', 'content': 'ok', 'agent': agent}
+    assert set(received[0]) == {'user_input', 'context', 'entities', 'history'}
+    assert received[0]['user_input'] == message
+    assert "Nha Trang" in received[0]['context']['locations']
+    assert received[0]['history'][0]['content'] == history[0]['content']
+
+
+def test_multi_intent_message_is_answered_per_section():
+    status, body = chat("Khách sạn ở Đà Nẵng và thời tiết Đà Nẵng ngày mai thế nào?")
+    assert status == 200, body
+    assert [section['agent'] for section in body['sections']] == ['hotel', 'weather']
+    assert all(section['status'] == 'success' for section in body['sections'])
+
+
+def test_trip_plan_runs_every_node():
+    response = app_module.app.test_client().post('/api/plan-trip', json={
+        'departure_city': "Hà Nội", 'arrival_city': "Đà Nẵng", 'departure_date': "2026-11-10",
+        'return_date': "2026-11-13", 'budget': 10000000, 'currency': 'VND'
+    })
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert set(body['timings']) == {'destination', 'flights', 'hotels', 'weather', 'places', 'food', 'cost'}
+    assert all(body['data'][node] for node in ('flights', 'hotels', 'weather', 'places', 'food'))
+
+
+def test_unmatched_message_is_answered():
+    """A message no agent or local index claims falls through to PlaceAgent's web search."""
+    for message in ("Xin chào", "Địa điểm du lịch nổi tiếng ở Tokyo"):
+        status, body = chat(message)
+        assert status == 200, body
+        assert body['agent'] == 'place'
+        assert body['response']
+
+
+def test_long_conversation_fits_in_session_cookie():
+    """Merged multi-intent answers are cut and old turns dropped, so the session cookie survives."""
+    client = app_module.app.test_client()
+    message = "Vé máy bay từ Hà Nội đến Đà Nẵng và khách sạn ở Đà Nẵng, thời tiết thế nào?"
+    for _ in range(4):
+        status, body = chat(message, client)
+        assert status == 200, body
+    cookie = client.get_cookie('session')
+    assert cookie is not None and len(cookie.value) <= app_module.SESSION_COOKIE_BYTES
+    with client.session_transaction() as session:
+        history = session['conversation_history']
+    assert history[-2] == {'role': 'user', 'content': message}
+    assert all(len(entry['content']) <= app_module.SESSION_MESSAGE_CHARS + 1 for entry in history)
@@ -0,0 +1,43 @@
+"""parse_period: the period a weather question is about."""
+from datetime import date
+from agents.climate import is_near_term, parse_period
+
+TODAY = date(2026, 10, 19)  # a Monday
+
+
+def _days(text):
+    period = parse_period(text, TODAY)
+    assert period['kind'] == 'days', period
+    return period['start'], period['end']
+
+
+def test_relative_days():
+    assert _days("Thời tiết Hà Nội hôm nay") == (TODAY, TODAY)
+    assert _days("ngày mai ở Đà Nẵng") == (date(2026, 10, 20), date(2026, 10, 20))
+    assert _days("cuối tuần này") == (date(2026, 10, 24), date(2026, 10, 25))
+    assert _days("tuần sau") == (date(2026, 10, 26), date(2026, 11, 1))
+    assert _days("5 ngày tới") == (TODAY, date(2026, 10, 23))
+
+
+def test_dates_and_ranges():
+    assert _days("ngày 12/11") == (date(2026, 11, 12), date(2026, 11, 12))
+    # Past day/month without a year is next year's
+    assert _days("ngày 1/3") == (date(2027, 3, 1), date(2027, 3, 1))
+    assert _days("từ 10 đến 13/11") == (date(2026, 11, 10), date(2026, 11, 13))
+    assert _days("10-13/11/2026") == (date(2026, 11, 10), date(2026, 11, 13))
+    assert _days("2026-11-10 đến 2026-11-13") == (date(2026, 11, 10), date(2026, 11, 13))
+    assert parse_period("từ 10 đến 13/11", TODAY)['label'] == "từ 10/11/2026 đến 13/11/2026"
+
+
+def test_months_seasons_and_default():
+    assert parse_period("tháng 7", TODAY) == {'kind': 'months', 'months': [7], 'label': 'tháng 7'}
+    assert parse_period("mùa hè", TODAY)['months'] == [5, 6, 7, 8]
+    # "máy bay" folds to "may bay", which is not the month of May
+    assert parse_period("vé máy bay", TODAY, default=False) is None
+    assert _days("Thời tiết Huế thế nào") == (TODAY, date(2026, 10, 21))
+
+
+def test_is_near_term():
+    assert is_near_term(parse_period("ngày mai", TODAY), TODAY)
+    assert not is_near_term(parse_period("tháng 7", TODAY), TODAY)
+    assert not is_near_term(parse_period("ngày 12/11/2025", TODAY), TODAY)
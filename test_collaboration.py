@@ -0,0 +1,60 @@
+"""Supporting agents run alongside the primary one, within a sub-deadline."""
+import threading
+import time
+from agents.collaboration import CollaborationExecutor
+from agents.request_context import memoize, request_scope
+from monitoring.metrics import SUPPORTING_REQUESTS
+
+WEATHER = {'status': 'success', 'content': "Đà Nẵng nắng, 30°C"}
+
+
+def _outcome(outcome):
+    return SUPPORTING_REQUESTS.value(agent='weather', outcome=outcome)
+
+
+def test_answer_in_time_is_merged():
+    before = _outcome('merged')
+    info = CollaborationExecutor().launch('weather', "Thời tiết Đà Nẵng", lambda: WEATHER)
+    assert info['content'] == WEATHER['content']
+    assert info.outcome == 'merged'
+    assert _outcome('merged') == before + 1
+
+
+def test_late_answer_is_left_out_after_the_deadline():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return WEATHER
+
+    start = time.monotonic()
+    info = CollaborationExecutor().launch('weather', "Thời tiết Đà Nẵng", slow, timeout=0.05)
+    assert not info
+    assert time.monotonic() - start < 1
+    assert info.outcome == 'late'
+    release.set()
+
+
+def test_failed_or_unread_answers_read_as_empty():
+    def fail():
+        raise ValueError("quota")
+
+    executor = CollaborationExecutor()
+    failed = executor.launch('weather', "Thời tiết Đà Nẵng", fail)
+    assert dict(failed) == {}
+    assert failed.outcome == 'error'
+
+    unread = executor.launch('weather', "Thời tiết Đà Nẵng", lambda: WEATHER)
+    unread.close()
+    assert unread.outcome == 'unused'
+
+
+def test_supporting_agent_shares_the_turn_memo():
+    calls = []
+    with request_scope("hotel turn"):
+        geocode = lambda: memoize("maps/geocode?address=Da+Nang", lambda: calls.append(1) or (16.05, 108.2))
+        info = CollaborationExecutor().launch('weather', "Thời tiết Đà Nẵng",
+                                              lambda: dict(WEATHER, content=str(geocode())))
+        assert info['content'] == str((16.05, 108.2))
+        geocode()
+    assert len(calls) == 1
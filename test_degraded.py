@@ -0,0 +1,47 @@
+"""Degraded-mode answers: what is remembered, under which key, and what is served back."""
+from agents import degraded
+from agents.degraded import AnswerStore, DegradedAnswers
+
+GOOD = {'status': 'success', 'content': "Vietjet 7:00, 1.200.000đ"}
+
+
+def _answers(tmp_path):
+    return DegradedAnswers(AnswerStore(str(tmp_path / 'answers.sqlite3')))
+
+
+def test_flight_answers_are_kept_per_route(tmp_path):
+    answers = _answers(tmp_path)
+    answers.remember('flight', "Vé máy bay từ Hà Nội đến Đà Nẵng", GOOD)
+    assert answers.answer('flight', "Vé máy bay từ Hà Nội đi Phú Quốc") is None
+    # Origin only named by the destination is not enough to pick a route
+    assert answers.answer('flight', "Vé máy bay đi Đà Nẵng") is None
+    hit = answers.answer('flight', "Chuyến bay Hà Nội - Đà Nẵng")
+    assert hit['freshness']['source'] == 'last_answer'
+    assert GOOD['content'] in hit['content']
+
+
+def test_flight_snapshots_are_kept_per_route(tmp_path):
+    answers = _answers(tmp_path)
+    response = {'best_flights': [{'flights': [{'airline': 'Bamboo', 'departure_airport': {'time': '09:00'}}],
+                                  'total_duration': 80, 'price': 1500000}]}
+    answers.capture_serp('serpapi', 'google_flights', {'departure_id': 'SGN', 'arrival_id': 'DAD'}, response)
+    assert answers.answer('flight', "Vé máy bay từ Hà Nội đến Đà Nẵng") is None
+    card = answers.answer('flight', "Vé máy bay từ Sài Gòn đến Đà Nẵng")
+    assert card['freshness']['source'] == 'serp_card'
+    assert 'Bamboo' in card['content']
+
+
+def test_questions_without_a_city_are_not_shared(tmp_path):
+    answers = _answers(tmp_path)
+    answers.remember('hotel', "Còn khách sạn nào rẻ hơn không?", GOOD)
+    answers.remember('hotel', "Khách sạn ở Huế", GOOD)
+    assert answers.answer('hotel', "Còn khách sạn nào rẻ hơn không?") is None
+    assert answers.answer('hotel', "Khách sạn Huế giá tốt")['freshness']['source'] == 'last_answer'
+
+
+def test_nothing_stored_is_an_error_not_an_answer(tmp_path, monkeypatch):
+    answers = _answers(tmp_path)
+    monkeypatch.setattr(degraded.quota, 'serve_locally', lambda: True)
+    response = answers.run('flight', "Vé máy bay từ Hà Nội đến Đà Nẵng", lambda: GOOD)
+    assert response['status'] == 'error'
+    assert response['freshness'] == {'mode': 'degraded', 'source': None, 'as_of': None, 'age_minutes': None}
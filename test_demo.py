@@ -7,6 +7,7 @@ import json
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import asyncio
+import inspect
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +16,10 @@ def print_json(data):
     """Print JSON data in a formatted way"""
     print(json.dumps(data, indent=2))
 
+def run(result):
+    """Result of an agent's process(), which is a coroutine for some agents"""
+    return asyncio.run(result) if inspect.iscoroutine(result) else result
+
 def test_flight_search():
     """Test flight search functionality."""
     print("\n=== Testing Flight Search ===")
@@ -49,7 +54,7 @@ def test_flight_search():
     else:
         print(f"\nError: {response['message']}")
 
-async def test_hotel_search():
+def test_hotel_search():
     """Test hotel search functionality"""
     print("\n=== Testing Hotel Search ===")
     agent = HotelAgent()
@@ -58,14 +63,14 @@ async def test_hotel_search():
     check_in = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
     check_out = (datetime.now() + timedelta(days=10)).strftime("%Y-%m-%d")
     
-    result = await agent.process({
+    result = run(agent.process({
         "type": "search_hotels",
         "city": "Ho Chi Minh City",
         "check_in": check_in,
         "check_out": check_out,
         "guests": 2,
         "room_type": "double"
-    })
+    }))
     
     print("\nHotel Search Results:")
     print(f"Status: {result.get('status')}")
@@ -85,19 +90,19 @@ async def test_hotel_search():
     else:
         print(f"Error: {result.get('message')}")
 
-async def test_place_search():
+def test_place_search():
     """Test place search functionality"""
     print("\n=== Testing Place Search ===")
     agent = PlaceAgent()
     
     # Test place search with realistic data
-    result = await agent.process({
+    result = run(agent.process({
         "type": "search_places",
         "city": "Ho Chi Minh City",
         "query": "historical landmarks",
         "category": "attractions",
         "max_results": 5
-    })
+    }))
     
     print("\nPlace Search Results:")
     print(f"Status: {result.get('status')}")
@@ -116,7 +121,7 @@ async def test_place_search():
     else:
         print(f"Error: {result.get('message')}")
 
-async def test_agent_collaboration():
+def test_agent_collaboration():
     """Test collaboration between agents"""
     print("\n=== Testing Agent Collaboration ===")
     flight_agent = FlightAgent()
@@ -130,12 +135,12 @@ async def test_agent_collaboration():
     print("\nPlanning a 3-day trip to Ho Chi Minh City from Hanoi...")
     
     print("\n1. Flight Options:")
-    flight_result = await flight_agent.process({
+    flight_result = run(flight_agent.process({
         "type": "search_flights",
         "from_city": "HAN",
         "to_city": "SGN",
         "date": check_in
-    })
+    }))
     if flight_result.get('status') == 'success':
         print("Available flights found!")
         print(flight_result.get('ai_insights'))
@@ -143,14 +148,14 @@ async def test_agent_collaboration():
         print(f"Flight search error: {flight_result.get('message')}")
     
     print("\n2. Hotel Options:")
-    hotel_result = await hotel_agent.process({
+    hotel_result = run(hotel_agent.process({
         "type": "search_hotels",
         "city": "Ho Chi Minh City",
         "check_in": check_in,
         "check_out": check_out,
         "guests": 2,
         "room_type": "double"
-    })
+    }))
     if hotel_result.get('status') == 'success':
         print("Available hotels found!")
         print(hotel_result.get('ai_insights'))
@@ -158,21 +163,21 @@ async def test_agent_collaboration():
         print(f"Hotel search error: {hotel_result.get('message')}")
     
     print("\n3. Places to Visit:")
-    place_result = await place_agent.process({
+    place_result = run(place_agent.process({
         "type": "search_places",
         "city": "Ho Chi Minh City",
         "query": "top attractions",
         "category": "attractions",
         "max_results": 5
-    })
+    }))
     if place_result.get('status') == 'success':
         print("Recommended places found!")
         print(place_result.get('ai_insights'))
     else:
         print(f"Place search error: {place_result.get('message')}")
 
-async def async_main():
-    """Async main function."""
+def main():
+    """Main entry point."""
     print("Starting Travel Assistant Demo...")
     print(f"Current date: {datetime.now().strftime('%Y-%m-%d')}\n")
     
@@ -181,20 +186,16 @@ async def async_main():
         test_flight_search()
         
         # Test individual agents
-        await test_hotel_search()
-        await test_place_search()
+        test_hotel_search()
+        test_place_search()
         
         # Test agent collaboration
-        await test_agent_collaboration()
+        test_agent_collaboration()
         
         print("\nDemo completed successfully!")
     except Exception as e:
         print(f"\nError during testing: {str(e)}")
         print("Please check your API keys and internet connection.")
 
-def main():
-    """Main entry point."""
-    asyncio.run(async_main())
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""The offline upstream stand-in: configuration, fault injection and response shapes."""
+import json
+import urllib.error
+import urllib.request
+import pytest
+import fake_upstream
+from fake_upstream import FakeUpstream, FakeUpstreamConfig, parse_service_values
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_parse_service_values():
+    assert parse_service_values("gemini=800, maps=50", {'gemini': 1, 'maps': 1}) == {'gemini': 800.0, 'maps': 50.0}
+    assert parse_service_values("0", {}) == {service: 0.0 for service in fake_upstream.SERVICES}
+    with pytest.raises(ValueError):
+        parse_service_values("bing=10", {})
+
+
+def test_flights_are_deterministic_per_route_and_date():
+    upstream = FakeUpstream(FakeUpstreamConfig(results=4))
+    params = {'engine': 'google_flights', 'departure_id': 'HAN', 'arrival_id': 'DAD', 'outbound_date': '2026-11-20'}
+    first = upstream.serpapi(params)
+    assert first == upstream.serpapi(dict(params))
+    assert len(first['flights_results']) == 4
+    assert first['flights_results'][0]['flights'][0]['arrival_airport']['id'] == 'DAD'
+
+
+def test_injected_faults_are_served_and_counted():
+    config = FakeUpstreamConfig(latency_ms={service: 0 for service in fake_upstream.SERVICES}, seed=1,
+                                rate_limit_rate={'gemini': 1.0}, error_rate={'maps': 1.0}, retry_delay=3)
+    server = fake_upstream.start_in_thread(config)
+    try:
+        status, body = _get(f"{server.base_url}/v1beta/models/gemini-2.0-flash:generateContent")
+        assert status == 429
+        assert body['error']['details'][0]['retryDelay'] == "3s"
+
+        status, body = _get(f"{server.base_url}/maps/api/geocode/json?address=Hue")
+        assert (status, body['status']) == (500, 'UNKNOWN_ERROR')
+
+        status, body = _get(f"{server.base_url}/v1/forecast?latitude=16.46&longitude=107.59")
+        assert status == 200
+
+        assert _get(f"{server.base_url}/_stats")[1] == {'gemini': {'rate_limited': 1}, 'maps': {'error': 1},
+                                                        'forecast': {'ok': 1}}
+    finally:
+        server.shutdown()
+        server.server_close()
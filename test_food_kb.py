@@ -0,0 +1,63 @@
+"""Food knowledge base search and the answers FoodAgent builds from it."""
+import json
+import pytest
+from agents.food_agent import FoodAgent
+from agents.food_kb import FoodKnowledgeBase, needs_live_data
+
+KB = {
+    'version': 1,
+    'updated': '2026-10-01',
+    'regions': {'central': "Miền Trung"},
+    'cities': [{
+        'city': "Huế",
+        'region': 'central',
+        'dishes': [
+            {'name': "Bún bò Huế", 'aliases': ["bun bo"], 'tags': ["bún", "cay"],
+             'description': "Bún sợi to, nước dùng sả ớt", 'price': "40.000-60.000đ", 'where': "Bún bò Mệ Kéo"},
+            {'name': "Bún hến", 'tags': ["bún", "hến"], 'description': "Bún trộn hến xào",
+             'price': "15.000-25.000đ", 'where': "Cồn Hến"},
+            {'name': "Cơm hến", 'tags': ["cơm", "hến"], 'description': "Cơm nguội trộn hến",
+             'price': "15.000đ", 'where': "Cồn Hến"},
+        ],
+        'areas': [{'name': "Chợ Đông Ba", 'description': "Chợ lớn nhất Huế"}],
+    }],
+}
+
+
+@pytest.fixture
+def kb(tmp_path):
+    path = tmp_path / 'food_kb.json'
+    path.write_text(json.dumps(KB, ensure_ascii=False), encoding='utf-8')
+    return FoodKnowledgeBase(str(path))
+
+
+def test_specific_dish_ranks_first_and_incidental_matches_drop(kb):
+    dishes, unmatched = kb.search("Bún bò ở Huế giá bao nhiêu?", city='Hue')
+    assert [dish['name'] for dish in dishes] == ["Bún bò Huế"]
+    assert unmatched == []
+
+
+def test_generic_question_lists_the_city_in_curated_order(kb):
+    dishes, unmatched = kb.search("Huế có món gì ngon?", city='Hue', limit=2)
+    assert [dish['name'] for dish in dishes] == ["Bún bò Huế", "Bún hến"]
+    assert unmatched == []
+
+
+def test_words_the_kb_cannot_answer_are_reported(kb):
+    dishes, unmatched = kb.search("Món chay cho trẻ em ở Huế", city='Hue')
+    assert 'chay' in unmatched
+
+
+def test_region_facet_and_unknown_city(kb):
+    assert len(kb.search("Món hến miền Trung")[0]) == 2
+    assert kb.search("Bún bò", city='Hanoi') == ([], ['bun', 'bo'])
+
+
+def test_prices_are_fine_but_opening_hours_need_live_data():
+    assert not needs_live_data("Bún bò Huế giá bao nhiêu?")
+    assert needs_live_data("Quán bún bò nào mở cửa bây giờ?")
+
+
+def test_food_agent_answers_evergreen_questions_from_the_kb():
+    answer = FoodAgent()._kb_answer("Đặc sản Hà Nội là gì?", "Hà Nội")
+    assert answer.startswith("🍜 Món ngon nên thử ở Hà Nội:")
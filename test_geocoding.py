@@ -0,0 +1,38 @@
+"""City table lookups and the persistent geocode cache."""
+import pytest
+from agents import geocoding
+from agents.geocoding import GeocodeCache, find_cities_in_text, find_city_in_text, geocode, lookup_city
+
+
+@pytest.mark.parametrize('text, city', [
+    ("Du lịch vịnh Hạ Long 3 ngày", 'Ha Long'),
+    ("Du thuyền trên vịnh Nha Trang", 'Nha Trang'),
+    ("Hoa huệ ở Đà Lạt", 'Da Lat'),
+    ("Thời tiết Huế thế nào", 'Hue'),
+    ("thoi tiet hue the nao", 'Hue'),
+    ("Vé máy bay đi Vinh", 'Vinh'),
+    ("Ăn gì ở Sài Gòn", 'Ho Chi Minh City'),
+])
+def test_find_city_in_text(text, city):
+    assert find_city_in_text(text)['name'] == city
+
+
+def test_everyday_words_are_not_cities():
+    assert find_cities_in_text("Ngắm vịnh, mua hoa huệ") == []
+    assert lookup_city("vịnh") is None
+    assert lookup_city("Huế")['name'] == 'Hue'
+
+
+def test_unknown_place_is_geocoded_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(geocoding, 'geocode_cache', GeocodeCache(str(tmp_path / 'geocode.sqlite3')))
+    calls = []
+    maps_get = geocoding.maps_get
+    monkeypatch.setattr(geocoding, 'maps_get', lambda *args: calls.append(args) or maps_get(*args))
+
+    assert geocode("Hà Nội", 'offline-test')['formatted_address'] == "Hanoi, Vietnam"
+    assert calls == []
+
+    first = geocode("Mộc Châu", 'offline-test')
+    second = geocode("moc chau", 'offline-test')
+    assert first is not None and second == first
+    assert len(calls) == 1
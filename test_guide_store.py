@@ -0,0 +1,47 @@
+"""Destination guide store: what is served and what the refresh job regenerates."""
+from datetime import datetime, timedelta
+from agents.guide_store import GuideStore, prompt_version, refresh_guides
+
+
+def _guide(city, version, age_days=0):
+    generated_at = (datetime.now() - timedelta(days=age_days)).isoformat(timespec='seconds')
+    return {'city': city, 'content': f"🗺️ {city}", 'prompt_version': version, 'model': 'gemini-test',
+            'version': 1, 'generated_at': generated_at}
+
+
+def _store(tmp_path):
+    store = GuideStore(str(tmp_path / 'guides.json.gz'), max_age_days=45)
+    store.write({
+        'Hanoi': _guide("Hà Nội", store.version),
+        'Da Nang': _guide("Đà Nẵng", 'old-prompt'),
+        'Da Lat': _guide("Đà Lạt", store.version, age_days=60),
+    })
+    return store
+
+
+def test_only_current_guides_are_served(tmp_path):
+    store = _store(tmp_path)
+    assert store.get("Hà Nội")['city'] == "Hà Nội"
+    assert store.get("Đà Nẵng") is None
+    assert store.get("Đà Lạt") is None
+    assert store.get("Huế") is None
+
+
+class _Model:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return type('Response', (), {'text': "🗺️ guide", 'usage_metadata': None})()
+
+
+def test_refresh_regenerates_missing_and_outdated_guides(tmp_path):
+    store = _store(tmp_path)
+    model = _Model()
+    outcome = refresh_guides(model, ["Hà Nội", "Đà Nẵng", "Đà Lạt", "Huế"], store,
+                             model_name='gemini-2.0-flash')
+    assert outcome == {"Hà Nội": "fresh", "Đà Nẵng": "generated", "Đà Lạt": "generated", "Huế": "generated"}
+    guides = store.read()
+    assert guides['Da Nang']['version'] == 2
+    assert guides['Da Nang']['prompt_version'] == prompt_version('gemini-2.0-flash')
@@ -0,0 +1,58 @@
+"""History index: BM25 selection within the byte budget, and remembered facts."""
+from agents.history_index import HistoryIndex, HistoryIndexes, prompt_history
+
+HISTORY = [
+    {'role': 'user', 'content': "Tôi muốn đi Đà Nẵng ngày 20/11 với 2 người lớn, ngân sách 5 triệu."},
+    {'role': 'assistant', 'content': "Đà Nẵng tháng 11 hay mưa. Bạn nên mang áo mưa. " * 5},
+    {'role': 'user', 'content': "Gợi ý món ăn ngon ở Hội An?"},
+    {'role': 'assistant', 'content': "Cao lầu và mì Quảng là đặc sản Hội An. Cơm gà cũng rất nổi tiếng."},
+]
+
+
+def _size(messages):
+    return sum(len(message['content'].encode('utf-8')) for message in messages)
+
+
+def test_select_stays_within_budget_and_prefers_relevant_passages():
+    index = HistoryIndex()
+    index.sync(HISTORY)
+    for budget in (40, 120, 400):
+        selected = index.select("cao lầu Hội An", budget=budget, snippet_bytes=100)
+        assert _size(selected) <= budget
+    selected = index.select("cao lầu Hội An", budget=80, snippet_bytes=100)
+    assert [message['index'] for message in selected] == [3]
+    assert selected[0]['content'].startswith("Cao lầu")
+    assert prompt_history(selected) == selected
+
+
+def test_unmatched_follow_up_quotes_the_last_exchange():
+    indexes = HistoryIndexes()
+    selected, _ = indexes.select('s1', HISTORY + [{'role': 'user', 'content': "còn gì nữa?"}], "còn gì nữa?")
+    assert {message['index'] for message in selected} == {2, 3}
+
+
+def test_facts_survive_and_sessions_are_separate():
+    indexes = HistoryIndexes()
+    facts = indexes.facts('s1', HISTORY + [{'role': 'user', 'content': "khách sạn?"}])
+    assert facts['dates'] == ['ngày 20/11']
+    assert facts['preferences'] == ['2 người lớn', '5 triệu']
+    assert 'Đà Nẵng' in facts['locations']
+    assert indexes.facts('s2', []) == {'locations': [], 'dates': [], 'preferences': []}
+
+
+def test_trimmed_cookie_history_keeps_index_and_facts():
+    """The app drops the oldest exchange once the session cookie is full; that is still the same conversation."""
+    indexes = HistoryIndexes()
+    history = HISTORY + [{'role': 'user', 'content': "khách sạn?"}]
+    facts = indexes.facts('s1', history)
+    history = history[:-1] + [{'role': 'user', 'content': "khách sạn?"},
+                              {'role': 'assistant', 'content': "Khách sạn gần biển Mỹ Khê."}]
+    trimmed = history[2:] + [{'role': 'user', 'content': "giá bao nhiêu?"}]
+    assert indexes.facts('s1', trimmed) == facts
+    selected, _ = indexes.select('s1', trimmed, "khách sạn Mỹ Khê")
+    # Trimmed messages are no longer quoted; the rest keep their place
+    assert {message['index'] for message in selected} <= {2, 3, 4, 5}
+    assert any("Mỹ Khê" in message['content'] for message in selected)
+
+    restarted = [{'role': 'user', 'content': "Xin chào"}]
+    assert indexes.facts('s1', restarted + [{'role': 'user', 'content': "?"}])['dates'] == []
@@ -0,0 +1,44 @@
+"""Structured log records: JSON lines, trace ids and capped payloads."""
+import json
+import logging
+from monitoring import logging_config
+from monitoring.logging_config import JsonFormatter, RequestContextFilter, TextFormatter, cap_payload
+from monitoring.tracing import span, start_trace
+
+
+def _record(level=logging.INFO, **extra):
+    return logging.getLogger('agents.food_agent').makeRecord(
+        'agents.food_agent', level, __file__, 1, "Answered %s", ("food",), None, extra=extra)
+
+
+def test_json_line_has_message_and_extras():
+    line = JsonFormatter().format(_record(agent='food', cache_hit=True))
+    entry = json.loads(line)
+    assert '\n' not in line
+    assert (entry['level'], entry['logger'], entry['message']) == ('INFO', 'agents.food_agent', "Answered food")
+    assert (entry['agent'], entry['cache_hit']) == ('food', True)
+
+
+def test_records_carry_the_current_trace():
+    record = _record()
+    with start_trace("POST /api/chat") as trace:
+        with span("food agent", category="agent") as agent:
+            RequestContextFilter().filter(record)
+    assert (record.trace_id, record.span_id) == (trace.trace_id, agent.span_id)
+
+
+def test_payloads_are_capped():
+    capped = cap_payload({'prompt': "x" * 5000, 'results': list(range(30))}, max_chars=100)
+    assert capped['prompt'].startswith("x" * 50) and capped['prompt'].endswith("[4950 more chars]")
+    assert capped['results'][-1] == "... 10 more items"
+    assert "more chars]" in TextFormatter().format(_record(payload="y" * 10000))
+
+
+def test_debug_payloads_are_sampled_but_warnings_kept(monkeypatch):
+    monkeypatch.setattr(logging_config, 'LOG_PAYLOAD_SAMPLE_RATE', 0.0)
+    debug = _record(logging.DEBUG, payload="prompt")
+    warning = _record(logging.WARNING, payload="prompt")
+    RequestContextFilter().filter(debug)
+    RequestContextFilter().filter(warning)
+    assert debug.payload is None and debug.payload_sampled_out
+    assert warning.payload == "prompt"
@@ -0,0 +1,25 @@
+"""Per-thread metric shards: totals and shard count under a thread per request."""
+import threading
+from monitoring.metrics import Counter, Histogram
+
+
+def _in_threads(record, count=50):
+    for _ in range(count):
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+
+
+def test_finished_threads_do_not_accumulate_shards():
+    counter = Counter('test_requests_total', 'Requests.', ['route'])
+    _in_threads(lambda: counter.inc(route='/api/chat'))
+    assert len(counter._shards) <= 2
+    assert counter.value(route='/api/chat') == 50
+
+
+def test_histogram_keeps_retired_observations():
+    histogram = Histogram('test_latency_seconds', 'Latency.', buckets=(0.1, 1))
+    _in_threads(lambda: histogram.observe(0.5), count=10)
+    histogram.observe(2)
+    assert len(histogram._shards) <= 2
+    assert histogram._snapshot()[()] == [0, 10, 1, 7.0]
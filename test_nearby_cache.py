@@ -0,0 +1,36 @@
+"""Geohash nearby-search cache: hits only when a stored search covers the query circle."""
+from agents.nearby_cache import NearbySearchCache, geohash_encode, geohash_neighbours, nearby_search
+
+HOAN_KIEM = (21.0285, 105.8542)
+
+
+def _place(place_id, lat, lng):
+    return {'place_id': place_id, 'geometry': {'location': {'lat': lat, 'lng': lng}}}
+
+
+def test_query_inside_stored_search_is_a_hit():
+    cache = NearbySearchCache()
+    cache.put(*HOAN_KIEM, 1000, 'lodging', [_place('near', 21.0290, 105.8545), _place('far', 21.0470, 105.8542)])
+    # 700 m away, in the same cell: the stored search reached 2.4 km
+    moved = (21.0285, 105.8609)
+    assert geohash_encode(*moved, 6) == geohash_encode(*HOAN_KIEM, 6)
+    places = cache.get(*moved, 1000, 'lodging')
+    assert [place['place_id'] for place in places] == ['near']
+
+
+def test_query_reaching_past_stored_search_is_a_miss():
+    cache = NearbySearchCache()
+    cache.put(*HOAN_KIEM, 1000, 'lodging', [_place('near', 21.0290, 105.8545)])
+    # A neighbouring cell, but 1.9 km + 1 km reaches past the 2.4 km searched
+    moved = (21.0285, 105.8722)
+    assert geohash_encode(*moved, 6) in geohash_neighbours(geohash_encode(*HOAN_KIEM, 6))
+    assert cache.get(*moved, 1000, 'lodging') is None
+    assert cache.get(*moved, 400, 'lodging') is not None
+    assert cache.get(*HOAN_KIEM, 1000, 'restaurant') is None
+
+
+def test_nearby_search_reuses_a_search_from_the_same_neighbourhood():
+    first = nearby_search(16.0544, 108.2022, 5000, 'lodging', 'offline-test')
+    assert first.get('source') != 'nearby_cache'
+    second = nearby_search(16.0545, 108.2022, 5000, 'lodging', 'offline-test')
+    assert second['source'] == 'nearby_cache'
@@ -0,0 +1,59 @@
+"""Rendered informational pages: strong ETags and 304 revalidation."""
+from flask import Flask, flash
+from page_cache import CACHE_CONTROL, PageCache
+
+
+def _app(version='v1'):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    cache = PageCache(version)
+    renders = []
+
+    @app.route('/about')
+    @cache.cached
+    def about():
+        renders.append(1)
+        return "<h1>About</h1>"
+
+    @app.route('/flash')
+    def flash_and_show():
+        flash("Saved")
+        return about()
+
+    return app, cache, renders
+
+
+def test_page_is_rendered_once_and_revalidated_with_304():
+    app, cache, renders = _app()
+    client = app.test_client()
+
+    first = client.get('/about')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == CACHE_CONTROL
+    etag = first.headers['ETag']
+
+    again = client.get('/about', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert len(renders) == 1
+
+
+def test_etag_changes_with_the_deploy():
+    first, _, _ = _app('v1')
+    second, _, _ = _app('v2')
+    assert first.test_client().get('/about').headers['ETag'] != second.test_client().get('/about').headers['ETag']
+
+
+def test_pending_flash_messages_bypass_the_cache():
+    app, _, renders = _app()
+    client = app.test_client()
+    client.get('/flash')
+    client.get('/flash')
+    assert len(renders) == 2
+
+
+def test_prerender_fills_the_cache():
+    app, cache, renders = _app()
+    cache.prerender(app)
+    app.test_client().get('/about')
+    assert len(renders) == 1
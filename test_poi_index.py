@@ -0,0 +1,41 @@
+"""Local POI index: full-text and radius search, and which questions need live data."""
+from agents.food_agent import FoodAgent
+from agents.poi_index import POIIndex, is_freshness_sensitive
+
+POIS = [
+    {'name': "Bún chả Hương Liên", 'category': 'food', 'city': "Hà Nội", 'lat': 21.0186, 'lng': 105.8530,
+     'description': "Bún chả nướng than", 'tags': "bun cha;nuong"},
+    {'name': "Phở Thìn", 'category': 'food', 'city': "Hà Nội", 'lat': 21.0160, 'lng': 105.8560,
+     'description': "Phở bò tái lăn"},
+    {'name': "Văn Miếu", 'category': 'sight', 'city': "Hà Nội", 'lat': 21.0277, 'lng': 105.8355,
+     'description': "Quốc Tử Giám"},
+    {'name': "Bún bò Mệ Kéo", 'category': 'food', 'city': "Huế", 'lat': 16.4637, 'lng': 107.5909,
+     'description': "Bún bò Huế"},
+]
+
+
+def test_freshness_keywords_match_with_or_without_accents():
+    assert is_freshness_sensitive("Giá vé Văn Miếu bao nhiêu?")
+    assert is_freshness_sensitive("gia ve van mieu")
+    assert is_freshness_sensitive("Quán phở nào MỞ CỬA bây giờ?")
+    assert not is_freshness_sensitive("Món ăn đặc sản ở Huế")
+
+
+def test_search_by_text_city_and_category():
+    index = POIIndex()
+    assert index.add_many(POIS) == 4
+    assert [poi['name'] for poi in index.search("bún chả", city="Hà Nội", category='food')] == ["Bún chả Hương Liên"]
+    assert [poi['name'] for poi in index.search("bún", city="Huế")] == ["Bún bò Mệ Kéo"]
+    assert index.search("xyzzy", city="Hà Nội", category='food') == []
+
+
+def test_nearby_is_nearest_first_within_radius():
+    index = POIIndex()
+    index.add_many(POIS)
+    names = [poi['name'] for poi in index.nearby(21.0180, 105.8540, 1000)]
+    assert names == ["Bún chả Hương Liên", "Phở Thìn"]
+
+
+def test_food_agent_does_not_answer_with_unrelated_places():
+    agent = FoodAgent()
+    assert agent._local_food_answer("Có xyzzy ở Hà Nội không?", "Hà Nội") is None
@@ -0,0 +1,49 @@
+"""Request profiling: the /admin/profiling switch and the files a profiled turn leaves."""
+import pytest
+import app as app_module
+from monitoring.profiling import RequestProfiler, profiler
+
+ADMIN = {'X-Admin-Token': 'admin-test'}
+
+
+@pytest.mark.parametrize('enabled, expected', [(True, True), (False, False), ('false', False),
+                                               ('true', True), ('0', False), (1, True)])
+def test_configure_parses_enabled(enabled, expected):
+    profiling = RequestProfiler(enabled=not expected)
+    profiling.configure(enabled=enabled)
+    assert profiling.enabled is expected
+
+
+@pytest.mark.parametrize('enabled, sample_rate', [('no', None), ([], None), (None, 'often'), (True, True)])
+def test_configure_rejects_bad_values_and_changes_nothing(enabled, sample_rate):
+    profiling = RequestProfiler(enabled=False, sample_rate=0.05)
+    with pytest.raises(ValueError):
+        profiling.configure(enabled=enabled, sample_rate=sample_rate)
+    assert (profiling.enabled, profiling.sample_rate) == (False, 0.05)
+
+
+def test_admin_profiling_rejects_string_false(monkeypatch):
+    monkeypatch.setenv('ADMIN_TOKEN', 'admin-test')
+    monkeypatch.setattr(profiler, 'enabled', False)
+    monkeypatch.setattr(profiler, 'sample_rate', profiler.sample_rate)
+    client = app_module.app.test_client()
+
+    response = client.post('/admin/profiling', json={'enabled': 'yes please'}, headers=ADMIN)
+    assert response.status_code == 400
+    assert 'enabled' in response.get_json()['error']
+
+    response = client.post('/admin/profiling', json={'enabled': 'false', 'sample_rate': 0.5}, headers=ADMIN)
+    assert response.status_code == 200
+    assert response.get_json()['enabled'] is False
+
+
+def test_profiled_turn_is_listed(monkeypatch, tmp_path):
+    monkeypatch.setattr(app_module, 'profiler', RequestProfiler(enabled=True, sample_rate=1.0,
+                                                                directory=str(tmp_path)))
+    response = app_module.app.test_client().post('/api/chat', json={'message': "Khách sạn ở Đà Nẵng"})
+    assert response.status_code == 200
+
+    profiles = app_module.profiler.recent()
+    assert len(profiles) == 1
+    assert (tmp_path / f"{profiles[0]['name']}.pstats").exists()
+    assert (tmp_path / f"{profiles[0]['name']}.collapsed").exists()
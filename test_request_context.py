@@ -0,0 +1,63 @@
+"""Per-turn memoization of upstream calls."""
+import threading
+import time
+import pytest
+from agents import upstream
+from agents.request_context import canonical_key, memoize, request_scope
+
+
+def test_same_resource_is_fetched_once_per_turn():
+    calls = []
+    with request_scope("turn") as context:
+        with request_scope("agent method"):
+            assert memoize("maps/geocode?address=Hue", lambda: calls.append(1) or 'first') == 'first'
+        assert memoize("maps/geocode?address=Hue", lambda: calls.append(1) or 'second') == 'first'
+    assert len(calls) == 1
+    assert (context.fetch_count, context.hit_count) == (1, 1)
+
+    # Outside a turn nothing is kept
+    assert memoize("maps/geocode?address=Hue", lambda: 'third') == 'third'
+
+
+def test_concurrent_callers_wait_for_the_fetch_in_flight():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'hotels'
+
+    with request_scope("turn") as context:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(context.memoize("nearby", fetch)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert results == ['hotels'] * 4
+    assert len(calls) == 1
+
+
+def test_failed_fetch_is_retried():
+    def fail():
+        raise ValueError("quota")
+
+    with request_scope("turn"):
+        with pytest.raises(ValueError):
+            memoize("maps/details", fail)
+        assert memoize("maps/details", lambda: 'ok') == 'ok'
+
+
+def test_api_key_is_not_part_of_the_key():
+    assert canonical_key("maps/geocode/json", {'address': ' Huế ', 'key': 'a'}) == \
+        canonical_key("maps/geocode/json", {'key': 'b', 'address': 'Huế'})
+
+
+def test_maps_get_is_memoized_within_a_turn():
+    params = {'address': "Mộc Châu, Vietnam", 'key': 'offline-test'}
+    with request_scope("turn") as context:
+        first = upstream.maps_get("geocode/json", params)
+        second = upstream.maps_get("geocode/json", dict(params))
+    assert first == second
+    assert (context.fetch_count, context.hit_count) == (1, 1)
@@ -0,0 +1,92 @@
+"""Circuit breaker transitions, bulkhead rejection and the Gemini quota monitor."""
+import time
+import pytest
+from agents.resilience import (
+    CLOSED, HALF_OPEN, OPEN, Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError, QuotaExhaustedError,
+    QuotaMonitor, watch_rejections
+)
+
+
+def _breaker(**kwargs):
+    options = {'min_calls': 4, 'failure_ratio': 0.5, 'open_seconds': 0.05, 'slow_call_seconds': 1.0}
+    options.update(kwargs)
+    return CircuitBreaker('serpapi/google', **options)
+
+
+def _fail(breaker, count):
+    for _ in range(count):
+        breaker.before_call()
+        breaker.record(failed=True)
+
+
+def test_breaker_opens_after_enough_failures():
+    breaker = _breaker()
+    _fail(breaker, 3)
+    assert breaker.state == CLOSED
+    _fail(breaker, 1)
+    assert breaker.state == OPEN and not breaker.available
+    with watch_rejections() as rejections, pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert rejections == ['serpapi/google']
+
+
+def test_slow_calls_count_as_failures():
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.before_call()
+        breaker.record(failed=False, duration=2.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_trial_closes_or_reopens():
+    breaker = _breaker()
+    _fail(breaker, 4)
+    time.sleep(0.06)
+    assert breaker.available
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only half_open_calls trial calls at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(failed=True)
+    assert breaker.state == OPEN
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record(failed=False)
+    assert breaker.state == CLOSED
+    assert breaker.status()['calls'] == 0
+
+
+def test_bulkhead_rejects_past_its_limit():
+    bulkhead = Bulkhead('hotel', limit=1, max_wait=0.01)
+    with bulkhead.guard():
+        assert bulkhead.status() == {'limit': 1, 'in_use': 1}
+        with pytest.raises(BulkheadFullError):
+            with bulkhead.guard():
+                pass
+    with bulkhead.guard():
+        pass
+    assert bulkhead.in_use == 0
+
+
+def test_quota_monitor_enters_and_leaves_degraded_mode():
+    monitor = QuotaMonitor(min_calls=4, enter_ratio=0.5, min_seconds=0, probe_rate=0, exit_probes=2)
+    monitor.record(rate_limited=False)
+    monitor.record(rate_limited=False)
+    monitor.record(rate_limited=True)
+    assert not monitor.active
+    monitor.record(rate_limited=True, retry_after=0.05)
+    assert monitor.active
+    assert monitor.serve_locally()
+    with pytest.raises(QuotaExhaustedError):
+        monitor.admit_call()
+    with monitor.probe():
+        monitor.admit_call()
+
+    monitor.record(rate_limited=False)
+    assert monitor.active
+    monitor.record(rate_limited=False)
+    assert not monitor.active
+    assert monitor.status()['calls'] == 0
+    monitor.admit_call()
@@ -0,0 +1,61 @@
+"""SemanticCache: paraphrase hits, scope misses, expiry and per-conversation facts."""
+from agents.semantic_cache import SemanticCache, question_terms
+
+ANSWER = {'status': 'success', 'content': "Khách sạn cho 2 người lớn ở Đà Nẵng..."}
+
+
+def test_answer_shaped_by_history_facts_stays_with_those_facts():
+    cache = SemanticCache(capacity=8)
+    facts = {'locations': [], 'dates': ['20/11'], 'preferences': ['2 người lớn']}
+    cache.store('hotel', "Khách sạn ở Đà Nẵng", ANSWER, facts)
+
+    assert cache.lookup('hotel', "Khách sạn ở Đà Nẵng") is None
+    assert cache.lookup('hotel', "Khách sạn ở Đà Nẵng", {'dates': ['20/11'], 'preferences': []}) is None
+    assert cache.lookup('hotel', "Khách sạn ở Đà Nẵng", facts)['content'] == ANSWER['content']
+    assert cache.stale('hotel', "Khách sạn ở Đà Nẵng") is None
+
+
+def test_facts_restated_in_the_question_do_not_split_the_scope():
+    cache = SemanticCache(capacity=8)
+    cache.store('hotel', "Khách sạn ở Đà Nẵng cho 2 người lớn", ANSWER)
+    hit = cache.lookup('hotel', "Khách sạn ở Đà Nẵng cho 2 người lớn",
+                       {'locations': ['Đà Nẵng'], 'preferences': ['2 người lớn']})
+    assert hit is not None
+
+
+FOOD = {'status': 'success', 'content': "Phở, bún chả, chả cá Lã Vọng..."}
+
+
+def test_paraphrase_about_the_same_city_is_a_hit():
+    cache = SemanticCache(capacity=8)
+    assert question_terms("Món ăn đặc sản ở Hà Nội") == question_terms("Hà Nội có món gì ngon") == ['#dish']
+    cache.store('food', "Món ăn đặc sản ở Hà Nội", FOOD)
+    hit = cache.lookup('food', "Hà Nội có món gì ngon")
+    assert hit['content'] == FOOD['content']
+    assert hit['cached']['question'] == "Món ăn đặc sản ở Hà Nội"
+
+
+def test_other_city_period_or_agent_is_a_miss():
+    cache = SemanticCache(capacity=8)
+    cache.store('food', "Món ăn đặc sản ở Hà Nội", FOOD)
+    cache.store('weather', "Thời tiết Hà Nội tuần này", FOOD)
+    assert cache.lookup('food', "Món ăn đặc sản ở Huế") is None
+    assert cache.lookup('place', "Món ăn đặc sản ở Hà Nội") is None
+    assert cache.lookup('weather', "Thời tiết Hà Nội tháng 7") is None
+    assert cache.lookup('weather', "Thời tiết Hà Nội tuần này") is not None
+
+
+def test_uncacheable_answers_are_not_stored():
+    cache = SemanticCache(capacity=8)
+    cache.store('food', "Ăn gì ngon?", FOOD)
+    cache.store('food', "Món ăn ở Huế", {'status': 'error', 'message': "quota"})
+    cache.store('food', "Món ăn ở Huế", {**FOOD, 'source': 'degraded'})
+    assert cache.stats()['entries'] == 0
+
+
+def test_expired_entry_misses_but_is_kept_for_degraded_mode():
+    cache = SemanticCache(capacity=8, ttl=0)
+    cache.store('food', "Món ăn đặc sản ở Hà Nội", FOOD)
+    assert cache.lookup('food', "Món ăn đặc sản ở Hà Nội") is None
+    content, _ = cache.stale('food', "Hà Nội có món gì ngon")
+    assert content == FOOD['content']
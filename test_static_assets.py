@@ -0,0 +1,51 @@
+"""Fingerprinted asset build and how the app serves it."""
+import gzip
+from flask import Flask, url_for
+import build_assets
+import static_assets
+
+CSS = b".logo { background: url('../img/logo.svg'); }\n" * 20
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><rect width="10" height="10"/></svg>\n' * 20
+
+
+def _build(monkeypatch, tmp_path):
+    static_dir, dist_dir = tmp_path / 'static', tmp_path / 'static' / 'dist'
+    (static_dir / 'css').mkdir(parents=True, exist_ok=True)
+    (static_dir / 'img').mkdir(exist_ok=True)
+    (static_dir / 'css' / 'site.css').write_bytes(CSS)
+    (static_dir / 'img' / 'logo.svg').write_bytes(SVG)
+    for module in (build_assets, static_assets):
+        monkeypatch.setattr(module, 'STATIC_DIR', str(static_dir))
+        monkeypatch.setattr(module, 'DIST_DIR', str(dist_dir))
+    return build_assets.build(tailwind=False, fonts=False), dist_dir
+
+
+def test_build_fingerprints_and_rewrites_css(monkeypatch, tmp_path):
+    manifest, _ = _build(monkeypatch, tmp_path)
+    assert manifest['img/logo.svg'] == 'dist/' + build_assets.fingerprint('img/logo.svg', SVG)
+    css = (tmp_path / 'static' / manifest['css/site.css']).read_text()
+    assert manifest['img/logo.svg'].split('/')[-1] in css
+    assert (tmp_path / 'static' / (manifest['css/site.css'] + '.gz')).exists()
+
+    # Rebuilding the same files gives the same names
+    assert _build(monkeypatch, tmp_path)[0] == manifest
+
+
+def test_built_assets_are_served_fingerprinted_and_compressed(monkeypatch, tmp_path):
+    manifest, dist_dir = _build(monkeypatch, tmp_path)
+    app = Flask(__name__)
+    static_assets.init_app(app, str(dist_dir / 'manifest.json'))
+
+    with app.test_request_context():
+        url = url_for('static', filename='css/site.css')
+    assert url == f"/static/{manifest['css/site.css']}"
+
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == static_assets.IMMUTABLE_CACHE_CONTROL
+    assert gzip.decompress(response.data).startswith(b'.logo')
+
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+    assert 'Content-Encoding' not in response.headers
+    response.close()
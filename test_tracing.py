@@ -0,0 +1,57 @@
+"""Per-request traces and the Server-Timing header."""
+import threading
+import pytest
+import app as app_module
+from agents import agent_manager
+from monitoring import tracing
+from monitoring.tracing import in_current_context, span, start_trace
+
+
+def test_spans_nest_and_add_up_per_category():
+    with start_trace("POST /api/chat") as trace:
+        with span("food agent", category="agent") as agent:
+            with span("maps geocode", category="maps") as child:
+                pass
+        with span("maps nearby", category="maps"):
+            pass
+    assert child.parent_id == agent.span_id
+    assert set(trace.timings()) == {'total', 'agent', 'maps'}
+    assert 'maps;dur=' in trace.server_timing()
+    assert 'desc="2 span(s)"' in trace.server_timing()
+
+
+def test_spans_from_worker_threads_join_the_trace():
+    def call_gemini():
+        with span("gemini", category="gemini"):
+            pass
+
+    with start_trace("POST /api/chat") as trace:
+        worker = threading.Thread(target=in_current_context(call_gemini))
+        worker.start()
+        worker.join()
+    assert [s.name for s in trace.spans if s.category == 'gemini'] == ["gemini"]
+
+
+def test_span_outside_a_trace_does_nothing():
+    with span("maps geocode", category="maps") as nothing:
+        assert nothing is None
+    assert tracing.current_trace() is None
+
+
+def test_failed_span_keeps_the_error():
+    with pytest.raises(ValueError):
+        with start_trace("POST /api/chat") as trace:
+            with span("serpapi flights", category="serpapi"):
+                raise ValueError("timeout")
+    assert [s.error for s in trace.spans] == ["timeout", "timeout"]
+    assert trace.to_otlp()['resourceSpans'][0]['scopeSpans'][0]['spans'][1]['status']['code'] == 2
+
+
+def test_chat_reports_server_timing(monkeypatch):
+    # A cached answer would skip the agent span
+    monkeypatch.setattr(agent_manager.response_cache, 'lookup', lambda *args: None)
+    response = app_module.app.test_client().post('/api/chat', json={'message': "Khách sạn ở Đà Nẵng"})
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('total;dur=')
+    assert 'agent;dur=' in timing
@@ -0,0 +1,41 @@
+"""run_graph: dependency order, skipped dependents and the plan deadline."""
+import time
+from agents.trip_planner import PlanNode, run_graph
+
+
+def _statuses(events):
+    return {event['node']: event['status'] for event in events}
+
+
+def test_dependents_get_results_and_failed_branches_are_skipped():
+    def destination(results):
+        return {'status': 'success', 'city': 'Đà Nẵng'}
+
+    def flights(results):
+        assert results['destination']['city'] == 'Đà Nẵng'
+        raise RuntimeError("SerpAPI down")
+
+    nodes = [
+        PlanNode('destination', destination),
+        PlanNode('flights', flights, depends_on=['destination']),
+        PlanNode('weather', lambda results: {'status': 'error', 'message': "no data"}, depends_on=['destination']),
+        PlanNode('cost', lambda results: {'status': 'success', 'total': 0}, depends_on=['flights', 'weather']),
+        PlanNode('food', lambda results: {'status': 'success'}, depends_on=['weather']),
+    ]
+    events = list(run_graph(nodes, time.monotonic() + 5))
+    assert _statuses(events) == {'destination': 'success', 'flights': 'error', 'weather': 'error',
+                                 'cost': 'skipped', 'food': 'success'}
+    cost = next(event for event in events if event['node'] == 'cost')
+    assert cost['error'] == "Depends on flights"
+
+
+def test_deadline_times_out_running_nodes_and_skips_waiting_ones():
+    nodes = [
+        PlanNode('fast', lambda results: {'status': 'success'}),
+        PlanNode('slow', lambda results: time.sleep(0.5)),
+        PlanNode('after_slow', lambda results: {'status': 'success'}, depends_on=['slow']),
+    ]
+    start = time.monotonic()
+    events = list(run_graph(nodes, start + 0.1))
+    assert time.monotonic() - start < 0.4
+    assert _statuses(events) == {'fast': 'success', 'slow': 'timeout', 'after_slow': 'skipped'}
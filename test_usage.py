@@ -0,0 +1,27 @@
+"""Session budget: over-budget Gemini calls are capped and counted once each."""
+from agents import upstream
+from agents.usage import BUDGET_MAX_OUTPUT_TOKENS, usage_scope, usage_tracker
+from monitoring.metrics import LLM_BUDGET_DEGRADED
+
+
+class _Model:
+    model_name = 'models/gemini-test'
+
+    def __init__(self):
+        self.configs = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.configs.append(generation_config)
+        return type('Response', (), {'text': 'ok', 'usage_metadata': None})()
+
+
+def test_over_budget_call_is_capped_and_counted_once(monkeypatch):
+    monkeypatch.setattr(usage_tracker, 'over_budget', lambda session_id: True)
+    monkeypatch.setattr(upstream, '_budget_model', lambda: None)
+    model = _Model()
+    before = LLM_BUDGET_DEGRADED.value()
+    with usage_scope('session-1', 'food'):
+        upstream.generate_content(model, "Món ngon Hà Nội", generation_config={'max_output_tokens': 8192,
+                                                                           'temperature': 0.2})
+    assert model.configs == [{'max_output_tokens': BUDGET_MAX_OUTPUT_TOKENS, 'temperature': 0.2}]
+    assert LLM_BUDGET_DEGRADED.value() == before + 1